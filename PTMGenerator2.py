@@ -7,7 +7,8 @@
     ui/     The PyQt5 windows that drive it.
 
 Run with `python PTMGenerator2.py`, or build the Windows executable with
-`pyinstaller PTMGenerator2.spec`.
+`pyinstaller PTMGenerator2.spec`. `--batch-fit FOLDER...` fits capture folders
+without opening a window; see `core.batch_fit`.
 """
 
 import os
@@ -16,7 +17,7 @@
 from PyQt5.QtCore import QTranslator
 from PyQt5.QtGui import QIcon
 
-from core import paths
+from core import batch_fit, paths
 from core import self_test as self_test_checks
 from core.preferences import Preferences
 from core.resources import icon_path, translation_path
@@ -74,6 +75,8 @@ def main(argv=None):
     argv = sys.argv if argv is None else argv
     if "--self-test" in argv:
         return self_test(argv)
+    if "--batch-fit" in argv:
+        return batch_fit.main(argv[argv.index("--batch-fit") + 1 :])
 
     app = PtmApplication(argv)
     # Before any window exists: an exception escaping a Qt slot otherwise
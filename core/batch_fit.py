@@ -0,0 +1,347 @@
+"""Fitting many capture folders from the command line.
+
+    PTMGenerator2 --batch-fit "D:/archive/2026-*" other/specimen07 [options]
+
+Re-fitting an archive after a parameter changes is one `generatePTM` per
+folder through the GUI, which nobody does for more than a handful. This runs
+the same fit -- `ptm_builder.generate_native`, from each folder's
+`image_data.csv` -- over as many folders as it is given, several at a time,
+and reports what it did.
+
+Two kinds of parallelism compete for the same cores: folders fitted side by
+side, and the decoding and banding inside each fit. Folders are the coarser
+grain and scale better, so the cores are shared out between them: with four
+folder workers on a sixteen-core machine, each fit decodes on four threads.
+
+Memory is the other constraint. Each fit holds `ptm_fitter.memory_estimate`
+bytes at its peak, and four 48-megapixel fits at once is more than many
+capture PCs have. A fit only starts once its estimate fits in the budget
+alongside those already running; the rest wait their turn. A fit larger than
+the whole budget still runs -- alone -- rather than never.
+
+Nothing here imports Qt.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+from PIL import Image
+
+from core import decoders, image_data, ptm_builder, ptm_fitter
+from core import settings as prefs
+from core.fit_stats import FitStats
+from core.light_positions import light_vectors
+from core.preferences import Preferences
+
+#: The capture table's name in each folder, as the main window writes it.
+CSV_NAME = "image_data.csv"
+
+#: Share of physical memory the default budget allows. Half leaves room for
+#: the decoders' own buffers, which the estimate does not count, and for
+#: whatever else the machine is doing.
+DEFAULT_MEMORY_SHARE = 0.5
+
+
+class BatchFitError(Exception):
+    """A folder that cannot be fitted, for a reason worth one line."""
+
+
+class FolderResult(NamedTuple):
+    """How one folder went."""
+
+    folder: str
+    destination: str | None
+    images: int
+    megapixels: float
+    seconds: float
+    error: str | None = None
+    #: Where the fit's time went; see `core.fit_stats`. None if it failed.
+    stats: FitStats | None = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class MemoryBudget:
+    """Bytes that running fits may hold between them.
+
+    Args:
+        limit (int | None): The budget; None for no limit.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._changed = threading.Condition()
+
+    def acquire(self, amount):
+        """Wait until `amount` fits alongside what is in use, then take it.
+
+        Anything fits when nothing else is running, so a fit larger than the
+        whole budget waits for the others and then runs alone.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.limit is None or not self.in_use or self.in_use + amount <= self.limit
+            )
+            self.in_use += amount
+
+    def release(self, amount):
+        with self._changed:
+            self.in_use -= amount
+            self._changed.notify_all()
+
+
+def expand_folders(patterns):
+    """The folders named by `patterns`, each a path or a glob, in order.
+
+    Globs are expanded here rather than left to the shell, because the
+    Windows shell does not. A pattern that matches nothing is kept as it is,
+    so it is reported as missing rather than silently dropped.
+    """
+    folders = []
+    for pattern in patterns:
+        matches = [pattern]
+        if glob.has_magic(pattern):
+            # Path.glob only takes patterns relative to a fixed directory;
+            # these are absolute, with wildcards anywhere.
+            found = sorted(glob.glob(pattern))  # noqa: PTH207
+            matches = [match for match in found if Path(match).is_dir()]
+        for folder in matches or [pattern]:
+            if folder not in folders:
+                folders.append(folder)
+    return folders
+
+
+def physical_memory():
+    """Bytes of RAM, or None where the platform will not say."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def load_slots(folder):
+    """The folder's capture table, pointed at the folder itself.
+
+    The table records the absolute directory each shot was captured into. An
+    archive is usually somewhere else by now -- another drive, another
+    machine -- so a recorded directory that no longer exists is taken to mean
+    this folder.
+
+    Raises:
+        BatchFitError: No table, or nothing in it to fit.
+    """
+    csv_path = os.path.join(folder, CSV_NAME)
+    if not os.path.exists(csv_path):
+        raise BatchFitError(f"no {CSV_NAME}")
+    slots = [
+        slot._replace(directory=folder)
+        if slot.captured and not Path(slot.directory).is_dir()
+        else slot
+        for slot in image_data.read_csv(csv_path)
+    ]
+    if not ptm_builder.usable_slots(slots):
+        raise BatchFitError(f"no captured, included images in {CSV_NAME}")
+    return slots
+
+
+def image_size(slots, reduction=1):
+    """(width, height) the fit will see: the first usable image's, reduced.
+
+    Read from the header alone; nothing is decoded.
+    """
+    first = ptm_builder.usable_slots(slots)[0]
+    with Image.open(os.path.join(first.directory, first.filename)) as image:
+        width, height = image.size
+    return -(-width // reduction), -(-height // reduction)
+
+
+def destination_for(folder, output_dir=None):
+    """`<folder name>.ptm`, in the folder or in `output_dir`."""
+    name = os.path.basename(os.path.normpath(folder))
+    return os.path.join(output_dir or folder, name + ".ptm")
+
+
+def fit_folder(folder, vectors, budget, workers, output_dir=None, reduction=1, clock=None):
+    """Fit one folder within the budget. Never raises: failures are results."""
+    clock = clock or time.perf_counter
+    started = clock()
+    stats = FitStats()
+    try:
+        slots = load_slots(folder)
+        width, height = image_size(slots, reduction)
+        count = len(ptm_builder.usable_slots(slots))
+        need = ptm_fitter.memory_estimate(width, height, resident=workers + 1)
+        destination = destination_for(folder, output_dir)
+        budget.acquire(need)
+        try:
+            started = clock()
+            ptm_builder.generate_native(
+                slots,
+                vectors,
+                destination,
+                workers=workers,
+                bands=workers,
+                reduction=reduction,
+                stats=stats,
+            )
+        finally:
+            budget.release(need)
+    except (BatchFitError, ptm_builder.NoImagesToFitError, ptm_fitter.FitError, OSError) as error:
+        return FolderResult(
+            folder, None, 0, 0.0, clock() - started, str(error) or type(error).__name__
+        )
+    return FolderResult(
+        folder, destination, count, count * width * height / 1e6, clock() - started, stats=stats
+    )
+
+
+def summary(results):
+    """The report printed at the end, one line per folder and a total."""
+    lines = [f"{'folder':<40} {'images':>6} {'MP':>8} {'s':>8} {'img/s':>7} {'MP/s':>8}"]
+    for result in results:
+        if result.ok:
+            rate = result.images / result.seconds if result.seconds else 0.0
+            throughput = result.megapixels / result.seconds if result.seconds else 0.0
+            lines.append(
+                f"{result.folder:<40} {result.images:>6} {result.megapixels:>8.1f} "
+                f"{result.seconds:>8.2f} {rate:>7.2f} {throughput:>8.1f}"
+            )
+        else:
+            lines.append(f"{result.folder:<40} FAILED: {result.error}")
+    fitted = [result for result in results if result.ok]
+    lines.append(
+        f"{len(fitted)} of {len(results)} folders fitted, "
+        f"{sum(result.images for result in fitted)} images, "
+        f"{sum(result.megapixels for result in fitted):.1f} MP"
+    )
+    return "\n".join(lines)
+
+
+def as_json(result):
+    """One folder's result as a line of JSON, with its `FitStats`."""
+    record = result._asdict()
+    record["stats"] = result.stats.as_dict() if result.stats is not None else None
+    return json.dumps(record)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="PTMGenerator2 --batch-fit",
+        description="Fit a PTM for each capture folder, from its image_data.csv.",
+    )
+    parser.add_argument("folders", nargs="+", help="capture folders, or globs matching them")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="folders fitted at once (default: one per four cores, at least one)",
+    )
+    parser.add_argument(
+        "--memory-gb",
+        type=float,
+        default=None,
+        help="memory the running fits may hold between them "
+        f"(default: {DEFAULT_MEMORY_SHARE:.0%} of physical memory)",
+    )
+    parser.add_argument(
+        "--output-dir", default=None, help="where the .ptm files go (default: each folder)"
+    )
+    parser.add_argument(
+        "--light-position-adjustment",
+        type=int,
+        default=None,
+        help="degrees to rotate the dome (default: the saved preference)",
+    )
+    parser.add_argument(
+        "--reduction",
+        type=int,
+        default=1,
+        choices=(1, *ptm_builder.PREVIEW_REDUCTIONS),
+        help="fit a preview at 1/N size",
+    )
+    parser.add_argument(
+        "--decoder",
+        choices=[decoders.AUTO, *decoders.DECODERS],
+        default=decoders.AUTO,
+        help="the JPEG decoding library (default: time each on the first image)",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="end with one JSON line per folder, timings by stage and image included",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None, log=print):
+    """Run the batch. Returns the process exit code: 0 if every folder fitted."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    folders = expand_folders(args.folders)
+    try:
+        decoders.use(args.decoder)
+    except decoders.DecoderUnavailableError as error:
+        log(f"Cannot decode with {args.decoder}: {error}")
+        return 2
+
+    cores = ptm_builder.decode_workers()
+    jobs = max(1, min(len(folders), args.jobs or max(1, cores // 4)))
+    workers = max(1, cores // jobs)
+
+    limit: int | None = None
+    if args.memory_gb is not None:
+        limit = int(args.memory_gb * 2**30)
+    else:
+        total = physical_memory()
+        limit = int(total * DEFAULT_MEMORY_SHARE) if total else None
+    budget = MemoryBudget(limit)
+
+    adjustment = args.light_position_adjustment
+    if adjustment is None:
+        adjustment = prefs.read_int(Preferences(migrate=False), prefs.LIGHT_POSITION_ADJUSTMENT)
+    vectors = light_vectors(adjustment)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    log(f"Fitting {len(folders)} folders, {jobs} at a time, {workers} threads each")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(jobs, thread_name_prefix="batch-fit") as pool:
+        pending = [
+            pool.submit(
+                fit_folder,
+                folder,
+                vectors,
+                budget,
+                workers,
+                output_dir=args.output_dir,
+                reduction=args.reduction,
+            )
+            for folder in folders
+        ]
+        results = []
+        for future in pending:
+            result = future.result()
+            log(f"  {'done' if result.ok else 'FAILED'}: {result.folder}")
+            if result.stats is not None:
+                log(f"    {result.stats.summary()}")
+            results.append(result)
+
+    log(summary(results))
+    if decoders.chosen() is not None:
+        log(f"Decoded with {decoders.chosen()}")
+    log(f"{time.perf_counter() - started:.2f} s in all")
+    if args.json:
+        for result in results:
+            log(as_json(result))
+    return 0 if all(result.ok for result in results) else 1
@@ -1,6 +1,6 @@
 """Sequencing a capture run.
 
-One tick per second, driven by a QTimer in the UI. Each slot goes
+Each slot goes
 
     idle -> preparing -> polling -> (recorded | retake) -> next slot
 
@@ -8,8 +8,24 @@
 firing the shutter and looking for the resulting file are injected, so the
 policy — how long to wait, when to retake, when to give up — can be tested
 without a controller, a camera or a clock.
+
+Two ways to drive it:
+
+* `CaptureSession` counts whole ticks of a one-second timer. Every LED costs at
+  least the preparation ticks plus one poll, about three seconds, however
+  quickly the camera delivers.
+* `TimedCaptureSession` keeps deadlines in seconds on an injected clock and is
+  stepped whenever something happens -- a file arriving, or the deadline it
+  asked to be woken at. Each `StepResult` says how long until it next needs
+  stepping, so a run goes at the camera's pace, not the timer's. The main
+  window uses this one.
+* `PipelinedCaptureSession`, the opt-in variant of that, fires the next LED
+  while earlier shots are still transferring, and pairs files with LEDs as
+  they arrive.
 """
 
+import time
+from collections import deque
 from typing import NamedTuple
 
 IDLE = "idle"
@@ -25,6 +41,9 @@ class StepResult(NamedTuple):
     recorded: tuple | None = None
     #: True once the queue has drained and the run is over.
     finished: bool = False
+    #: Seconds until the session next needs stepping if nothing else happens
+    #: first. None from the tick-driven session: the next tick.
+    wake_after: float | None = None
 
 
 # StepResult.event values
@@ -118,3 +137,261 @@ def _finish_slot(self, event, recorded):
         else:
             self.finished = True
         return StepResult(event, recorded=recorded, finished=self.finished)
+
+
+class TimedCaptureSession(CaptureSession):
+    """The same sequencing, with deadlines in seconds rather than ticks.
+
+    Step it when a file may have arrived and when the last result's
+    `wake_after` has elapsed; stepping it more often than that is harmless.
+    Time comes from `clock`, so tests can drive a run without waiting for one.
+    """
+
+    #: Longest gap between polls while waiting, for when no event will come --
+    #: a folder that could not be watched, or a file still being written.
+    POLL_INTERVAL = 0.25
+
+    def __init__(
+        self,
+        indices,
+        preparation_time=0.2,
+        polling_timeout=7.0,
+        max_retakes=0,
+        clock=time.monotonic,
+        timing=None,
+    ):
+        """
+        Args:
+            indices: LED indices to capture, in order.
+            preparation_time: Seconds after the shutter before looking for a
+                file.
+            polling_timeout: Further seconds to wait for it to appear.
+            max_retakes: Times to re-fire a slot before recording it as missing.
+            clock: Returns the current time in seconds.
+            timing: A `shot_timing.LatencyProfile` to learn from and to take
+                the waits from, in place of the two above, once it has enough
+                to go on. Each shot's latency is recorded into it.
+        """
+        super().__init__(indices, preparation_time, polling_timeout, max_retakes)
+        self.clock = clock
+        self.timing = timing
+        self.defaults = (preparation_time, polling_timeout)
+        #: When the current state's wait ends.
+        self.deadline = 0.0
+        #: When the shutter last fired.
+        self.shot_at = 0.0
+        #: Shutter-to-file seconds of each slot captured, by LED.
+        self.latencies: dict = {}
+
+    def step(self, shoot, poll):
+        """Advance as far as the time allows.
+
+        Args:
+            shoot: Called as shoot(led_index) to light the LED and fire.
+            poll: Called as poll() -> image path, or None if nothing new.
+
+        Returns:
+            StepResult: what happened, whether the run is over, and when to
+            step again.
+        """
+        if self.finished:
+            return StepResult(GAVE_UP, finished=True)
+        now = self.clock()
+
+        if self.status == IDLE:
+            if self.timing is not None:
+                self.preparation_time, self.polling_timeout = self.timing.waits(*self.defaults)
+            self.status = PREPARING
+            shoot(self.current_index)
+            self.shot_at = now
+            self.deadline = now + self.preparation_time
+            return StepResult(PREPARING_SHOT, wake_after=self.preparation_time)
+
+        if self.status == PREPARING:
+            if now < self.deadline:
+                return StepResult(PREPARING_SHOT, wake_after=self.deadline - now)
+            self.status = POLLING
+            self.deadline += self.polling_timeout
+
+        image = poll()
+        if image is not None:
+            self._measured(self.current_index, now - self.shot_at)
+            return self._woken(self._finish_slot(CAPTURED, (self.current_index, image)))
+        if now < self.deadline:
+            return StepResult(WAITING, wake_after=min(self.deadline - now, self.POLL_INTERVAL))
+        # Missed: at least this slow, which is what the profile needs to hear.
+        self._measured(self.current_index, now - self.shot_at, captured=False)
+        if self.retake_counter < self.max_retakes:
+            self.retake_counter += 1
+            self.status = IDLE
+            return StepResult(RETAKING, wake_after=0.0)
+        return self._woken(self._finish_slot(GAVE_UP, (self.current_index, None)))
+
+    def _measured(self, led_index, seconds, captured=True):
+        if captured:
+            self.latencies[led_index] = seconds
+        if self.timing is not None:
+            self.timing.record(seconds)
+
+    @staticmethod
+    def _woken(result):
+        """A decided slot: the next one starts straight away."""
+        return result if result.finished else result._replace(wake_after=0.0)
+
+
+class _Shot(NamedTuple):
+    led_index: int
+    shot_at: float
+    deadline: float
+
+
+class PipelinedCaptureSession(TimedCaptureSession):
+    """Fire LED n+1 while LED n's file is still on its way.
+
+    Tethered bodies buffer shots, so the camera is ready again long before its
+    file has landed. Waiting for each file before the next shutter leaves the
+    transfer and the exposure taking turns; this overlaps them, keeping up to
+    `depth` shots in flight at least `shot_interval` seconds apart.
+
+    Files arrive in the order they were shot, so each is paired with the
+    oldest shot still in flight. That holds as long as the camera fires every
+    time it is told to: one that skips a shot shifts every later pairing by
+    one, which the timeout on the skipped shot cannot detect. `reconcile`
+    re-pairs them afterwards by the capture times in their EXIF, which at
+    least puts a reordered transfer right.
+
+    `poll` returns a list here, every new image oldest first, not the newest
+    one: several can land between two steps. One slot is decided per step;
+    the result asks to be woken again at once while there are more.
+    """
+
+    def __init__(
+        self,
+        indices,
+        preparation_time=0.2,
+        polling_timeout=7.0,
+        max_retakes=0,
+        clock=time.monotonic,
+        timing=None,
+        shot_interval=1.0,
+        depth=2,
+    ):
+        """
+        Args:
+            indices, preparation_time, polling_timeout, max_retakes, clock,
+            timing: As for `TimedCaptureSession`; the timeout runs for each
+                shot from its own shutter.
+            shot_interval: Least seconds between two shutters.
+            depth: Most shots in flight at once.
+        """
+        if depth < 1:
+            raise ValueError(f"depth must be at least 1, not {depth}")
+        super().__init__(indices, preparation_time, polling_timeout, max_retakes, clock, timing)
+        self.shot_interval = shot_interval
+        self.depth = depth
+        self.in_flight: deque = deque()
+        self.next_shot_at = 0.0
+        #: Every pairing made, as (led_index, path, shot_at), in shutter order.
+        self.paired: list = []
+        self._arrived: deque = deque()
+        self._retakes: dict = {}
+
+    def step(self, shoot, poll):
+        """Take in new files, decide at most one slot, fire if it is time.
+
+        Args:
+            shoot: Called as shoot(led_index) to light the LED and fire.
+            poll: Called as poll() -> list of new image paths, oldest first.
+        """
+        if self.finished:
+            return StepResult(GAVE_UP, finished=True)
+        now = self.clock()
+        self._arrived.extend(poll())
+
+        decided = self._decide(now)
+        event = decided.event if decided else WAITING
+        if self._can_fire and now >= self.next_shot_at:
+            self._fire(shoot, now)
+            event = decided.event if decided else PREPARING_SHOT
+
+        self.finished = self.current_index is None and not self.in_flight
+        if self.finished:
+            self._arrived.clear()
+        return StepResult(
+            event,
+            recorded=decided.recorded if decided else None,
+            finished=self.finished,
+            wake_after=None if self.finished else self._wake_after(now),
+        )
+
+    def reconcile(self, capture_times):
+        """Re-pair files with LEDs by when the camera says it shot them.
+
+        Args:
+            capture_times: path -> capture time in seconds, or None where the
+                file does not say. The camera's clock need not agree with
+                this machine's; only the order is used.
+
+        Returns:
+            list[tuple[int, str]]: (led_index, path) for each pairing that
+            changes. Empty if any file's time is unknown: a partial order is
+            no better than the arrival order it would replace.
+        """
+        by_shutter = sorted(self.paired, key=lambda pair: pair[2])
+        paths = [path for _led, path, _at in by_shutter]
+        if any(capture_times.get(path) is None for path in paths):
+            return []
+        by_capture = sorted(paths, key=lambda path: capture_times[path])
+        return [
+            (led_index, path)
+            for (led_index, old, _at), path in zip(by_shutter, by_capture, strict=True)
+            if path != old
+        ]
+
+    def _decide(self, now):
+        """Pair one arrival with the oldest shot, or time one out."""
+        if self._arrived and self.in_flight:
+            shot = self.in_flight.popleft()
+            path = self._arrived.popleft()
+            self._measured(shot.led_index, now - shot.shot_at)
+            self.paired.append((shot.led_index, path, shot.shot_at))
+            return StepResult(CAPTURED, recorded=(shot.led_index, path))
+        self._arrived.clear()  # nothing was waiting for these
+        if self.in_flight and now >= self.in_flight[0].deadline:
+            shot = self.in_flight.popleft()
+            self._measured(shot.led_index, now - shot.shot_at, captured=False)
+            retakes = self._retakes.get(shot.led_index, 0)
+            if retakes < self.max_retakes:
+                self._retakes[shot.led_index] = retakes + 1
+                if self.current_index is not None:
+                    self.queue.insert(0, self.current_index)
+                self.current_index = shot.led_index
+                return StepResult(RETAKING)
+            return StepResult(GAVE_UP, recorded=(shot.led_index, None))
+        return None
+
+    @property
+    def _can_fire(self):
+        return self.current_index is not None and len(self.in_flight) < self.depth
+
+    def _fire(self, shoot, now):
+        led_index = self.current_index
+        if led_index is None:
+            return
+        if self.timing is not None:
+            self.preparation_time, self.polling_timeout = self.timing.waits(*self.defaults)
+        shoot(led_index)
+        deadline = now + self.preparation_time + self.polling_timeout
+        self.in_flight.append(_Shot(led_index, now, deadline))
+        self.next_shot_at = now + self.shot_interval
+        self.current_index = self.queue.pop(0) if self.queue else None
+
+    def _wake_after(self, now):
+        if self._arrived and self.in_flight:
+            return 0.0
+        waits = []
+        if self._can_fire:
+            waits.append(max(0.0, self.next_shot_at - now))
+        if self.in_flight:
+            waits.append(min(self.POLL_INTERVAL, max(0.0, self.in_flight[0].deadline - now)))
+        return min(waits) if waits else self.POLL_INTERVAL
@@ -0,0 +1,286 @@
+"""Decoding captures, with whichever library is fastest on this machine.
+
+Decoding is nearly all of a fit -- see `core.fit_stats` -- and Pillow, which
+`ptm_builder.load_image` always used, writes every pixel twice: libjpeg
+decodes into Pillow's four-bytes-a-pixel image, and ``convert("RGB")`` then
+copies it out to the three-bytes-a-pixel array the fit wants. At 48 megapixels
+that copy is 144 MB per image, on every decoder thread.
+
+A decoder here is a function ``decode(path, reduction=1, out=None)`` returning
+an (height, width, 3) uint8 array, as `ptm_builder.load_image` always has. If
+`out` is an array of that shape the image is decoded into it and it is
+returned; otherwise a new, writable array is. That lets a fit decode fifty
+images into the same few buffers -- see `ptm_builder.decode_ahead` -- rather
+than allocating and faulting in 144 MB for each. Decoders are registered by
+name with a factory that imports whatever library the decoder needs and
+raises `DecoderUnavailableError` if it cannot:
+
+* ``pillow``: the original, and the fallback. Always available, and reads
+  anything Pillow can. Pillow decodes into an image of its own, which is then
+  copied out a strip of `PILLOW_STRIP_ROWS` rows at a time, so nothing else
+  the size of the image is allocated.
+* ``turbojpeg``: libjpeg-turbo through PyTurboJPEG (``pip install
+  PyTurboJPEG``, plus the libjpeg-turbo library itself). It decodes straight
+  into the RGB array -- into `out` itself with a PyTurboJPEG that takes a
+  ``dst`` -- and scales by 1/2, 1/4 or 1/8 as it does, so a preview costs what
+  Pillow's `draft` does. Anything that is not a JPEG, a reduction it cannot
+  do, or a JPEG it refuses (CMYK, say) goes to Pillow.
+
+Which one is used is `use`'s business. The default, ``auto``, times every
+available decoder on the first image decoded and keeps the fastest for the
+rest of the process: which wins depends on the libraries installed and the
+CPU, neither of which is known until then. A decoder whose image is not the
+shape Pillow's is never wins.
+"""
+
+import inspect
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+#: Choose by timing every available decoder on the first image.
+AUTO = "auto"
+
+#: The fallback decoder, and the reference the others are checked against.
+PILLOW = "pillow"
+
+#: The reductions libjpeg can apply while it decodes.
+JPEG_SCALES = (1, 2, 4, 8)
+
+#: Rows of a Pillow image copied out at once: a few megabytes, at any width.
+PILLOW_STRIP_ROWS = 128
+
+_JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+class DecoderUnavailableError(Exception):
+    """The decoder asked for cannot run here: its library is not installed."""
+
+
+def decode_with_pillow(path, reduction=1, out=None):
+    """Decode one capture with Pillow.
+
+    Args:
+        path (str): The capture.
+        reduction (int): Decode at 1/reduction of full size, rounding up. A
+            JPEG is scaled by the decoder itself (`Image.draft`), which is the
+            point: the full-size image never exists. Anything else is decoded
+            whole and box-filtered down to the same dimensions, so a capture
+            that mixes formats still fits.
+        out (numpy.ndarray | None): Where to put it, if it is the right shape.
+    """
+    with Image.open(path) as opened:
+        image: Image.Image = opened
+        if reduction > 1:
+            width, height = image.size
+            target = (-(-width // reduction), -(-height // reduction))
+            # draft() never goes below the size asked for, and refuses zero.
+            image.draft("RGB", (max(1, width // reduction), max(1, height // reduction)))
+            if image.size != target:
+                image = image.resize(target, Image.Resampling.BOX)
+        width, height = image.size
+        out = _destination(out, (height, width, 3))
+        # In strips: converting or exporting the whole image would make a
+        # copy of it -- convert() copies even an image already in RGB.
+        for top in range(0, height, PILLOW_STRIP_ROWS):
+            bottom = min(top + PILLOW_STRIP_ROWS, height)
+            strip = image.crop((0, top, width, bottom))
+            if strip.mode != "RGB":
+                strip = strip.convert("RGB")
+            out[top:bottom] = np.asarray(strip)
+        return out
+
+
+def _destination(out, shape):
+    """`out` if it can take an image of `shape`, or a new array that can."""
+    if (
+        out is not None
+        and out.shape == shape
+        and out.dtype == np.uint8
+        and out.flags.writeable
+        and out.flags.c_contiguous
+    ):
+        return out
+    return np.empty(shape, np.uint8)
+
+
+def _pillow():
+    return decode_with_pillow
+
+
+def _turbojpeg():
+    try:
+        from turbojpeg import TJPF_RGB, TurboJPEG
+    except ImportError as error:
+        raise DecoderUnavailableError("PyTurboJPEG is not installed") from error
+    try:
+        library = TurboJPEG()
+    except (OSError, RuntimeError) as error:  # the package without the library
+        raise DecoderUnavailableError(f"libjpeg-turbo cannot be loaded: {error}") from error
+    # Decoding into an array of the caller's came in with PyTurboJPEG 1.7.
+    takes_dst = "dst" in inspect.signature(library.decode).parameters
+
+    def decode(path, reduction=1, out=None):
+        data = Path(path).read_bytes()
+        if reduction not in JPEG_SCALES or not data.startswith(_JPEG_MAGIC):
+            return decode_with_pillow(path, reduction, out)
+        options = {}
+        if takes_dst and out is not None:
+            width, height, _subsampling, _colourspace = library.decode_header(data)
+            shape = (-(-height // reduction), -(-width // reduction), 3)
+            options["dst"] = _destination(out, shape)
+        try:
+            decoded = library.decode(
+                data,
+                pixel_format=TJPF_RGB,
+                scaling_factor=(1, reduction) if reduction > 1 else None,
+                **options,
+            )
+        except OSError:  # a JPEG libjpeg-turbo will not convert to RGB
+            return decode_with_pillow(path, reduction, out)
+        return options["dst"] if decoded is None else decoded
+
+    return decode
+
+
+#: Factories by name, in order of preference when timings tie.
+DECODERS = {PILLOW: _pillow, "turbojpeg": _turbojpeg}
+
+
+def register(name, factory):
+    """Add a decoder, or replace one.
+
+    Args:
+        name (str): What `use` and the command lines call it.
+        factory: Called with no arguments; returns the ``decode(path,
+            reduction=1, out=None)`` function, or raises
+            `DecoderUnavailableError`.
+    """
+    with _lock:
+        DECODERS[name] = factory
+        _loaded.pop(name, None)
+
+
+def get(name):
+    """The decode function registered as `name`.
+
+    Raises:
+        KeyError: Nothing is registered as `name`.
+        DecoderUnavailableError: Its library is not installed.
+    """
+    with _lock:
+        if name not in _loaded:
+            factory = DECODERS[name]
+            try:
+                _loaded[name] = factory()
+            except DecoderUnavailableError as error:
+                _loaded[name] = error
+        decoder = _loaded[name]
+    if isinstance(decoder, DecoderUnavailableError):
+        raise decoder
+    return decoder
+
+
+def available():
+    """The names of the decoders that can run here, in `DECODERS` order."""
+    names = []
+    for name in list(DECODERS):
+        try:
+            get(name)
+        except DecoderUnavailableError:
+            continue
+        names.append(name)
+    return names
+
+
+def use(name):
+    """Decode with `name` from now on, or with ``auto`` to choose by timing.
+
+    Raises:
+        ValueError: Nothing is registered as `name`.
+        DecoderUnavailableError: Its library is not installed.
+    """
+    global _chosen
+    if name != AUTO:
+        if name not in DECODERS:
+            raise ValueError(f"no decoder {name!r}; choose from {[AUTO, *DECODERS]}")
+        get(name)
+    with _lock:
+        _chosen = None if name == AUTO else name
+
+
+def chosen():
+    """The decoder in use, or None if ``auto`` has not decoded anything yet."""
+    return _chosen
+
+
+def choose(path, reduction=1, names=None, clock=time.perf_counter):
+    """Time each decoder on `path` and return the fastest one's name.
+
+    The file is read once first, so that none of them is timed reading it
+    from disk. Each is then timed on one decode: the point is to tell a
+    decoder that is twice as fast from one that is not, and one decode of a
+    capture is already a long measurement.
+
+    Args:
+        path (str): An image typical of what is to be decoded.
+        reduction (int): The reduction it is to be decoded at.
+        names (list[str] | None): The decoders to try; every available one by
+            default.
+        clock: Returns the time in seconds.
+    """
+    names = available() if names is None else names
+    if len(names) == 1:
+        return names[0]
+    Path(path).read_bytes()
+    shape = None
+    timings = {}
+    for name in names:
+        started = clock()
+        try:
+            image = get(name)(path, reduction)
+        except Exception as error:  # a failing decoder just does not win
+            print(f"Not decoding with {name}: {error}")
+            continue
+        seconds = clock() - started
+        if name == PILLOW:
+            shape = image.shape
+        timings[name] = (seconds, image.shape)
+    return min(
+        (name for name, (_seconds, found) in timings.items() if shape in (None, found)),
+        key=lambda name: timings[name][0],
+        default=PILLOW,
+    )
+
+
+def decode(path, reduction=1, out=None):
+    """Decode `path` with the decoder in use, choosing one first if need be.
+
+    Args:
+        path (str): The capture.
+        reduction (int): Decode at 1/reduction of full size, rounding up; see
+            `decode_with_pillow`.
+        out (numpy.ndarray | None): Decode into this, if it is the right
+            shape, rather than into a new array.
+
+    Returns:
+        numpy.ndarray: (height, width, 3) uint8: `out`, or a new array if
+        `out` was None or the wrong shape.
+    """
+    global _chosen
+    name = _chosen
+    if name is None:
+        with _choosing:  # the other decoder threads wait for the verdict
+            if _chosen is None:
+                _chosen = choose(path, reduction)
+            name = _chosen
+    return get(name)(path, reduction, out)
+
+
+_lock = threading.Lock()
+_choosing = threading.Lock()
+_loaded: dict = {}
+_chosen: str | None = None
@@ -0,0 +1,351 @@
+"""Timing the fit, and checking its memory against `ptm_fitter.memory_estimate`.
+
+The fitter's only performance figures were measured by hand once, for the P02
+devlog: 54.6 s of single-threaded decoding and a 641 MB peak at 48 megapixels.
+Nothing would notice if a change doubled either. This module regenerates those
+numbers on demand:
+
+* `synthesise` renders a capture set from a *known* PTM, at any size and in
+  JPEG, PNG or TIFF. The surface is a bumpy, coloured relief whose biquadratic
+  is worked out in advance, so the images are what a fit should recover. It is
+  rendered on a `TILE`-pixel tile and repeated across the frame, so a
+  100-megapixel set costs encoding time and nothing else.
+* `measure` fits a set the way `ptm_builder.generate_native` does: decoding
+  ahead on a thread pool, `fit_streaming` with a band per core, then
+  `ptm_format.write`. It returns the wall time, split into waiting for
+  decoded images, fitting and writing, plus the decoders' own time and the
+  peak resident memory the fit added.
+* `run_case` measures in a fresh interpreter, so each case's peak is its own
+  and not the largest seen so far. The peak is checked against
+  `memory_estimate` plus the decoders' working buffers, which the estimate
+  leaves out, with `ESTIMATE_MARGIN` to spare. A case that needs more fails
+  the run.
+
+From the command line::
+
+    python -m core.fit_benchmark --megapixels 12 24 48 100 --formats jpeg png tiff
+
+Generated sets are kept in ``--cache-dir`` and reused. Fifty 100-megapixel TIFFs
+are 15 GB, so point it at a disk with room. Peak memory comes from
+`resource.getrusage`, which Windows lacks; there the times are still reported.
+
+Nothing here imports Qt.
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import closing
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+from core import decoders, ptm_builder, ptm_fitter, ptm_format
+from core.fit_stats import FitStats, peak_rss
+from core.light_positions import light_vectors
+
+#: The sizes the suite runs by default, in megapixels.
+MEGAPIXELS = (12, 24, 48, 100)
+
+#: Formats a set can be generated in: Pillow's name, the extension and the
+#: options to save with. PNG is saved at the fastest compression, since
+#: decoding costs about the same at any level and encoding 100 megapixels at
+#: the default takes minutes per image.
+FORMATS = {
+    "jpeg": ("JPEG", ".jpg", {"quality": 92}),
+    "png": ("PNG", ".png", {"compress_level": 1}),
+    "tiff": ("TIFF", ".tiff", {}),
+}
+
+#: Side of the square the surface is rendered on before it is repeated.
+TILE = 256
+
+#: Images in a set by default: one per LED of the dome.
+IMAGES = 50
+
+#: Bytes per pixel a decoder holds besides the array it decodes into. Pillow
+#: keeps an RGB image as four bytes a pixel, and `ptm_builder.load_image`
+#: copies it out to three. `memory_estimate` counts the copy but not the
+#: original.
+DECODER_BYTES_PER_PIXEL = 4
+
+#: How far the measured peak may exceed the estimate before it counts as a
+#: regression. The rest is allocator slack, thread stacks and numpy temporaries.
+ESTIMATE_MARGIN = 1.15
+
+
+def dimensions(megapixels):
+    """Width and height of a 3:2 frame of about `megapixels`, in whole 16s.
+
+    Multiples of 16 are whole JPEG blocks, as a sensor's output is.
+    """
+    height = math.sqrt(megapixels * 1e6 / 1.5)
+    return 16 * round(1.5 * height / 16), 16 * round(height / 16)
+
+
+def known_surface(tile=TILE, seed=0):
+    """The PTM the synthetic captures are rendered from.
+
+    A Lambertian relief: shading ``n . l`` with ``l = (u, v, sqrt(1 - u² - v²))``
+    is, to second order, ``nz (1 - u²/2 - v²/2) + nx u + ny v``, which is a
+    biquadratic. So the coefficients are known exactly, and a fit to the images
+    should give them back, short of clipping and the format's loss.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The (tile, tile, 6) coefficients, in
+        luminance units (0 to 765), and the (tile, tile, 3) colour, which sums
+        to 255 at each pixel as a PTM's does.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:tile, 0:tile] * (2 * np.pi / tile)
+    # Whole periods across the tile, so the repeats join without a seam.
+    height = sum(
+        rng.uniform(0.01, 0.03)
+        * np.sin(k * x + rng.uniform(0, 2 * np.pi))
+        * np.cos(m * y + rng.uniform(0, 2 * np.pi))
+        for k, m in rng.integers(1, 6, size=(6, 2))
+    )
+    gy, gx = np.gradient(height, 2 * np.pi / tile)
+    normal = np.dstack([-gx, -gy, np.ones_like(gx)])
+    normal /= np.linalg.norm(normal, axis=2, keepdims=True)
+    # Bright enough to use most of the range, dim enough that no channel of
+    # the most saturated colour clips under the highest light.
+    albedo = 200 + 200 * rng.random((tile, tile))
+    nx, ny, nz = (albedo * normal[:, :, i] for i in range(3))
+    coefficients = np.dstack([-nz / 2, -nz / 2, np.zeros_like(nz), nx, ny, nz])
+
+    colour = 0.5 + rng.random((tile, tile, 3))
+    colour *= 255 / colour.sum(axis=2, keepdims=True)
+    return coefficients, colour
+
+
+def render(coefficients, colour, light):
+    """One capture of the known surface under `light`, as uint8 RGB."""
+    u, v = light[0], light[1]
+    terms = np.array([u * u, v * v, u * v, u, v, 1.0])
+    luminance = np.clip(coefficients @ terms, 0, 765)
+    return np.clip(np.rint(colour * luminance[:, :, None] / 255), 0, 255).astype(np.uint8)
+
+
+def synthesise(directory, megapixels, fmt, images=IMAGES, seed=0, log=print):
+    """Write a synthetic capture set, or reuse one already written.
+
+    Args:
+        directory (str): Where the set goes. Created if need be.
+        megapixels (float): Frame size; see `dimensions`.
+        fmt (str): A key of `FORMATS`.
+        images (int): How many, lit by the dome's first `images` LEDs.
+        seed (int): Chooses the surface.
+
+    Returns:
+        tuple[list[str], list[list[float]]]: The image paths and their light
+        vectors, in order.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {sorted(FORMATS)}, not {fmt!r}")
+    lights = light_vectors()[:images]
+    if len(lights) < images:
+        raise ValueError(f"the dome has {len(lights)} lights, not {images}")
+    width, height = dimensions(megapixels)
+    pil_format, extension, options = FORMATS[fmt]
+    os.makedirs(directory, exist_ok=True)
+    coefficients, colour = known_surface(seed=seed)
+    repeats = (-(-height // TILE), -(-width // TILE), 1)
+
+    paths = []
+    for index, light in enumerate(lights):
+        path = os.path.join(directory, f"synthetic_{index + 1:03d}{extension}")
+        paths.append(path)
+        if Path(path).exists():
+            continue
+        log(f"Rendering {os.path.basename(path)} ({width}x{height})")
+        pixels = np.tile(render(coefficients, colour, light), repeats)[:height, :width]
+        # Renamed into place once complete, so an interrupted run does not
+        # leave a truncated image to be reused as if it were whole.
+        partial = path + ".part"
+        Image.fromarray(pixels).save(partial, pil_format, **options)
+        Path(partial).replace(path)
+    return paths, lights
+
+
+class FitMeasurement(NamedTuple):
+    """One fit, timed."""
+
+    width: int
+    height: int
+    images: int
+    #: Wall time from the first decode to the written file.
+    seconds: float
+    #: Decoding time summed over the decoder threads. More than `seconds`
+    #: when they run side by side.
+    decode_seconds: float
+    #: Time the fit sat waiting for the next decoded image.
+    waiting_seconds: float
+    write_seconds: float
+    #: Bytes of resident memory the fit added at its peak, or None where the
+    #: platform cannot say.
+    peak_bytes: int | None
+    #: What `memory_estimate` allows, plus the decoders' buffers.
+    budget_bytes: int
+    #: The `core.decoders` decoder that did the decoding.
+    decoder: str | None = None
+
+    @property
+    def megapixels(self):
+        return self.width * self.height / 1e6
+
+    @property
+    def fit_seconds(self):
+        """Wall time spent fitting and quantising, not waiting or writing."""
+        return self.seconds - self.waiting_seconds - self.write_seconds
+
+    @property
+    def within_budget(self):
+        return self.peak_bytes is None or self.peak_bytes <= self.budget_bytes * ESTIMATE_MARGIN
+
+
+def measure(paths, lights, destination, workers=None, decoder=decoders.AUTO):
+    """Fit `paths` as `generate_native` would, and time each part.
+
+    Run it in a fresh process for a meaningful `peak_bytes`: the peak is the
+    process's own, and only what the fit adds to it is reported. `decoder` is
+    handed to `decoders.use`; with ``auto``, choosing one is part of the time.
+    """
+    decoders.use(decoder)
+    workers = max(1, workers or ptm_builder.decode_workers())
+    with Image.open(paths[0]) as first:
+        width, height = first.size
+    budget = ptm_fitter.memory_estimate(width, height, resident=workers + 1)
+    budget += DECODER_BYTES_PER_PIXEL * width * height * workers
+    stats = FitStats()
+    load = stats.timed_loader(ptm_builder.load_image, paths)
+
+    baseline = peak_rss()
+    decoded = ptm_builder.decode_ahead(paths, load, workers=workers, reuse=True)
+    with closing(decoded) as images:
+        ptm = ptm_fitter.fit_streaming(
+            images, lights, bands=ptm_builder.decode_workers(), stats=stats
+        )
+    with stats.stage("write"):
+        ptm_format.write(destination, ptm)
+    peak = peak_rss()
+    return FitMeasurement(
+        width,
+        height,
+        len(paths),
+        seconds=stats.wall_seconds,
+        decode_seconds=stats.seconds["decode"],
+        waiting_seconds=stats.seconds["wait"],
+        write_seconds=stats.seconds["write"],
+        peak_bytes=None if peak is None or baseline is None else peak - baseline,
+        budget_bytes=budget,
+        decoder=decoders.chosen(),
+    )
+
+
+def run_case(paths, lights, workers=None, decoder=decoders.AUTO):
+    """`measure` in a fresh interpreter. Returns its FitMeasurement."""
+    with tempfile.TemporaryDirectory(prefix="ptm-bench-") as scratch:
+        spec = Path(scratch) / "case.json"
+        spec.write_text(
+            json.dumps({"paths": paths, "lights": lights, "workers": workers, "decoder": decoder})
+        )
+        output = subprocess.run(
+            [sys.executable, "-m", "core.fit_benchmark", "--measure", str(spec)],
+            check=True,
+            stdout=subprocess.PIPE,  # stderr passes through, to show a failure
+            text=True,
+            cwd=Path(__file__).resolve().parent.parent,
+        ).stdout
+    return FitMeasurement(**json.loads(output))
+
+
+def _measure_spec(spec_path):
+    """The child's side of `run_case`: measure, and print the result as JSON."""
+    spec = json.loads(Path(spec_path).read_text())
+    destination = Path(spec_path).with_suffix(".ptm")
+    result = measure(
+        spec["paths"], spec["lights"], str(destination), spec["workers"], spec["decoder"]
+    )
+    print(json.dumps(result._asdict()))
+    return 0
+
+
+def format_row(fmt, result):
+    peak = "-" if result.peak_bytes is None else f"{result.peak_bytes / 2**20:,.0f}"
+    return (
+        f"{result.megapixels:6.1f} {fmt:5} {result.images:4d} {result.seconds:8.1f} "
+        f"{result.decode_seconds:8.1f} {result.waiting_seconds:8.1f} {result.fit_seconds:6.1f} "
+        f"{result.write_seconds:6.1f} {peak:>9} {result.budget_bytes / 2**20:9,.0f} "
+        f"{result.decoder or '-'}" + ("" if result.within_budget else "  OVER")
+    )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m core.fit_benchmark",
+        description="Fit synthetic capture sets and report time and memory.",
+    )
+    parser.add_argument(
+        "--megapixels", type=float, nargs="+", default=list(MEGAPIXELS), help="frame sizes"
+    )
+    parser.add_argument(
+        "--formats", nargs="+", choices=sorted(FORMATS), default=["jpeg"], help="image formats"
+    )
+    parser.add_argument("--images", type=int, default=IMAGES, help="images per set (default 50)")
+    parser.add_argument("--workers", type=int, default=None, help="decoders (default: one a core)")
+    parser.add_argument(
+        "--cache-dir",
+        default=os.path.join(tempfile.gettempdir(), "ptm-fit-benchmark"),
+        help="where generated sets are kept between runs",
+    )
+    parser.add_argument(
+        "--decoder",
+        choices=[decoders.AUTO, *decoders.DECODERS],
+        default=decoders.AUTO,
+        help="the decoding library (default: time each on the first image)",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON lines, not a table")
+    parser.add_argument("--measure", metavar="SPEC", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None, log=print):
+    """Run the suite. Returns 1 if a case is over its memory budget, 2 if the decoder is missing."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.measure:
+        return _measure_spec(args.measure)
+    try:
+        decoders.use(args.decoder)  # here too, to fail before generating anything
+    except decoders.DecoderUnavailableError as error:
+        log(f"Cannot decode with {args.decoder}: {error}")
+        return 2
+
+    quiet = (lambda _message: None) if args.json else log
+    if not args.json:
+        log(
+            "    MP fmt    img   wall s decode s   wait s  fit s write s   peak MB budget MB"
+            " decoder"
+        )
+    over = False
+    for megapixels in args.megapixels:
+        for fmt in args.formats:
+            folder = os.path.join(args.cache_dir, f"{megapixels:g}mp_{fmt}_{args.images}")
+            paths, lights = synthesise(folder, megapixels, fmt, args.images, log=quiet)
+            result = run_case(paths, lights, args.workers, args.decoder)
+            over = over or not result.within_budget
+            if args.json:
+                log(json.dumps({"format": fmt, **result._asdict()}))
+            else:
+                log(format_row(fmt, result))
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Where a fit spends its time and its memory.
+
+`fit_streaming`'s `progress(done, count)` says how far a fit has got, and
+nothing about why it takes as long as it does. The P02 measurements that
+explain it -- decoding is nearly all of the time, the arithmetic a few percent
+-- were taken once, by hand, on a development machine. A `FitStats` handed to
+`ptm_builder.generate_native`, `ptm_fitter.fit_streaming` or
+`ptm_builder.LiveFit.write` takes them on every fit, wherever it runs.
+
+It records seconds by stage:
+
+* ``decode``: each image's decode, summed over the decoder threads. They run
+  side by side and alongside the fit, so this can be more than the fit took.
+* ``wait``: the fit idle, waiting for the next decoded image. Large means the
+  decoders are the bottleneck; near zero means the fit is.
+* ``absorb``: folding images into the accumulators.
+* ``checkpoint``: saving progress for a resume.
+* ``quantise``: solving and quantising the result.
+* ``write``: writing the .ptm.
+
+Every stage but ``decode`` runs on the fitting thread, one after another, so
+those add up to the fit's wall time. For each image it also records the decode
+and absorb times and the resident memory once it is absorbed, and at the end
+of each stage the resident memory and the process's peak. `on_image` is
+called with each image's record as it is made, on the fitting thread.
+
+The results come out three ways: `summary` for the log, `as_dict` for JSON,
+and the attributes themselves for anything else.
+
+Memory figures come from the operating system: /proc on Linux,
+GetProcessMemoryInfo on Windows, `resource` for the peak on macOS. Where one
+cannot be had it is None.
+
+Nothing here imports Qt.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
+#: The stages a fit is timed in, in the order they happen.
+STAGES = ("decode", "wait", "absorb", "checkpoint", "quantise", "write")
+
+
+class ImageStats(NamedTuple):
+    """One image's share of a fit."""
+
+    #: Its place in the fit, from 0.
+    position: int
+    #: Seconds its decode took, or None if it was not decoded through
+    #: `FitStats.timed_loader` -- a live fit's, decoded during the capture.
+    decode: float | None
+    absorb: float
+    #: Resident bytes once it was absorbed, and the process's peak so far.
+    rss: int | None
+    peak_rss: int | None
+
+
+class FitStats:
+    """Timings and memory of one fit, by stage and by image.
+
+    Args:
+        on_image (callable | None): Called as ``on_image(ImageStats)`` after
+            each image is absorbed, on the fitting thread.
+        clock: Returns the time in seconds.
+    """
+
+    def __init__(self, on_image=None, clock=time.perf_counter):
+        self.on_image = on_image
+        self.clock = clock
+        #: Seconds by stage, for every stage in `STAGES`.
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        #: Resident bytes and the peak so far, when each stage last ended.
+        self.rss: dict = dict.fromkeys(STAGES)
+        self.peak_rss: dict = dict.fromkeys(STAGES)
+        #: One per image absorbed, in the order they were.
+        self.images: list = []
+        self._decodes: dict = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body as part of stage `name`.
+
+        Only a body that completes is counted: a solve that raises, and is
+        then done another way, should not be counted twice.
+        """
+        started = self.clock()
+        yield
+        self._add(name, self.clock() - started)
+
+    def timed_loader(self, loader, paths):
+        """`loader`, timing each decode. Safe to call from any thread.
+
+        Args:
+            loader: Called with a path, and any keywords the returned loader
+                is called with, such as `out`; returns an image.
+            paths (list[str]): The images, in fit order. A path's position is
+                the index its decode is recorded under.
+        """
+        indices = {path: index for index, path in enumerate(paths)}
+
+        def load(path, **options):
+            started = self.clock()
+            image = loader(path, **options)
+            seconds = self.clock() - started
+            with self._lock:
+                self._decodes[indices.get(path)] = seconds
+            self._add("decode", seconds)
+            return image
+
+        return load
+
+    def absorbed(self, index, seconds):
+        """Image `index` took `seconds` to absorb."""
+        rss, peak = self._add("absorb", seconds)
+        with self._lock:
+            decode = self._decodes.pop(index, None)
+        record = ImageStats(index, decode, seconds, rss, peak)
+        self.images.append(record)
+        if self.on_image is not None:
+            self.on_image(record)
+
+    @property
+    def wall_seconds(self):
+        """The stages on the fitting thread, which is the fit's wall time."""
+        return sum(self.seconds[name] for name in STAGES if name != "decode")
+
+    @property
+    def peak(self):
+        """The process's peak resident bytes at the last stage's end, or None."""
+        peaks = [peak for peak in self.peak_rss.values() if peak is not None]
+        return max(peaks) if peaks else None
+
+    def as_dict(self):
+        """Everything, as plain types for `json.dumps`."""
+        return {
+            "wall_seconds": self.wall_seconds,
+            "peak_rss": self.peak,
+            "stages": {
+                name: {
+                    "seconds": self.seconds[name],
+                    "rss": self.rss[name],
+                    "peak_rss": self.peak_rss[name],
+                }
+                for name in STAGES
+            },
+            "images": [record._asdict() for record in self.images],
+        }
+
+    def summary(self):
+        """One line for the log."""
+        parts = [
+            f"{name} {self.seconds[name]:.2f}s"
+            for name in STAGES
+            if name != "decode" and self.seconds[name]
+        ]
+        line = f"Fit of {len(self.images)} images in {self.wall_seconds:.2f}s: "
+        line += ", ".join(parts) or "nothing timed"
+        if self.seconds["decode"]:
+            line += f"; decoding {self.seconds['decode']:.2f}s across threads"
+        if self.peak is not None:
+            line += f"; peak memory {self.peak / 2**20:,.0f} MB"
+        return line
+
+    def _add(self, name, seconds):
+        """Count `seconds` to stage `name`. Returns the memory it ended at."""
+        rss, peak = memory()
+        with self._lock:
+            self.seconds[name] += seconds
+            self.rss[name], self.peak_rss[name] = rss, peak
+        return rss, peak
+
+
+def memory():
+    """(resident, peak resident) bytes of this process; either may be None."""
+    if sys.platform == "win32":
+        return _windows_memory()
+    return _current_rss(), peak_rss()
+
+
+def peak_rss():
+    """This process's peak resident bytes, or None."""
+    if sys.platform == "win32":
+        return _windows_memory()[1]
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # KiB on Linux
+
+
+def _current_rss():
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):  # not Linux
+        return None
+    import resource
+
+    return pages * resource.getpagesize()
+
+
+def _windows_memory():
+    if sys.platform != "win32":  # for mypy, which checks for one platform
+        return None, None
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = Counters()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    query = ctypes.windll.psapi.GetProcessMemoryInfo
+    query.argtypes = [wintypes.HANDLE, ctypes.POINTER(Counters), wintypes.DWORD]
+    if not query(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None, None
+    return counters.WorkingSetSize, counters.PeakWorkingSetSize
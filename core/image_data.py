@@ -12,8 +12,12 @@
 import csv
 import os
 from collections import Counter
+from datetime import datetime
+from pathlib import Path
 from typing import NamedTuple
 
+from PIL import Image
+
 # One list, used both when polling for an incoming shot and when rebuilding a
 # table from a directory. They disagreed before this was shared: polling
 # accepted .gif and .bmp and matched case-insensitively, while the rebuild
@@ -165,15 +169,53 @@ def find_newest_image(directory, newer_than, recursive=False):
         tuple[str | None, float]: (path, mtime), or (None, newer_than) if
         nothing new has landed.
     """
-    from pathlib import Path
+    found = find_new_images(directory, newer_than, recursive)
+    return found[-1] if found else (None, newer_than)
+
+
+def find_new_images(directory, newer_than, recursive=False):
+    """Every image under `directory` modified after `newer_than`, oldest first.
 
-    newest_path, newest_time = None, newer_than
+    For a pipelined capture, where several shots can land between two looks.
+    Arguments as for `find_newest_image`.
+
+    Returns:
+        list[tuple[str, float]]: (path, mtime) pairs.
+    """
+    found = []
     for candidate in Path(directory).glob("**/*" if recursive else "*"):
         if not candidate.is_file():
             continue
         if candidate.suffix.lower() not in IMAGE_EXTENSIONS:
             continue
         mtime = candidate.stat().st_mtime
-        if mtime > newest_time:
-            newest_time, newest_path = mtime, str(candidate)
-    return newest_path, newest_time
+        if mtime > newer_than:
+            found.append((str(candidate), mtime))
+    found.sort(key=lambda pair: pair[1])
+    return found
+
+
+def capture_time(path):
+    """When the camera says it took `path`, in seconds, or None.
+
+    From the EXIF DateTimeOriginal, plus SubSecTimeOriginal where the camera
+    writes it -- without that, shots within the same second tie. On the
+    camera's clock, which need not agree with this machine's: for ordering
+    shots, not for comparing with file times.
+    """
+    try:
+        with Image.open(path) as image:
+            exif = image.getexif().get_ifd(0x8769)
+    except OSError:
+        return None
+    stamp = exif.get(0x9003)
+    if not stamp:
+        return None
+    try:
+        # No zone is recorded. UTC is as good as any for putting shots in order.
+        taken = datetime.strptime(str(stamp).strip("\x00 ") + "+0000", "%Y:%m:%d %H:%M:%S%z")
+        seconds = taken.timestamp()
+    except ValueError:
+        return None
+    subsec = str(exif.get(0x9291, "")).strip("\x00 ")
+    return seconds + (float(f"0.{subsec}") if subsec.isdigit() else 0.0)
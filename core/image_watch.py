@@ -0,0 +1,174 @@
+"""Noticing new shots from filesystem events instead of rescanning for them.
+
+`image_data.find_newest_image` answers "what is the newest image here?" by
+globbing the directory and stat-ing every file in it -- recursively, until the
+first shot of a run shows which dated subfolder the tethering software files
+into. Once a second, over a season's worth of dated folders, that is thousands
+of stats per tick, and the `post_shutter_polling` sleep in front of it, there
+so a half-written file is not picked up, adds up to a second per shot.
+
+The operating system already knows when a directory changes. `ArrivalTracker`
+is the bookkeeping for a watcher built on that: it is told which directory
+changed, lists that one directory, and keeps the image files in it that are
+newer than the last one accepted. `take` hands over the newest of those that
+has *finished* arriving -- the same size and mtime as when it was last looked
+at -- which replaces the fixed sleep with a check that costs one stat per
+candidate.
+
+It only does the bookkeeping; the events come from whoever owns it
+(`ui.image_watcher`, on `QFileSystemWatcher`). When there is no watcher, or it
+cannot watch everything it needs to, the caller falls back to
+`find_newest_image` as before.
+
+Nothing here imports Qt.
+"""
+
+import os
+from pathlib import Path
+
+from core.image_data import IMAGE_EXTENSIONS
+
+#: More directories than this under the monitored root and the tracker declines
+#: to start, and the caller polls instead. inotify allows 8192 watches per user
+#: by default, shared with everything else the user runs.
+MAX_DIRECTORIES = 2048
+
+
+class ArrivalTracker:
+    """New image files under `root`, from change notifications.
+
+    Args:
+        root (str): The directory the shots land in, or under.
+        newer_than (float): Only files modified after this count as new, as
+            for `find_newest_image`.
+        recursive (bool): Watch `root`'s subdirectories too, including those
+            created from now on. Needed until the first shot shows where the
+            run's images go; see `find_newest_image`.
+    """
+
+    def __init__(self, root, newer_than, recursive=False):
+        self.root = os.path.normpath(root)
+        self.newer_than = newer_than
+        self.recursive = recursive
+        #: Directories being watched.
+        self.directories = {self.root}
+        #: Image files that have arrived but not been taken: path -> the
+        #: (size, mtime) they had when last looked at.
+        self._pending: dict = {}
+
+    def scan_tree(self, limit=MAX_DIRECTORIES):
+        """Find the directories to watch. Returns False if there are too many.
+
+        Once, when the run starts -- not once a tick.
+        """
+        if self.recursive:
+            for directory, subdirectories, _files in os.walk(self.root):
+                self.directories.update(os.path.join(directory, name) for name in subdirectories)
+                if len(self.directories) > limit:
+                    return False
+        return True
+
+    def changed(self, directory):
+        """`directory` has changed: note what has appeared in it.
+
+        Returns:
+            list[str]: Subdirectories that are new, to be watched too. Always
+            empty unless recursive.
+        """
+        directory = os.path.normpath(directory)
+        if directory not in self.directories:
+            return []
+        added = []
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:  # removed again, or not readable
+            return []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive and entry.path not in self.directories:
+                        self.directories.add(entry.path)
+                        added.append(entry.path)
+                        # The first shot can land before the new folder is
+                        # watched; look in it now rather than miss it.
+                        added.extend(self.changed(entry.path))
+                    continue
+                if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                status = entry.stat()
+            except OSError:  # gone between the listing and the stat
+                continue
+            if status.st_mtime > self.newer_than and entry.path not in self._pending:
+                self._pending[entry.path] = (status.st_size, status.st_mtime)
+        return added
+
+    def narrow_to(self, directory):
+        """Watch only `directory` from now on. Returns the directories dropped."""
+        directory = os.path.normpath(directory)
+        dropped = sorted(self.directories - {directory})
+        self.directories = {directory}
+        self.recursive = False
+        self._pending = {
+            path: seen for path, seen in self._pending.items() if os.path.dirname(path) == directory
+        }
+        return dropped
+
+    def take_all(self):
+        """Every image that has finished arriving, oldest first.
+
+        For a pipelined capture, where several shots can be in flight; `take`
+        keeps only the newest. The ones still arriving stay pending.
+
+        Returns:
+            list[tuple[str, float]]: (path, mtime) pairs.
+        """
+        finished = []
+        for path, seen in list(self._pending.items()):
+            now = self._restat(path, seen)
+            if now is not None:
+                finished.append((path, now[1]))
+                del self._pending[path]
+        finished.sort(key=lambda pair: pair[1])
+        if finished:
+            self.newer_than = max(self.newer_than, finished[-1][1])
+        return finished
+
+    def take(self):
+        """The newest image that has finished arriving, if any.
+
+        A file is finished when its size is non-zero and neither it nor its
+        mtime has moved since it was last looked at. One that is still growing
+        stays pending for the next call.
+
+        Returns:
+            tuple[str | None, float]: (path, mtime), or (None, newer_than),
+            as `find_newest_image` does. Older arrivals are passed over along
+            with the one returned, which is what the scan did too.
+        """
+        newest_path, newest_time = None, self.newer_than
+        for path, seen in list(self._pending.items()):
+            now = self._restat(path, seen)
+            if now is not None and now[1] > newest_time:
+                newest_path, newest_time = path, now[1]
+        if newest_path is not None:
+            self.newer_than = newest_time
+            self._pending = {
+                path: seen for path, seen in self._pending.items() if seen[1] > newest_time
+            }
+        return newest_path, newest_time
+
+    def _restat(self, path, seen):
+        """(size, mtime) if `path` has finished arriving, else None.
+
+        Updates or drops its pending entry when it has not.
+        """
+        try:
+            status = Path(path).stat()
+        except OSError:  # renamed away -- a temporary name, usually
+            del self._pending[path]
+            return None
+        now = (status.st_size, status.st_mtime)
+        if now != seen or not status.st_size:
+            self._pending[path] = now
+            return None
+        return now
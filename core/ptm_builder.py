@@ -46,6 +46,8 @@
 used to tell whether it worked; the output file is checked instead.
 """
 
+import hashlib
+import json
 import locale
 import os
 import re
@@ -53,11 +55,15 @@
 import subprocess
 import sys
 import tempfile
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from pathlib import Path
 
-import numpy as np
-from PIL import Image
-
-from core import ptm_fitter, ptm_format
+from core import decoders, ptm_fitter, ptm_format
+from core.fit_stats import FitStats
 
 #: The fitter tokenises .lp lines on whitespace, so a name containing any is
 #: unusable whatever the encoding.
@@ -67,6 +73,11 @@
 STAGED_LP = "ptmfit.lp"
 STAGED_PTM = "ptmfit.ptm"
 
+#: Scales a preview fit can decode at. libjpeg can produce 1/2, 1/4 and 1/8
+#: directly from the DCT coefficients, skipping most of the inverse transform
+#: and all of the upsampling that full-size decoding spends its time on.
+PREVIEW_REDUCTIONS = (2, 4, 8)
+
 
 class PtmFitterNotFoundError(Exception):
     """The configured PTMfitter executable is not on disk."""
@@ -156,6 +167,12 @@ def lp_path_for(image_directory):
     return os.path.join(image_directory, name + ".lp")
 
 
+def checkpoint_path_for(image_directory):
+    """Where an interrupted fit's progress is kept: beside the images too."""
+    name = os.path.basename(os.path.normpath(image_directory))
+    return os.path.join(image_directory, name + ".fitcheckpoint")
+
+
 def write_lp(path, content):
     """Write a .lp for the fitter, in the codepage it reads.
 
@@ -269,13 +286,128 @@ def _subprocess_runner(command, cwd):
     subprocess.run(command, cwd=cwd, check=False)
 
 
-def load_image(path):
-    """Decode one capture as an (height, width, 3) uint8 array."""
-    with Image.open(path) as image:
-        return np.asarray(image.convert("RGB"))
+def load_image(path, reduction=1, out=None):
+    """Decode one capture as an (height, width, 3) uint8 array.
+
+    Args:
+        path (str): The capture.
+        reduction (int): Decode at 1/reduction of full size, rounding up. A
+            JPEG is scaled by the decoder itself, which is the point: the
+            full-size image never exists. Anything else is decoded whole and
+            box-filtered down to the same dimensions, so a capture that mixes
+            formats still fits.
+        out (np.ndarray | None): Decode into this array, if it is the right
+            shape, rather than a new one; see `decode_ahead`.
+
+    Returns:
+        np.ndarray: `out`, or a new array if `out` was None or did not fit.
+
+    The decoding library is `core.decoders`' choice: the fastest one installed,
+    found by timing them on the first image, or the one `decoders.use` names.
+    """
+    return decoders.decode(path, reduction, out)
+
+
+def decode_workers():
+    """How many images to decode at once by default: one per core."""
+    return os.cpu_count() or 1
 
 
-def generate_native(slots, light_vectors, destination, progress=None, loader=load_image):
+def decode_ahead(paths, loader=load_image, workers=None, resident=None, reuse=False):
+    """Decode `paths` on a pool of threads, yielding the images in order.
+
+    Decoding is about 96% of a fit, and it is one image at a time only because
+    the loop asks for one at a time. Here up to `workers` decoders run while
+    the fit absorbs the image in front of them.
+
+    Threads rather than processes: Pillow releases the GIL while libjpeg runs,
+    so threads decode on every core, and the result is already in this
+    process. A process pool would pickle each image back across a pipe -- 144
+    MB per image at 48 megapixels, which is the allocation streaming exists to
+    avoid.
+
+    With `reuse`, the images are decoded into a ring of at most `resident`
+    arrays: once the caller has moved on from an image, its array is handed
+    to the next decode as ``loader(path, out=array)``. After the first
+    `resident` images no decode allocates anything the size of an image, so
+    a fit of fifty does not map, fault in and unmap 144 MB fifty times over.
+
+    Args:
+        paths (list[str]): The images, in light order.
+        loader: Called with a path, returns an image array. Runs on the pool.
+        workers (int | None): Decoders running at once. Defaults to
+            `decode_workers()`.
+        resident (int | None): The most images alive at once, counting the one
+            the caller is holding and those being decoded. Defaults to one more
+            than `workers`, which keeps every decoder busy. 1 decodes strictly
+            one at a time, as the fit did before this existed.
+        reuse (bool): Decode into recycled arrays. `loader` must then take an
+            ``out`` keyword, as `load_image` does.
+
+    Yields:
+        np.ndarray: Each image, in the order of `paths`. The caller must drop
+        its reference before asking for the next one, or the bound is one
+        image higher -- `ptm_fitter.fit_streaming` does. With `reuse` it must
+        also be finished with it: the array is overwritten by a later decode.
+    """
+    workers = max(1, workers or decode_workers())
+    resident = workers + 1 if resident is None else resident
+    if resident < 1:
+        raise ValueError(f"at least one image must be resident, not {resident}")
+
+    upcoming = iter(paths)
+    pending: deque = deque()
+    # Arrays the caller has finished with, for the next decodes to fill.
+    spare: list = []
+    lent = None
+    pool = ThreadPoolExecutor(max_workers=min(workers, resident), thread_name_prefix="decode")
+    try:
+        while True:
+            if lent is not None and lent.flags.writeable:
+                spare.append(lent)
+            lent = None
+            # Topped up *after* the caller has let go of the previous image,
+            # so that image's slot is the one refilled.
+            while len(pending) < resident:
+                path = next(upcoming, None)
+                if path is None:
+                    break
+                if reuse:
+                    out = spare.pop() if spare else None
+                    pending.append(pool.submit(loader, path, out=out))
+                    del out
+                else:
+                    pending.append(pool.submit(loader, path))
+            if not pending:
+                return
+            if reuse:
+                lent = pending.popleft().result()
+                yield lent
+                continue
+            # No local name for the future or its result: either would keep
+            # the image alive while the generator is suspended in the yield.
+            yield pending.popleft().result()
+    finally:
+        # A cancelled or failed fit closes the generator; decodes that have
+        # not started are dropped rather than run for nothing.
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def generate_native(
+    slots,
+    light_vectors,
+    destination,
+    progress=None,
+    loader=load_image,
+    workers=None,
+    resident=None,
+    bands=None,
+    batch=1,
+    reduction=1,
+    scratch_dir=None,
+    checkpoint_interval=None,
+    stats=None,
+):
     """Fit the PTM in-process and write it to `destination`.
 
     Unlike `generate` this has no opinion about paths: nothing shells out, so
@@ -289,29 +421,250 @@ def generate_native(slots, light_vectors, destination, progress=None, loader=loa
         destination (str): Where the .ptm goes.
         progress: Optional `progress(done, total)`, called per image. The fit
             reads every capture, so this is not instant.
-        loader: Seam for tests; called with a path, returns an image array.
+        loader: Seam for tests; called as ``loader(path, out=array)`` and
+            returns an image array, as `load_image` does. The images are
+            decoded into a ring of reused arrays; see `decode_ahead`.
+        workers (int | None): Images decoded at once; see `decode_ahead`.
+        resident (int | None): The most decoded images held at once; see
+            `decode_ahead`. Each costs 3 bytes per pixel on top of
+            `ptm_fitter.memory_estimate`.
+        bands (int | None): Row bands the fit updates in parallel; see
+            `ptm_fitter.fit_streaming`. Defaults to one per core.
+        batch (int): Images applied per matrix multiplication; see
+            `ptm_fitter.fit_streaming`.
+        reduction (int): 1 for the full fit, or one of `PREVIEW_REDUCTIONS` for
+            a preview at that fraction of the size: each capture is decoded
+            small by `loader(path, reduction=...)`, so the decode that dominates
+            a fit shrinks with it. The .ptm is a normal one, just smaller.
+        scratch_dir (str | None): Where to keep the fit's accumulators as
+            memory-mapped files, for captures whose
+            `ptm_fitter.memory_estimate` is more than the machine has. None
+            keeps them in memory.
+        checkpoint_interval (float | None): Seconds between saves of the fit's
+            progress to `checkpoint_path_for` the images, so that a fit
+            interrupted part way resumes there next time rather than decoding
+            everything again. None saves nothing. The file is removed when the
+            fit finishes, and is only resumed from for the same files, at the
+            same reduction, under the same lights.
+        stats (FitStats | None): Time the fit into it: each decode and the
+            write here, the rest in `ptm_fitter.fit_streaming`.
 
     Returns:
         str: The .lp written beside the images. Not needed by the fit — kept
         because it is the record of which light each shot was taken under.
 
+    Raises:
+        NoImagesToFitError: Nothing to fit.
+        ValueError: A reduction the decoder cannot produce.
+    """
+    if reduction != 1:
+        if reduction not in PREVIEW_REDUCTIONS:
+            raise ValueError(f"reduction must be 1 or one of {PREVIEW_REDUCTIONS}, not {reduction}")
+        loader = partial(loader, reduction=reduction)
+
+    usable, kept_lp = _keep_lp(slots, light_vectors)
+    paths = [os.path.join(slot.directory, slot.filename) for slot in usable]
+    lights = [light_vectors[slot.led_index] for slot in usable]
+    checkpoint = None
+    if checkpoint_interval is not None:
+        checkpoint = ptm_fitter.Checkpoint(
+            checkpoint_path_for(usable[0].directory),
+            key=_checkpoint_key(paths, lights, reduction),
+            interval=checkpoint_interval,
+        )
+    resumed = paths[checkpoint.start :] if checkpoint is not None else paths
+    if stats is None:
+        stats = FitStats()
+    loader = stats.timed_loader(loader, paths)
+    # Closed explicitly so a cancelled fit stops the decoders now, not whenever
+    # the generator happens to be collected.
+    decoded = decode_ahead(resumed, loader, workers=workers, resident=resident, reuse=True)
+    with closing(decoded) as images:
+        ptm = ptm_fitter.fit_streaming(
+            images,
+            lights,
+            progress=progress,
+            bands=bands or decode_workers(),
+            batch=batch,
+            scratch_dir=scratch_dir,
+            checkpoint=checkpoint,
+            stats=stats,
+        )
+    with stats.stage("write"):
+        ptm_format.write(destination, ptm)
+    return kept_lp
+
+
+def _checkpoint_key(paths, lights, reduction):
+    """What a checkpoint must have been saved for, to be resumed from.
+
+    Each file's size and mtime stand in for its content: a retake written over
+    a shot changes both, and hashing fifty full-size images to find out would
+    cost most of what resuming saves.
+    """
+    files = [(path, *_stamp(path)) for path in paths]
+    identity = json.dumps([files, [list(light) for light in lights], reduction])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+def _keep_lp(slots, light_vectors):
+    """Write the reference .lp beside the images, for a fit done in-process.
+
+    Returns:
+        tuple: (the usable slots, the .lp's path)
+
     Raises:
         NoImagesToFitError: Nothing to fit.
     """
     usable = usable_slots(slots)
     if not usable:
         raise NoImagesToFitError("no captured, included images")
-
     kept_lp = lp_path_for(usable[0].directory)
     write_reference_lp(kept_lp, build_lp_content(slots, light_vectors))
+    return usable, kept_lp
 
-    paths = [os.path.join(slot.directory, slot.filename) for slot in usable]
-    lights = [light_vectors[slot.led_index] for slot in usable]
-    ptm = ptm_fitter.fit_streaming(
-        lambda index: loader(paths[index]),
-        lights,
-        count=len(paths),
-        progress=progress,
-    )
-    ptm_format.write(destination, ptm)
-    return kept_lp
+
+class LiveFitUnavailableError(Exception):
+    """The live fit cannot vouch for its result; fit from the files instead."""
+
+
+class LiveFit:
+    """A fit kept up to date with the capture table while the capture runs.
+
+    The capture loop hands each shot over as it is accepted; it is decoded and
+    folded into a `ptm_fitter.IncrementalFit` on a worker thread, in the gaps
+    between shutters, so when the last one lands the PTM is a solve and a write
+    away rather than another pass over fifty files. A retake folds the old shot
+    out and the new one in; an unchecked shot is folded out. Each costs one
+    decode per image involved, not a refit.
+
+    Taking a shot out means decoding it again and subtracting, which is only
+    right if the file is what was folded in. Each file's size and mtime are
+    noted when it is folded, and if either has changed -- or if any decode or
+    fold failed -- `write` raises `LiveFitUnavailableError` and the caller fits
+    from the files as before. The live fit is a shortcut, never the only way.
+
+    Calls may come from any thread -- the GUI's records shots while a fit
+    worker writes -- and are serialised here; the folding is on a thread of its
+    own, and only there.
+    """
+
+    def __init__(self, loader=load_image):
+        self._loader = loader
+        self._fit = ptm_fitter.IncrementalFit()
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix="live-fit")
+        #: What the caller has asked for, by LED: (path, light). Caller's side.
+        self._wanted: dict = {}
+        #: What is in the fit, by LED: (path, size and mtime). Worker's side.
+        self._folded: dict = {}
+        #: The first thing that went wrong on the worker; after it, nothing is
+        #: folded and the fit is not used.
+        self._failure: Exception | None = None
+        #: The last image decoded, for the next decode to fill: the worker
+        #: decodes one at a time, so one array serves them all. Worker's side.
+        self._buffer = None
+        self._lock = threading.RLock()
+
+    @property
+    def failed(self):
+        """Whether something has gone wrong that makes the fit unusable."""
+        return self._failure is not None
+
+    def include(self, led_index, path, light):
+        """Have `path`, shot under `light`, be the image for `led_index`."""
+        light = tuple(light)
+        with self._lock:
+            if self._wanted.get(led_index) == (path, light):
+                return
+            self._wanted[led_index] = (path, light)
+            self._pool.submit(self._guarded, self._fold, led_index, path, light)
+
+    def exclude(self, led_index):
+        """Have no image for `led_index`."""
+        with self._lock:
+            if self._wanted.pop(led_index, None) is not None:
+                self._pool.submit(self._guarded, self._unfold, led_index)
+
+    def sync(self, slots, light_vectors):
+        """Bring the fit into line with the capture table: its checkboxes,
+        retakes and light positions."""
+        wanted = {
+            slot.led_index: (
+                os.path.join(slot.directory, slot.filename),
+                light_vectors[slot.led_index],
+            )
+            for slot in usable_slots(slots)
+        }
+        with self._lock:
+            for led_index in set(self._wanted) - set(wanted):
+                self.exclude(led_index)
+            for led_index, (path, light) in wanted.items():
+                self.include(led_index, path, light)
+
+    def write(self, slots, light_vectors, destination, stats=None):
+        """Sync with `slots`, wait for the folding to catch up, and write.
+
+        Returns and raises as `generate_native` does, plus:
+
+        Raises:
+            LiveFitUnavailableError: The fit cannot be trusted; use
+                `generate_native`. Nothing has been written.
+        """
+        if not usable_slots(slots):
+            raise NoImagesToFitError("no captured, included images")
+        if stats is None:
+            stats = FitStats()
+        try:
+            self.sync(slots, light_vectors)
+            # The images were decoded and absorbed during the capture; what
+            # is left is the folding still queued, then the solve.
+            with stats.stage("wait"):
+                self._pool.submit(lambda: None).result()
+            with stats.stage("quantise"):
+                ptm = self._pool.submit(self._result).result()
+        except (CancelledError, RuntimeError) as error:  # closed meanwhile
+            raise LiveFitUnavailableError("the live fit was closed") from error
+        _usable, kept_lp = _keep_lp(slots, light_vectors)
+        with stats.stage("write"):
+            ptm_format.write(destination, ptm)
+        return kept_lp
+
+    def close(self):
+        """Drop whatever is still queued. The fit is unusable afterwards."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _result(self):
+        if self._failure is not None:
+            raise LiveFitUnavailableError(str(self._failure)) from self._failure
+        return self._fit.result()
+
+    def _guarded(self, work, *args):
+        if self._failure is not None:
+            return
+        try:
+            work(*args)
+        except Exception as error:  # kept for write(), which falls back on it
+            self._failure = error
+
+    def _fold(self, led_index, path, light):
+        self._unfold(led_index)
+        stamp = _stamp(path)
+        self._buffer = self._loader(path, out=self._buffer)
+        self._fit.add(led_index, self._buffer, light)
+        self._folded[led_index] = (path, stamp)
+
+    def _unfold(self, led_index):
+        folded = self._folded.pop(led_index, None)
+        if folded is None:
+            return
+        path, stamp = folded
+        if _stamp(path) != stamp:
+            raise LiveFitUnavailableError(f"{path} has changed since it was fitted")
+        self._buffer = self._loader(path, out=self._buffer)
+        self._fit.remove(led_index, self._buffer)
+
+
+def _stamp(path):
+    """Enough of a file's identity to notice it being replaced."""
+    status = Path(path).stat()
+    return status.st_size, status.st_mtime_ns
@@ -27,10 +27,46 @@
 every image once per band, and decoding is about 96% of the runtime (see
 `devlog/20260728_P02_NativePtmFitter.md`). Streaming bounds memory *and*
 decodes each image exactly once.
+
+The rank-1 update is elementwise, so it also splits across cores by pixel:
+`fit_streaming(bands=n)` gives each of n threads a band of rows of the
+accumulators to update from every image.
+
+Applied one image at a time, the update reads and writes all six coefficient
+planes per image. `fit_streaming(batch=b)` instead holds the luminance of b
+images and applies them as one ``solver[:, batch] @ L_batch`` -- the same sum,
+regrouped -- so the accumulators are swept once per b images, at the cost of
+b luminance planes.
+
+Where even the accumulators do not fit in memory, `fit_streaming(scratch_dir=)`
+puts them, and the quantised output, in memory-mapped files instead. Every
+pass over them -- absorbing an image, finding a plane's range, quantising --
+walks each plane from start to end, so the disk sees long sequential runs and
+the fit is bound by its bandwidth rather than by seeks.
+
+A `Checkpoint` saves the accumulators now and then, so a fit that is killed
+part way resumes from the last save instead of decoding everything again.
+
+`IncrementalFit` is for a fit that grows while the capture runs, before the
+final set of lights is known. It cannot use the solver, which depends on that
+set, so it keeps the normal equations instead: ``AᵀA`` (6 x 6) and ``AᵀL``
+(six planes), both plain sums over images. An image can then be taken out as
+easily as it went in, and solving ``pinv(AᵀA) AᵀL`` at the end gives the same
+coefficients as ``pinv(A) L``.
 """
 
+import contextlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import pairwise
+from pathlib import Path
+
 import numpy as np
 
+from core.fit_stats import FitStats
 from core.ptm_format import COEFFICIENTS, Ptm, quantise, quantise_planes
 
 
@@ -131,29 +167,63 @@ def reconstruct(ptm, u, v):
         source images.
     """
     luminance = ptm.luminance(u, v)
-    return ptm.rgb.astype(np.float64) * (luminance[:, :, None] / 255.0)
+    luminance /= 255.0
+    rendered = ptm.rgb.astype(np.float64)
+    rendered *= luminance[:, :, None]
+    return rendered
 
 
 #: Full-resolution buffers `fit_streaming` holds, by element size.
-#: float: 6 coefficient planes, 3 colour planes, and 2 scratch rows.
-#: byte:  the 6-plane quantised output, the 3-channel result, and one image.
-_FLOAT_PLANES = COEFFICIENTS + 3 + 2
-_BYTE_PLANES = COEFFICIENTS + 3 + 3
+#: float: 6 coefficient planes, 3 colour planes and a scratch row, plus one
+#:        luminance row per image in a batch.
+#: byte:  the 6-plane quantised output and the 3-channel result, plus 3 for
+#:        each decoded image alive at once.
+_FLOAT_PLANES = COEFFICIENTS + 3 + 1
+_BYTE_PLANES = COEFFICIENTS + 3
 
+#: Pixels per matrix multiplication when a batch is applied. Small enough that
+#: the (6, chunk) product stays in cache rather than being another
+#: full-resolution temporary, large enough that BLAS is not called per row.
+_GEMM_CHUNK = 1 << 16
 
-def memory_estimate(width, height, dtype=np.float32):
+
+def memory_estimate(width, height, dtype=np.float32, resident=1, batch=1, on_disk=False):
     """Bytes `fit_streaming` holds at its peak, excluding the decoder.
 
     Counted from the buffers it actually allocates rather than the ones it
     conceptually needs — an earlier version of this function omitted the
     scratch rows and the output arrays and came out at half the measured
     figure, which is worse than not estimating at all.
+
+    Args:
+        resident (int): Decoded images alive at once. One for a plain loader;
+            more when `ptm_builder.decode_ahead` is decoding ahead of the fit.
+        batch (int): Images per matrix multiplication; see `fit_streaming`.
+        on_disk (bool): The accumulators and output are in a `scratch_dir`,
+            leaving only the scratch and luminance rows and the images in
+            memory. The page cache will use whatever else is free, but none of
+            it has to be.
     """
     pixels = width * height
-    return pixels * (_FLOAT_PLANES * np.dtype(dtype).itemsize + _BYTE_PLANES)
-
-
-def fit_streaming(loader, light_directions, count=None, dtype=np.float32, progress=None):
+    itemsize = np.dtype(dtype).itemsize
+    if on_disk:
+        return pixels * ((1 + batch) * itemsize + 3 * resident)
+    floats = (_FLOAT_PLANES + batch) * itemsize
+    return pixels * (floats + _BYTE_PLANES + 3 * resident)
+
+
+def fit_streaming(
+    loader,
+    light_directions,
+    count=None,
+    dtype=np.float32,
+    progress=None,
+    bands=1,
+    batch=1,
+    scratch_dir=None,
+    checkpoint=None,
+    stats=None,
+):
     """Fit without ever holding more than one image.
 
     Args:
@@ -166,88 +236,481 @@ def fit_streaming(loader, light_directions, count=None, dtype=np.float32, progre
             and is ample for 8-bit input — the fit is over at most a few hundred
             values per pixel, each under 766.
         progress: Optional callable, `progress(index, count)`, after each image.
+        bands (int): Row bands absorbed in parallel, one thread each. numpy
+            releases the GIL for the arithmetic, and each band writes only its
+            own rows of the accumulators, so they share them without locking.
+            Every pixel sees the same operations in the same order whatever
+            the banding, so the result is byte-identical to `bands=1`.
+        batch (int): Images whose luminance is held and applied as one matrix
+            multiplication. 1 is the plain rank-1 update. More trades one
+            luminance plane per image for fewer passes over the accumulators;
+            BLAS sums in its own order, so the coefficients agree with
+            `batch=1` to rounding rather than to the byte.
+        scratch_dir (str | None): Directory for memory-mapped accumulators and
+            output, for captures too large to fit in memory; None keeps them in
+            memory. The files are anonymous -- unlinked as soon as they are
+            created -- so nothing is left behind, and the space is released
+            when the returned Ptm is. The result is byte-identical either way.
+        checkpoint (Checkpoint | None): Save progress to it as the fit goes,
+            and remove it once the fit is done. If it holds progress for
+            these inputs, the fit resumes from `checkpoint.start`: a callable
+            loader is called from there, and an iterable must start there.
+        stats (FitStats | None): Time the fit into it, by stage and by image:
+            waiting for images, absorbing, checkpointing and quantising.
 
     Returns:
-        Ptm: ready to write.
+        Ptm: ready to write. With a `scratch_dir`, its arrays are views of the
+        mapped files.
 
     Raises:
         FitError: Too few images, or an image whose shape does not match the
             first one.
     """
     lights = np.asarray(light_directions, dtype=np.float64)
+    if stats is None:
+        stats = FitStats()
+    # Where a checkpoint left off; the loader supplies the images from there.
+    start = checkpoint.start if checkpoint is not None else 0
     if callable(loader):
         if count is None:
             raise FitError("count is required when loader is a callable")
-        images = iter(loader(i) for i in range(count))
+        images = iter(loader(i) for i in range(start, count))
     else:
         images = iter(loader)
         count = len(lights)
 
-    if count != len(lights):
-        raise FitError(f"{count} images but {len(lights)} light directions")
-    if count < COEFFICIENTS:
-        raise FitError(f"a biquadratic needs at least {COEFFICIENTS} images, got {count}")
+    _check_counts(count, len(lights), batch)
 
     # (6, N): column i is this image's contribution to every coefficient.
     solver = np.linalg.pinv(design_matrix(lights)).astype(dtype)
 
     try:
-        first = _validated_image(next(images), 0)
+        with stats.stage("wait"):
+            first = _validated_image(next(images), start)
     except StopIteration:
         raise FitError("no images were supplied") from None
 
     # Allocated from the first image rather than lazily inside the loop, so
-    # every buffer below is an array and not "an array once we have seen one".
+    # every buffer is an array and not "an array once we have seen one".
     shape = first.shape
-    height, width, _ = shape
-    pixels = height * width
-    coefficients = np.zeros((COEFFICIENTS, pixels), dtype=dtype)
-    colour_sum = np.zeros((3, pixels), dtype=dtype)
-    # Reused every iteration. Without these the loop allocates a
-    # full-resolution temporary per image per operation, which at 48MP dwarfs
-    # the accumulators it is supposed to be avoiding.
-    luminance = np.empty(pixels, dtype=dtype)
-    scratch = np.empty(pixels, dtype=dtype)
+    sums = _Accumulators(solver, shape, dtype, bands, batch, _allocator(scratch_dir))
 
     def absorb(image, index):
+        started = stats.clock()
+        sums.absorb(image, index)
+        stats.absorbed(index, stats.clock() - started)
+        done = index + 1
+        if checkpoint is not None and done < count and checkpoint.due():
+            with stats.stage("checkpoint"):
+                sums.flush()
+                checkpoint.save(done, sums.coefficients, sums.colour_sum)
+        if progress is not None:
+            progress(done, count)
+
+    try:
+        if start:
+            checkpoint.restore(sums.coefficients, sums.colour_sum)
+        absorb(first, start)
+        del first
+
+        # Pulled explicitly rather than with `for ... in`, so the previous
+        # image is released *before* the next is fetched. A plain for-loop
+        # keeps the last one bound while the loader produces the next, leaving
+        # two resident at the peak -- 288 MB of them at 48 megapixels.
+        index = start
+        while True:
+            try:
+                with stats.stage("wait"):
+                    image = next(images)
+            except StopIteration:
+                break
+            index += 1
+            image = _validated_image(image, index, shape)
+            absorb(image, index)
+            del image
+        with stats.stage("absorb"):
+            sums.flush()
+    finally:
+        sums.close()
+
+    with stats.stage("quantise"):
+        ptm = sums.assemble()
+    if checkpoint is not None:
+        checkpoint.discard()
+    return ptm
+
+
+class _Accumulators:
+    """The running sums of `fit_streaming`, and the arithmetic that adds to them."""
+
+    def __init__(self, solver, shape, dtype, bands, batch, allocate):
+        height, width, _ = shape
+        pixels = height * width
+        self.solver = solver
+        self.dtype = dtype
+        self.batch = batch
+        self.allocate = allocate
+        self.width, self.height = width, height
+        self.coefficients = allocate((COEFFICIENTS, pixels), dtype)
+        self.colour_sum = allocate((3, pixels), dtype)
+        # Reused every iteration. Without these the loop allocates a
+        # full-resolution temporary per image per operation, which at 48MP
+        # dwarfs the accumulators it is supposed to be avoiding.
+        self.luminance = np.empty((batch, pixels), dtype=dtype)
+        self.scratch = np.empty(pixels, dtype=dtype)
+        # Images whose luminance is in `luminance` but not yet in
+        # `coefficients`.
+        self.batched: list[int] = []
+
+        self.rows = _row_bands(height, width, bands)
+        # No pool at all for one band: the serial path stays what it always was.
+        self.pool = (
+            ThreadPoolExecutor(len(self.rows), thread_name_prefix="absorb")
+            if len(self.rows) > 1
+            else None
+        )
+
+    def absorb(self, image, index):
         """Fold one image into the accumulators."""
         channels = image.reshape(-1, 3).T  # (3, pixels), a view
+        dtype = self.dtype
+        if self.batch == 1:
+            weights = self.solver[:, index]
+            self._each_band(
+                lambda part: _absorb_band(
+                    channels[:, part],
+                    weights,
+                    self.coefficients[:, part],
+                    self.colour_sum[:, part],
+                    self.luminance[0, part],
+                    self.scratch[part],
+                    dtype,
+                )
+            )
+            return
+
+        slot = len(self.batched)
+        self._each_band(
+            lambda part: _sum_channels(
+                channels[:, part], self.colour_sum[:, part], self.luminance[slot, part], dtype
+            )
+        )
+        self.batched.append(index)
+        if len(self.batched) == self.batch:
+            self.flush()
+
+    def flush(self):
+        """Apply the held luminance rows as one multiplication per band."""
+        if not self.batched:
+            return
+        held = len(self.batched)
+        weights = self.solver[:, self.batched]  # (6, held)
+        self._each_band(
+            lambda part: _absorb_batch(
+                weights, self.luminance[:held, part], self.coefficients[:, part]
+            )
+        )
+        self.batched.clear()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def assemble(self):
+        return _assemble(
+            self.coefficients,
+            self.colour_sum,
+            self.scratch,
+            self.width,
+            self.height,
+            self.allocate,
+        )
 
-        # L = R + G + B, into the reused buffer.
-        np.add(channels[0], channels[1], out=luminance, dtype=dtype)
-        np.add(luminance, channels[2], out=luminance)
+    def _each_band(self, band):
+        """Call `band(part)` for every band, on the pool when there is one."""
+        if self.pool is None:
+            band(self.rows[0])
+        else:
+            # list() so an exception in any band is raised here.
+            list(self.pool.map(band, self.rows))
 
-        # The rank-1 update, one coefficient at a time so the (6, pixels)
-        # product is never materialised.
-        for k in range(COEFFICIENTS):
-            np.multiply(luminance, solver[k, index], out=scratch)
-            coefficients[k] += scratch
 
-        for channel in range(3):
-            colour_sum[channel] += channels[channel]
+class Checkpoint:
+    """Where `fit_streaming` saves its progress, and resumes from.
 
-        if progress is not None:
-            progress(index + 1, count)
+    A fit is hundreds of decodes, and until now one killed at image 90 of 100
+    -- a crash, a cancel, a laptop going to sleep -- started again from image
+    1. With a checkpoint the accumulators and the count of images absorbed are
+    written out every so often, and the next fit of the same images picks up
+    from there instead of decoding them all again.
 
-    absorb(first, 0)
-    del first
+    Saved by time rather than by image count: at 48 megapixels a save is about
+    1.7 GB, and a fixed count would make that overhead scale with how fast the
+    images decode. Each save replaces the last atomically, so an interruption
+    during one leaves the previous intact.
 
-    # Pulled explicitly rather than with `for ... in`, so the previous image is
-    # released *before* the next is fetched. A plain for-loop keeps the last one
-    # bound while the loader produces the next, leaving two resident at the
-    # peak -- 288 MB of them at 48 megapixels.
-    index = 0
-    while True:
+    The file is the accumulators raw, after a short JSON header -- no
+    compression, no archive -- so saving and restoring read and write them in
+    place, without a copy.
+
+    Args:
+        path (str): The checkpoint file.
+        key (str): Identifies the inputs -- which images, which lights. A file
+            saved under any other key is ignored and, in time, replaced.
+        interval (float): Seconds between saves.
+        clock: Seam for tests; returns seconds.
+    """
+
+    MAGIC = b"PTMGenerator fit checkpoint 1\n"
+
+    def __init__(self, path, key="", interval=60.0, clock=time.monotonic):
+        self.path = path
+        self.key = key
+        self.interval = interval
+        self.clock = clock
+        self._last_save = clock()
+        #: Images already absorbed by the saved fit; 0 if there is none to
+        #: resume.
+        self.start = 0
+        self._header: dict = {}
+        self._offset = 0
+        self._read_header()
+
+    def due(self):
+        """Whether it is time to save again."""
+        return self.clock() - self._last_save >= self.interval
+
+    def save(self, done, coefficients, colour_sum):
+        """Record that `done` images are in these accumulators."""
+        header = {
+            "key": self.key,
+            "done": done,
+            "shape": list(coefficients.shape),
+            "dtype": coefficients.dtype.str,
+        }
+        partial = self.path + ".partial"
+        with open(partial, "wb") as fh:
+            fh.write(self.MAGIC)
+            fh.write(json.dumps(header).encode("ascii") + b"\n")
+            for array in (coefficients, colour_sum):
+                fh.write(np.ascontiguousarray(array))
+            fh.flush()
+            os.fsync(fh.fileno())
+        Path(partial).replace(self.path)
+        self._last_save = self.clock()
+
+    def restore(self, coefficients, colour_sum):
+        """Read the saved accumulators into these, which are shaped to match.
+
+        Raises:
+            FitError: The saved fit is of differently sized images.
+        """
+        saved = (tuple(self._header["shape"]), np.dtype(self._header["dtype"]))
+        if saved != (coefficients.shape, coefficients.dtype):
+            raise FitError(f"the checkpoint {self.path} is of a different size of image")
+        with open(self.path, "rb") as fh:
+            fh.seek(self._offset)
+            for array in (coefficients, colour_sum):
+                fh.readinto(memoryview(array).cast("B"))
+
+    def discard(self):
+        """Remove the file: the fit it was for has finished."""
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+        self.start = 0
+
+    def _read_header(self):
+        """Find what the file has to resume, if it is for these inputs."""
         try:
-            image = next(images)
-        except StopIteration:
-            break
-        index += 1
-        image = _validated_image(image, index, shape)
-        absorb(image, index)
-        del image
+            with open(self.path, "rb") as fh:
+                if fh.readline() != self.MAGIC:
+                    return
+                header = json.loads(fh.readline())
+                offset = fh.tell()
+        except (OSError, ValueError):
+            return  # missing or unreadable: nothing to resume
+        if header.get("key") == self.key:
+            self._header, self._offset = header, offset
+            self.start = int(header["done"])
+
+
+class IncrementalFit:
+    """A fit that images can be added to and taken out of, in any order.
+
+    Each image is folded in once, under a key the caller chooses -- the LED
+    index, in the capture loop -- and can later be folded back out by passing
+    the same image again, so a retake or an unchecked shot costs one decode
+    rather than a refit. Memory is what `fit_streaming` holds, and `result`
+    briefly adds a copy of the accumulators.
+
+    Not thread-safe: one caller at a time. `ptm_builder.LiveFit` serialises
+    the work onto a single thread.
+    """
 
-    return _assemble(coefficients, colour_sum, scratch, width, height)
+    def __init__(self, dtype=np.float32):
+        self.dtype = dtype
+        self.lights: dict = {}
+        #: (height, width, 3), from the first image; every later one matches.
+        self.shape: tuple = ()
+        self._gram = np.zeros((COEFFICIENTS, COEFFICIENTS))
+        # Sized by the first image. Zero pixels until then.
+        self._weighted = np.zeros((COEFFICIENTS, 0), dtype=dtype)
+        self._colour_sum = np.zeros((3, 0), dtype=dtype)
+        self._luminance = np.empty(0, dtype=dtype)
+        self._scratch = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.lights)
+
+    def add(self, key, image, light_direction):
+        """Fold one image in.
+
+        Args:
+            key: Names the image for `remove`. Hashable.
+            image: (height, width, 3) uint8, the same shape as every other.
+            light_direction: Its (u, v) or (u, v, w) unit light vector.
+
+        Raises:
+            FitError: The image is the wrong shape.
+            ValueError: `key` is already in the fit.
+        """
+        if key in self.lights:
+            raise ValueError(f"{key!r} is already in the fit")
+        image = self._validated(image, key)
+        terms = design_matrix([light_direction])[0]
+        self._fold(image, terms, np.add)
+        self.lights[key] = light_direction
+
+    def remove(self, key, image):
+        """Fold an image back out: the same pixels that `add` was given.
+
+        Raises:
+            KeyError: `key` is not in the fit.
+            FitError: The image is the wrong shape.
+        """
+        terms = design_matrix([self.lights[key]])[0]
+        image = self._validated(image, key)
+        self._fold(image, terms, np.subtract)
+        del self.lights[key]
+
+    def result(self):
+        """Solve for the images folded in so far. The fit can carry on after.
+
+        Returns:
+            Ptm: ready to write.
+
+        Raises:
+            FitError: Fewer than six images.
+        """
+        if len(self.lights) < COEFFICIENTS:
+            raise FitError(
+                f"a biquadratic needs at least {COEFFICIENTS} images, got {len(self.lights)}"
+            )
+        height, width, _ = self.shape
+        # pinv(AᵀA) Aᵀ is pinv(A), whatever the rank.
+        inverse = np.linalg.pinv(self._gram).astype(self.dtype)
+        coefficients = np.zeros_like(self._weighted)
+        _absorb_batch(inverse, self._weighted, coefficients)
+        return _assemble(coefficients, self._colour_sum.copy(), self._scratch, width, height)
+
+    def _validated(self, image, key):
+        image = _validated_image(image, key, self.shape or None)
+        if not self.shape:
+            self.shape = image.shape
+            pixels = image.shape[0] * image.shape[1]
+            self._weighted = np.zeros((COEFFICIENTS, pixels), dtype=self.dtype)
+            self._colour_sum = np.zeros((3, pixels), dtype=self.dtype)
+            self._luminance = np.empty(pixels, dtype=self.dtype)
+            self._scratch = np.empty(pixels, dtype=self.dtype)
+        return image
+
+    def _fold(self, image, terms, update):
+        """`update` (np.add or np.subtract) one image's share into every sum."""
+        channels = image.reshape(-1, 3).T
+        np.add(channels[0], channels[1], out=self._luminance, dtype=self.dtype)
+        np.add(self._luminance, channels[2], out=self._luminance)
+        for k in range(COEFFICIENTS):
+            np.multiply(self._luminance, terms[k], out=self._scratch)
+            update(self._weighted[k], self._scratch, out=self._weighted[k])
+        # Sums of bytes, exact in float32 for any realistic number of images,
+        # so taking one out restores the colour to the bit.
+        for channel in range(3):
+            update(self._colour_sum[channel], channels[channel], out=self._colour_sum[channel])
+        update(self._gram, np.outer(terms, terms), out=self._gram)
+
+
+def _row_bands(height, width, bands):
+    """Split the pixels into at most `bands` runs of whole rows.
+
+    Whole rows, so each band is one contiguous slice of every plane.
+    """
+    bands = max(1, min(bands, height))
+    edges = [height * i // bands * width for i in range(bands + 1)]
+    return [slice(start, stop) for start, stop in pairwise(edges)]
+
+
+def _allocator(scratch_dir):
+    """`allocate(shape, dtype)` for the full-resolution buffers, zero-filled.
+
+    In memory, or in a file in `scratch_dir`. The file is a `TemporaryFile`:
+    already unlinked, it lives exactly as long as the mapping does.
+    """
+    if scratch_dir is None:
+        return np.zeros
+
+    def allocate(shape, dtype):
+        with tempfile.TemporaryFile(dir=scratch_dir) as file:
+            return np.memmap(file, dtype=dtype, mode="w+", shape=shape)
+
+    return allocate
+
+
+def _check_counts(count, lights, batch):
+    """The FitErrors `fit_streaming` can raise before reading anything."""
+    if count != lights:
+        raise FitError(f"{count} images but {lights} light directions")
+    if count < COEFFICIENTS:
+        raise FitError(f"a biquadratic needs at least {COEFFICIENTS} images, got {count}")
+    if batch < 1:
+        raise FitError(f"a batch is at least one image, not {batch}")
+
+
+def _absorb_band(channels, weights, coefficients, colour_sum, luminance, scratch, dtype):
+    """The rank-1 update for one band of pixels. Every argument is a view."""
+    _sum_channels(channels, colour_sum, luminance, dtype)
+
+    # One coefficient at a time so the (6, pixels) product is never
+    # materialised.
+    for k in range(COEFFICIENTS):
+        np.multiply(luminance, weights[k], out=scratch)
+        coefficients[k] += scratch
+
+
+def _sum_channels(channels, colour_sum, luminance, dtype):
+    """Add an image into the colour sums, and its luminance into `luminance`."""
+    # L = R + G + B, into the reused buffer.
+    np.add(channels[0], channels[1], out=luminance, dtype=dtype)
+    np.add(luminance, channels[2], out=luminance)
+
+    for channel in range(3):
+        colour_sum[channel] += channels[channel]
+
+
+def _absorb_batch(weights, luminance, coefficients):
+    """``coefficients += weights @ luminance``, a cache-sized chunk at a time.
+
+    Args:
+        weights (np.ndarray): (6, b) solver columns for the batched images.
+        luminance (np.ndarray): (b, pixels) their luminance.
+        coefficients (np.ndarray): (6, pixels) accumulators, updated in place.
+    """
+    pixels = luminance.shape[1]
+    product = np.empty((COEFFICIENTS, min(_GEMM_CHUNK, pixels)), dtype=coefficients.dtype)
+    for start in range(0, pixels, _GEMM_CHUNK):
+        stop = min(start + _GEMM_CHUNK, pixels)
+        out = product[:, : stop - start]
+        np.matmul(weights, luminance[:, start:stop], out=out)
+        coefficients[:, start:stop] += out
 
 
 def _validated_image(value, index, expected=None):
@@ -260,12 +723,13 @@ def _validated_image(value, index, expected=None):
     return array
 
 
-def _assemble(coefficients, colour_sum, scratch, width, height):
+def _assemble(coefficients, colour_sum, scratch, width, height, allocate=np.zeros):
     """Turn the accumulators into a Ptm, reusing their storage throughout.
 
     Everything here is in place. At 48 megapixels each of these arrays is
     hundreds of megabytes, and a single incautious expression would allocate
-    another copy of one.
+    another copy of one. The two byte outputs come from `allocate`, so they go
+    wherever the accumulators went.
     """
     # The summed luminance is the summed colour added up, so it never needed
     # its own accumulator. Reuses `scratch`, which is finished with.
@@ -279,11 +743,15 @@ def _assemble(coefficients, colour_sum, scratch, width, height):
         colour_sum[channel] /= scratch
     np.clip(colour_sum, 0, 255, out=colour_sum)
     np.rint(colour_sum, out=colour_sum)
-    rgb = colour_sum.T.astype(np.uint8)
+    pixels = height * width
+    rgb = allocate((3, pixels), np.uint8)
+    np.copyto(rgb, colour_sum, casting="unsafe")
 
     # Quantised in place, in the (6, pixels) layout it was accumulated in.
     # Transposing to (h, w, 6) first would copy the whole array, and quantising
     # it whole would allocate several more copies on top.
-    planes, scale, bias = quantise_planes(coefficients)
+    planes, scale, bias = quantise_planes(
+        coefficients, out=allocate((COEFFICIENTS, pixels), np.uint8)
+    )
     quantised = planes.T.reshape(height, width, COEFFICIENTS)
-    return Ptm(width, height, scale, bias, quantised, rgb.reshape(height, width, 3))
+    return Ptm(width, height, scale, bias, quantised, rgb.T.reshape(height, width, 3))
@@ -32,6 +32,8 @@
   a byte means nothing without the header's scale and bias for its position.
 """
 
+import os
+
 import numpy as np
 
 VERSION = "PTM_1.2"
@@ -52,6 +54,11 @@
 SCALE_DECIMALS = 6
 SMALLEST_SCALE = 10.0**-SCALE_DECIMALS
 
+#: Bytes `write` gathers at a time. Each chunk of rows is flipped and
+#: interleaved into a buffer about this size and written, so writing costs a
+#: few megabytes whatever the image -- not another copy of the output.
+WRITE_CHUNK_BYTES = 4 << 20
+
 
 class PtmFormatError(Exception):
     """The file is not a PTM this module can read."""
@@ -87,14 +94,25 @@ def dequantised(self):
     def luminance(self, u, v):
         """Evaluate the polynomial at one light direction.
 
+        A plane at a time, straight from the bytes: ``(byte - bias) * scale``
+        summed against the terms is the bytes against ``scale * terms``, less
+        a constant. So no (height, width, 6) float array is built, just the
+        result and one plane of scratch. For rendering many lights, or quickly,
+        see `core.relight`.
+
         Args:
             u, v (float): First two components of a unit light vector.
 
         Returns:
             np.ndarray: (height, width) float64.
         """
-        terms = np.array([u * u, v * v, u * v, u, v, 1.0])
-        return self.dequantised() @ terms
+        weights = self.scale * np.array([u * u, v * v, u * v, u, v, 1.0])
+        luminance = np.full((self.height, self.width), -float(self.bias @ weights))
+        scratch = np.empty_like(luminance)
+        for k in range(COEFFICIENTS):
+            np.multiply(self.coefficients[:, :, k], weights[k], out=scratch)
+            luminance += scratch
+        return luminance
 
     def __eq__(self, other):
         if not isinstance(other, Ptm):
@@ -123,55 +141,115 @@ def read(path):
         PtmFormatError: Not a PTM 1.2, not LRGB, or the payload is short.
     """
     with open(path, "rb") as fh:
-        version = _read_token_line(fh, "the version")
-        if version != VERSION:
-            raise PtmFormatError(f"not a {VERSION} file: {version!r}")
-
-        image_format = _read_token_line(fh, "the format")
-        if image_format != FORMAT_LRGB:
-            # The compressed variants exist; nothing here produces or needs
-            # them, and a clear refusal beats a confusing misparse.
-            raise PtmFormatError(f"only {FORMAT_LRGB} is supported, not {image_format!r}")
-
-        width = int(_read_token_line(fh, "the width"))
-        height = int(_read_token_line(fh, "the height"))
-        scale = [float(x) for x in _read_token_line(fh, "the scales").split()]
-        bias = [int(x) for x in _read_token_line(fh, "the biases").split()]
-        if len(scale) != COEFFICIENTS or len(bias) != COEFFICIENTS:
-            raise PtmFormatError(
-                f"expected {COEFFICIENTS} scales and biases, got {len(scale)} and {len(bias)}"
-            )
-
-        pixels = width * height
-        payload = fh.read()
-
-    expected = pixels * (COEFFICIENTS + 3)
-    if len(payload) < expected:
+        width, height, scale, bias = _read_header(fh)
+        # One copy of the payload, as bytes; the arrays below are views of it
+        # rather than slices, which would be a second.
+        payload = np.frombuffer(fh.read(), dtype=np.uint8)
+
+    _check_payload(len(payload), width, height)
+    return _unpack(payload, width, height, scale, bias)
+
+
+def read_mapped(path):
+    """Parse like `read`, but map the payload instead of reading it.
+
+    Opening costs the header and nothing more, however large the file: the
+    arrays are views of the mapping, and the operating system reads only the
+    pages something actually touches. For a viewer or validator that wants a
+    few rows of a half-gigabyte file, that is the difference between instant
+    and several seconds and the file's size in memory.
+
+    The arrays are read-only. The file stays open while any of them is alive,
+    which on Windows means it cannot be replaced until they are released.
+
+    Raises:
+        PtmFormatError: As `read`.
+    """
+    with open(path, "rb") as fh:
+        width, height, scale, bias = _read_header(fh)
+        offset = fh.tell()
+        available = os.fstat(fh.fileno()).st_size - offset
+
+    expected = _check_payload(available, width, height)
+    payload = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(expected,))
+    return _unpack(payload, width, height, scale, bias)
+
+
+def _read_header(fh):
+    """Parse the header, leaving `fh` at the first byte of the payload.
+
+    Returns:
+        tuple: (width, height, scale, bias)
+    """
+    version = _read_token_line(fh, "the version")
+    if version != VERSION:
+        raise PtmFormatError(f"not a {VERSION} file: {version!r}")
+
+    image_format = _read_token_line(fh, "the format")
+    if image_format != FORMAT_LRGB:
+        # The compressed variants exist; nothing here produces or needs
+        # them, and a clear refusal beats a confusing misparse.
+        raise PtmFormatError(f"only {FORMAT_LRGB} is supported, not {image_format!r}")
+
+    width = int(_read_token_line(fh, "the width"))
+    height = int(_read_token_line(fh, "the height"))
+    scale = [float(x) for x in _read_token_line(fh, "the scales").split()]
+    bias = [int(x) for x in _read_token_line(fh, "the biases").split()]
+    if len(scale) != COEFFICIENTS or len(bias) != COEFFICIENTS:
+        raise PtmFormatError(
+            f"expected {COEFFICIENTS} scales and biases, got {len(scale)} and {len(bias)}"
+        )
+    return width, height, scale, bias
+
+
+def _check_payload(available, width, height):
+    """The payload size for `width` x `height`, if `available` bytes hold it."""
+    expected = width * height * (COEFFICIENTS + 3)
+    if available < expected:
         raise PtmFormatError(
-            f"payload is {len(payload)} bytes, expected {expected} for {width}x{height}"
+            f"payload is {available} bytes, expected {expected} for {width}x{height}"
         )
+    return expected
 
-    coefficients = np.frombuffer(payload[: pixels * COEFFICIENTS], dtype=np.uint8)
-    rgb = np.frombuffer(payload[pixels * COEFFICIENTS : expected], dtype=np.uint8)
+
+def _unpack(payload, width, height, scale, bias):
+    """A Ptm whose arrays are views of `payload`, a flat uint8 array."""
+    split = width * height * COEFFICIENTS
+    coefficients = payload[:split].reshape(height, width, COEFFICIENTS)
+    rgb = payload[split : split + width * height * 3].reshape(height, width, 3)
     # Stored bottom row first; hand back the usual orientation.
-    coefficients = coefficients.reshape(height, width, COEFFICIENTS)[::-1]
-    rgb = rgb.reshape(height, width, 3)[::-1]
-    return Ptm(width, height, scale, bias, coefficients, rgb)
+    return Ptm(width, height, scale, bias, coefficients[::-1], rgb[::-1])
 
 
-def write(path, ptm):
+def write(path, ptm, chunk_bytes=WRITE_CHUNK_BYTES):
     """Write an uncompressed LRGB PTM.
 
     `ptm.coefficients` and `ptm.rgb` are top row first, as `read` returns them;
-    the flip back to the file's bottom-up order happens here.
+    the flip back to the file's bottom-up order happens here. They can be any
+    layout -- in particular the planar (6, pixels) buffer `fit_streaming`
+    quantises into, seen through a transpose -- because the interleaving is
+    done a chunk of rows at a time on the way out.
+
+    Args:
+        chunk_bytes (int): Roughly the most gathered at once; at least a row.
     """
     scales = " ".join(f"{s:.{SCALE_DECIMALS}f}" for s in ptm.scale)
     biases = " ".join(str(int(b)) for b in ptm.bias)
     header = f"{VERSION}\n{FORMAT_LRGB}\n{ptm.width}\n{ptm.height}\n{scales} \n{biases} \n"
     with open(path, "wb") as fh:
         fh.write(header.encode("ascii"))
-        fh.write(np.ascontiguousarray(ptm.coefficients[::-1]).tobytes())
-        fh.write(np.ascontiguousarray(ptm.rgb[::-1]).tobytes())
+        _write_bottom_up(fh, ptm.coefficients, chunk_bytes)
+        _write_bottom_up(fh, ptm.rgb, chunk_bytes)
+
+
+def _write_bottom_up(fh, image, chunk_bytes):
+    """Write (height, width, n) `image` bottom row first, interleaved."""
+    height, width, channels = image.shape
+    rows = max(1, chunk_bytes // max(1, width * channels * image.itemsize))
+    for stop in range(height, 0, -rows):
+        # Contiguous already -- one row of an interleaved image -- is written
+        # without a copy.
+        fh.write(np.ascontiguousarray(image[max(0, stop - rows) : stop][::-1]))
 
 
 def quantise(coefficients):
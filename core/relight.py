@@ -0,0 +1,353 @@
+"""Rendering a PTM under any light, fast enough to drag the light around.
+
+`Ptm.luminance` was written to check a fit, not to look at one: it built the
+whole (height, width, 6) float64 array of coefficients for every light, 2.2 GB
+at 48 megapixels, and `ptm_fitter.reconstruct` allocated more float64 on top.
+A viewer re-renders on every mouse move. `Relighter` does it from the uint8
+planes as they are stored, a tile at a time, in float32:
+
+* **No dequantising.** A stored byte ``c`` means ``(c - bias) * scale``, so
+  coefficient k's lookup table under a light is a straight line in the byte:
+  ``c * scale[k] * term[k] - bias[k] * scale[k] * term[k]``. Summed over the
+  six, those tables fold into one weight per coefficient and one constant per
+  light (`Relighter.weights`). A tile's bytes go through a single float32
+  matrix product with the weights, and the dequantised coefficients never
+  exist anywhere.
+* **Lights in batches.** The weights for n lights are a (6, n) matrix, so
+  rendering n lights costs one pass over the coefficients, not n. Enough for
+  a viewer that renders the neighbouring light directions ahead of the
+  mouse, or an export that renders a fixed set.
+* **Tiles.** At most `TILE_PIXELS` pixels are worked on at once, so the
+  temporaries stay a few megabytes whatever the image. A window -- rows and
+  columns, with a step for a zoomed-out view -- is rendered without touching
+  the rest, which with `ptm_format.read_mapped` means not reading it either.
+* **A cache.** Frames `render_cached` has made are kept, up to
+  `CACHE_BYTES`, keyed by the light rounded to `LIGHT_STEP` and the window.
+  Going back over a light already seen costs nothing.
+
+The output is what a viewer shows: ``rgb * luminance / 255``, rounded and
+clipped to uint8. Float32 is exact enough for that -- to within one grey level
+of the float64 `ptm_fitter.reconstruct` -- and halves the memory moved.
+
+A 45-megapixel map is still 45 million pixels to shade, which a screen cannot
+show anyway. `Pyramid` keeps a `Relighter` for each halving of the map -- the
+stored bytes averaged two by two, which is exact: the polynomial is linear in
+them -- and renders a view from the coarsest level that still has a pixel for
+every screen pixel, only over the part that is on screen. However large the
+map, a view costs about as many pixels as the screen has.
+
+Nothing here imports Qt.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from core.ptm_format import COEFFICIENTS, Ptm
+
+#: Pixels worked on at once. The float32 coefficients and colour of a tile,
+#: plus one luminance per light, stay in a few megabytes.
+TILE_PIXELS = 1 << 16
+
+#: Bytes of rendered frames `render_cached` keeps.
+CACHE_BYTES = 256 << 20
+
+#: Light directions closer than this share a cached frame. A viewer's light
+#: moves by more than this between frames a user can tell apart.
+LIGHT_STEP = 1 / 512
+
+#: `Pyramid` stops halving once the longer side is no more than this.
+SMALLEST_LEVEL = 256
+
+#: Output rows of a level made at once by `halve`.
+HALVE_ROWS = 256
+
+
+def terms(lights):
+    """The six polynomial terms for each light, in `TERM_NAMES` order.
+
+    Args:
+        lights: (n, 2 or more) light vectors; only u and v are used.
+
+    Returns:
+        np.ndarray: (n, 6) float64.
+    """
+    lights = np.atleast_2d(np.asarray(lights, dtype=np.float64))
+    u, v = lights[:, 0], lights[:, 1]
+    return np.stack([u * u, v * v, u * v, u, v, np.ones_like(u)], axis=1)
+
+
+class Relighter:
+    """Renders one `ptm_format.Ptm` under light directions, in tiles.
+
+    Safe to use from several threads at once; the cache is locked, the
+    rendering needs no lock.
+
+    Args:
+        ptm (Ptm): The map. Its arrays are only read, in any layout.
+        tile_pixels (int): Pixels worked on at once.
+        cache_bytes (int): What `render_cached` may keep.
+    """
+
+    def __init__(self, ptm, tile_pixels=TILE_PIXELS, cache_bytes=CACHE_BYTES):
+        self.ptm = ptm
+        self.tile_pixels = max(1, tile_pixels)
+        self.cache_bytes = cache_bytes
+        #: (6,) float64: what one step of each stored byte is worth.
+        self.scale = np.asarray(ptm.scale, dtype=np.float64)
+        #: (6,) float64: each coefficient's value at a byte of zero.
+        self.zero = -np.asarray(ptm.bias, dtype=np.float64) * self.scale
+        self._cache: OrderedDict = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        """(height, width) of the full image."""
+        return self.ptm.height, self.ptm.width
+
+    def weights(self, lights):
+        """The folded lookup tables for `lights`.
+
+        Returns:
+            tuple: (weights (6, n) float32, offsets (n,) float32), so that a
+            pixel's luminance under light i is ``bytes @ weights[:, i] +
+            offsets[i]``.
+        """
+        terms_ = terms(lights)
+        weights = (terms_ * self.scale).T
+        offsets = terms_ @ self.zero
+        return weights.astype(np.float32), offsets.astype(np.float32)
+
+    def luminance(self, lights, window=None):
+        """The polynomial's value under each light.
+
+        Args:
+            lights: (n, 2 or more) light vectors, or one.
+            window (tuple[slice, slice] | None): Rows and columns to render,
+                steps included. The whole image by default.
+
+        Returns:
+            np.ndarray: (n, rows, columns) float32.
+        """
+        weights, offsets = self.weights(lights)
+        coefficients = self._windowed(self.ptm.coefficients, window)
+        rows, columns = coefficients.shape[:2]
+        out = np.empty((len(offsets), rows, columns), np.float32)
+        for band, tile in self._tiles(coefficients):
+            luminance = tile.reshape(-1, COEFFICIENTS).astype(np.float32) @ weights
+            luminance += offsets
+            out[:, band] = luminance.T.reshape(len(offsets), -1, columns)
+        return out
+
+    def render(self, lights, window=None, out=None):
+        """Each light's image, as a viewer shows it.
+
+        Args:
+            lights: (n, 2 or more) light vectors, or one.
+            window (tuple[slice, slice] | None): As `luminance`.
+            out (np.ndarray | None): (n, rows, columns, 3) uint8 to write
+                into, rather than a new array.
+
+        Returns:
+            np.ndarray: (n, rows, columns, 3) uint8.
+        """
+        weights, offsets = self.weights(lights)
+        coefficients = self._windowed(self.ptm.coefficients, window)
+        rgb = self._windowed(self.ptm.rgb, window)
+        rows, columns = coefficients.shape[:2]
+        count = len(offsets)
+        if out is None:
+            out = np.empty((count, rows, columns, 3), np.uint8)
+        # Folding 1/255 into the weights saves a pass per light.
+        weights /= 255
+        offsets /= 255
+        shaded = None
+        for band, tile in self._tiles(coefficients):
+            luminance = tile.reshape(-1, COEFFICIENTS).astype(np.float32) @ weights
+            luminance += offsets
+            colour = rgb[band].reshape(-1, 3).astype(np.float32)
+            if shaded is None or shaded.shape != colour.shape:
+                shaded = np.empty_like(colour)
+            for index in range(count):
+                np.multiply(colour, luminance[:, index, None], out=shaded)
+                shaded += 0.5  # so that the cast below rounds
+                np.clip(shaded, 0, 255, out=shaded)
+                out[index, band] = shaded.reshape(-1, columns, 3)
+        return out
+
+    def render_cached(self, u, v, window=None):
+        """One light's image, from the cache if it has been rendered before.
+
+        The light is rounded to `LIGHT_STEP` first, so a light that has barely
+        moved comes back at once. The frame returned is shared: do not write
+        to it.
+
+        Returns:
+            np.ndarray: (rows, columns, 3) uint8, read-only.
+        """
+        u, v = (round(value / LIGHT_STEP) * LIGHT_STEP for value in (u, v))
+        key = (u, v, _window_key(window))
+        with self._lock:
+            frame = self._cache.get(key)
+            if frame is not None:
+                self._cache.move_to_end(key)
+                return frame
+        frame = self.render([(u, v)], window)[0]
+        frame.flags.writeable = False
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = frame
+                self._cached_bytes += frame.nbytes
+            while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                _key, dropped = self._cache.popitem(last=False)
+                self._cached_bytes -= dropped.nbytes
+        return frame
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._cached_bytes = 0
+
+    def _windowed(self, array, window):
+        if window is None:
+            return array
+        rows, columns = window
+        return array[rows, columns]
+
+    def _tiles(self, coefficients):
+        """(row slice, coefficients of those rows) bands of about a tile."""
+        rows, columns = coefficients.shape[:2]
+        step = max(1, self.tile_pixels // max(1, columns))
+        for top in range(0, rows, step):
+            band = slice(top, min(top + step, rows))
+            yield band, coefficients[band]
+
+
+def _window_key(window):
+    if window is None:
+        return None
+    return tuple((part.start, part.stop, part.step) for part in window)
+
+
+def halve(image):
+    """`image` at half the size, each pixel the rounded mean of four.
+
+    An odd last row or column is paired with itself, so the result is
+    ceil(height / 2) by ceil(width / 2) and every source pixel counts.
+
+    Args:
+        image (np.ndarray): (height, width, channels) uint8, any layout.
+
+    Returns:
+        np.ndarray: (ceil(height / 2), ceil(width / 2), channels) uint8.
+    """
+    height, width, channels = image.shape
+    out = np.empty((-(-height // 2), -(-width // 2), channels), np.uint8)
+    for top in range(0, out.shape[0], HALVE_ROWS):
+        rows = image[2 * top : 2 * (top + HALVE_ROWS)]
+        if len(rows) % 2:
+            rows = np.concatenate([rows, rows[-1:]])
+        band = rows.astype(np.uint16)
+        if width % 2:
+            band = np.concatenate([band, band[:, -1:]], axis=1)
+        total = band[0::2, 0::2] + band[0::2, 1::2]
+        total += band[1::2, 0::2]
+        total += band[1::2, 1::2]
+        total += 2
+        out[top : top + len(total)] = total >> 2
+    return out
+
+
+class Pyramid:
+    """A `Relighter` for the map and for each halving of it, made on demand.
+
+    Level 0 is the map itself; level k has 1/2**k of its width and height.
+    A level is built the first time it is asked for, from the one above.
+    Building level 1 of a 45-megapixel map reads the whole map once, and each
+    level after it a quarter of the one before.
+
+    Args:
+        ptm (Ptm): The map.
+        smallest (int): Stop once the longer side is no more than this.
+    """
+
+    def __init__(self, ptm, smallest=SMALLEST_LEVEL):
+        self.ptm = ptm
+        levels = 1
+        longest = max(ptm.width, ptm.height)
+        while longest > smallest:
+            longest = -(-longest // 2)
+            levels += 1
+        #: How many levels there are, the map included.
+        self.levels = levels
+        self._relighters = [Relighter(ptm)]
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        """(height, width) of the full map."""
+        return self.ptm.height, self.ptm.width
+
+    def relighter(self, level):
+        """The `Relighter` for `level`, building it and those above if need be."""
+        level = min(max(0, level), self.levels - 1)
+        with self._lock:
+            while len(self._relighters) <= level:
+                above = self._relighters[-1].ptm
+                coefficients, rgb = halve(above.coefficients), halve(above.rgb)
+                height, width = rgb.shape[:2]
+                ptm = Ptm(width, height, above.scale, above.bias, coefficients, rgb)
+                self._relighters.append(Relighter(ptm))
+            return self._relighters[level]
+
+    def level_for(self, zoom):
+        """The coarsest level with a pixel for every screen pixel.
+
+        Args:
+            zoom (float): Screen pixels per map pixel.
+        """
+        if zoom >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / zoom))), self.levels - 1)
+
+    def render(self, u, v, region, zoom, coarser=0):
+        """The part of the map in `region`, under light (u, v), for the screen.
+
+        Args:
+            u, v (float): The light direction.
+            region (tuple[float, float, float, float]): (left, top, right,
+                bottom) of what is on screen, in map pixels. Clipped to the map.
+            zoom (float): Screen pixels per map pixel.
+            coarser (int): Levels coarser than the screen needs, for a quick
+                draft while the light is moving.
+
+        Returns:
+            tuple: (frame, covered). The frame is (rows, columns, 3) uint8,
+            read-only, and may be None if the region is off the map. `covered`
+            is the (left, top, right, bottom) in map pixels it spans, to be
+            stretched over.
+        """
+        level = min(self.level_for(zoom) + coarser, self.levels - 1)
+        relighter = self.relighter(level)
+        factor = 2**level
+        height, width = relighter.shape
+        left, top, right, bottom = region
+        first_column = min(max(0, math.floor(left / factor)), width)
+        last_column = min(max(0, math.ceil(right / factor)), width)
+        first_row = min(max(0, math.floor(top / factor)), height)
+        last_row = min(max(0, math.ceil(bottom / factor)), height)
+        if first_column >= last_column or first_row >= last_row:
+            return None, None
+        window = (slice(first_row, last_row), slice(first_column, last_column))
+        frame = relighter.render_cached(u, v, window)
+        full_height, full_width = self.shape
+        covered = (
+            first_column * factor,
+            first_row * factor,
+            min(last_column * factor, full_width),
+            min(last_row * factor, full_height),
+        )
+        return frame, covered
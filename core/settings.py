@@ -16,6 +16,11 @@
 POST_SHUTTER_POLLING = "post_shutter_polling"
 LANGUAGE = "language"
 FITTER = "fitter"
+PIPELINED_CAPTURE = "pipelined_capture"
+# Learned, not chosen: each camera's recent shot latencies, as
+# shot_timing/<camera>, and the camera last used. See core/shot_timing.py.
+SHOT_TIMING = "shot_timing"
+LAST_CAMERA = "last_camera"
 
 DEFAULTS = {
     SERIAL_PORT: None,
@@ -26,6 +31,7 @@
     POST_SHUTTER_POLLING: 1.0,
     LANGUAGE: "en",
     FITTER: "native",
+    PIPELINED_CAPTURE: False,
 }
 
 #: How the .ptm is produced. "native" fits in-process and has no size limit
@@ -43,6 +49,22 @@
 # Further ticks to wait for the file to appear before retaking or giving up.
 POLLING_TIMEOUT = 5
 
+# The same two in seconds, for the event-driven session the main window runs
+# (`capture_session.TimedCaptureSession`). Not two ticks to settle: a shot is
+# looked for almost at once, and picked up when its file stops changing. The
+# timeout keeps the old total of seven seconds from shutter to giving up, so
+# a slow card is no likelier to be missed than before.
+PREPARATION_SECONDS = 0.2
+POLLING_TIMEOUT_SECONDS = 7.0
+
+# A pipelined capture (`capture_session.PipelinedCaptureSession`) fires the
+# next LED while earlier files are still transferring: no sooner than this
+# many seconds after the last shutter, and with at most this many shots in
+# flight. Two covers the bodies tried so far, whose buffers take a second
+# shot while the first transfers.
+SHOT_INTERVAL_SECONDS = 1.0
+PIPELINE_DEPTH = 2
+
 
 def value_to_bool(value):
     """Coerce a QSettings value to bool.
@@ -61,5 +83,9 @@ def read_float(settings, key):
     return float(settings.value(key, DEFAULTS[key]))
 
 
+def read_bool(settings, key):
+    return value_to_bool(settings.value(key, DEFAULTS[key]))
+
+
 def read_str(settings, key):
     return settings.value(key, DEFAULTS[key])
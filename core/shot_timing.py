@@ -0,0 +1,144 @@
+"""How long to wait for a shot, learned from how long shots have taken.
+
+`TimedCaptureSession` waits `PREPARATION_SECONDS` after the shutter before it
+looks for the file, and gives up `POLLING_TIMEOUT_SECONDS` after that. Both are
+set for the slowest setup anyone has reported: a fast tethered body that
+delivers in half a second still sits out the whole deadline whenever a shot
+fails, and on a slow card the deadline is all that stands between a late file
+and a needless retake.
+
+A `LatencyProfile` keeps the shutter-to-file latencies of one camera's recent
+shots and derives both waits from them:
+
+* **The wait before polling** is a fraction of the fastest shots' latency: no
+  file has ever arrived sooner, so looking earlier is wasted. It never grows
+  past the default.
+* **The deadline** is a multiple of the 95th percentile, with a floor. A shot
+  that misses it is recorded *at* the deadline, which pushes the percentile
+  up, so a camera that slows down -- a fuller card, a longer exposure -- loosens
+  its own deadline rather than being retaken over and over. It never grows past
+  the default either: learning can only make a run faster.
+
+Until there are `MIN_SAMPLES` shots to go on, the defaults stand.
+
+Profiles are kept per camera, by the EXIF make and model of its files, in the
+preferences under `settings.SHOT_TIMING`. Latency is a property of the body and
+its connection, and a studio with two cameras should not average them.
+
+Nothing here imports Qt.
+"""
+
+import math
+
+from PIL import Image
+
+from core import settings as prefs
+
+#: Shots remembered per camera. Enough for a stable 95th percentile, few
+#: enough that a change of card or cable is learned within a run.
+WINDOW = 100
+
+#: Shots needed before the profile overrides the defaults.
+MIN_SAMPLES = 5
+
+#: Fraction of the 5th-percentile latency to wait before the first look.
+PREPARATION_SHARE = 0.5
+
+#: The deadline, from the shutter, is this many times the 95th percentile...
+DEADLINE_FACTOR = 2.0
+#: ...and never less than this many seconds.
+MIN_DEADLINE = 2.0
+
+#: The camera a file came from when its EXIF does not say.
+UNKNOWN_CAMERA = "unknown"
+
+
+class LatencyProfile:
+    """Recent shutter-to-file latencies of one camera, in seconds.
+
+    Args:
+        samples (iterable[float]): Latencies to start from, oldest first, as
+            `samples` returns them.
+        window (int): How many to keep.
+    """
+
+    def __init__(self, samples=(), window=WINDOW):
+        self.window = window
+        self._samples = [float(sample) for sample in samples][-window:]
+
+    @property
+    def samples(self):
+        return list(self._samples)
+
+    def record(self, seconds):
+        """Note one shot's latency."""
+        self._samples.append(float(seconds))
+        del self._samples[: -self.window]
+
+    def percentile(self, q):
+        """The `q`-th percentile (0-100) of the samples, nearest rank."""
+        if not self._samples:
+            raise ValueError("no latencies recorded")
+        ranked = sorted(self._samples)
+        rank = max(1, math.ceil(q / 100 * len(ranked)))
+        return ranked[rank - 1]
+
+    def waits(self, preparation_time, polling_timeout):
+        """The wait before polling and the polling timeout to use now.
+
+        Args:
+            preparation_time (float): The default wait, in seconds.
+            polling_timeout (float): The default timeout after it, in seconds.
+
+        Returns:
+            tuple[float, float]: (preparation_time, polling_timeout), each no
+            longer than its default.
+        """
+        if len(self._samples) < MIN_SAMPLES:
+            return preparation_time, polling_timeout
+        preparation = min(preparation_time, PREPARATION_SHARE * self.percentile(5))
+        deadline = max(MIN_DEADLINE, DEADLINE_FACTOR * self.percentile(95))
+        deadline = min(deadline, preparation_time + polling_timeout)
+        return preparation, max(0.0, deadline - preparation)
+
+
+def camera_id(path):
+    """The camera `path` was shot on, as "Make Model" from its EXIF.
+
+    `UNKNOWN_CAMERA` if the file does not say. Read from the header; nothing
+    is decoded.
+    """
+    try:
+        with Image.open(path) as image:
+            exif = image.getexif()
+    except OSError:
+        return UNKNOWN_CAMERA
+    make = str(exif.get(0x010F, "")).strip("\x00 ")
+    model = str(exif.get(0x0110, "")).strip("\x00 ")
+    if model.startswith(make):  # Canon repeats it: "Canon" / "Canon EOS R5"
+        make = ""
+    name = " ".join(part for part in (make, model) if part)
+    # A "/" would nest the preferences key; see core.preferences.
+    return name.replace("/", "-") or UNKNOWN_CAMERA
+
+
+def load(settings, camera=None):
+    """The stored profile for `camera`, or for the last camera used.
+
+    Returns:
+        tuple[str, LatencyProfile]: The camera, and its profile -- empty if
+        nothing is stored for it.
+    """
+    if camera is None:
+        camera = settings.value(prefs.LAST_CAMERA, UNKNOWN_CAMERA) or UNKNOWN_CAMERA
+    samples = settings.value(f"{prefs.SHOT_TIMING}/{camera}", [])
+    try:
+        return camera, LatencyProfile(samples)
+    except (TypeError, ValueError):  # a hand-edited file
+        return camera, LatencyProfile()
+
+
+def save(settings, camera, profile):
+    """Store `profile` for `camera`, and remember it as the one last used."""
+    settings.setValue(f"{prefs.SHOT_TIMING}/{camera}", [round(s, 3) for s in profile.samples])
+    settings.setValue(prefs.LAST_CAMERA, camera)
@@ -0,0 +1,439 @@
+"""Stand-ins for the dome controller and the camera, to time a capture without either.
+
+The tests fake `serial.Serial` and hand `CaptureSession` a clock they move by
+hand. That checks the sequencing, but it never runs it in real time, so a change
+to the timing cannot be measured before it meets the hardware. This module
+provides the missing pieces:
+
+* `SimulatedController` speaks the protocol of ``PTMController.ino`` on a
+  pseudo-terminal, so `SerialController` opens it like the real port. It also
+  keeps the firmware's timing. A ``<SHOOT,n>`` lights the LED, fires the shutter
+  two seconds later and holds it for three, then waits one more. For those six
+  seconds the sketch reads nothing, and later commands queue up behind it.
+* `SimulatedCamera` is the tethered body. Each shutter produces a JPEG in a
+  dated subfolder of the capture root, as EOS Utility files them, after a random
+  latency. A share of shutters can be set to produce nothing.
+* `benchmark` runs a whole capture against the two and returns a
+  `BenchmarkReport`. It polls the folder the way the main window does when it
+  cannot watch it: the whole tree until the first shot lands, then that folder
+  alone.
+
+From the command line::
+
+    python -m core.simulation --leds 50 --time-scale 0.1 --pipelined
+
+The pseudo-terminal needs a POSIX system. On Windows `SimulatedController.start`
+raises OSError.
+
+Nothing here imports Qt.
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import select
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from PIL import Image
+
+from core import image_data
+from core import settings as prefs
+from core.capture_session import PipelinedCaptureSession, TimedCaptureSession
+from core.serial_controller import SerialController
+from core.shot_timing import LatencyProfile
+
+#: The firmware's ``shoot()``, in seconds at a time scale of 1: the LED is lit
+#: this long before the shutter...
+SHUTTER_DELAY = 2.0
+#: ...the shutter is held this long...
+SHUTTER_HOLD = 3.0
+#: ...and the sketch waits this long after releasing it.
+SHUTTER_SETTLE = 1.0
+
+#: EXIF make and model of the simulated camera's files. `shot_timing` learns
+#: their timing under "Simulated Camera", away from the real bodies.
+CAMERA_MAKE = "Simulated"
+CAMERA_MODEL = "Simulated Camera"
+
+
+class SimulatedController:
+    """The dome controller's serial protocol, on a pseudo-terminal.
+
+    Args:
+        on_shutter (callable | None): Called as ``on_shutter(led_index)``,
+            0-based, when the shutter fires. Runs on the controller's thread.
+        time_scale (float): Multiplies the firmware's delays. 0.1 runs a shot
+            ten times faster than the dome would.
+    """
+
+    def __init__(self, on_shutter=None, time_scale=1.0):
+        self.on_shutter = on_shutter
+        self.time_scale = time_scale
+        #: The device to open, once started.
+        self.port: str | None = None
+        #: Every message received, unframed: "ON,3", "SHOOT,3", "OFF".
+        self.received: list = []
+        #: The LED lit, 1-based as on the wire, or None.
+        self.lit: int | None = None
+        self._master: int | None = None
+        self._slave: int | None = None
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Open the pseudo-terminal and start answering on it. Returns self."""
+        if not hasattr(os, "openpty"):
+            raise OSError("The simulated controller needs a POSIX pseudo-terminal")
+        import tty  # POSIX only, like openpty
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        # An Arduino's replies are lost if nobody reads them. SerialController
+        # never does, so replies to a full buffer are dropped, not blocked on.
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._master,), name="simulated-controller", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop answering and close the pseudo-terminal. Safe to call twice."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self, master):
+        buffer = b""
+        while not self._stopping.is_set():
+            ready, _, _ = select.select([master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(master, 256)
+            except BlockingIOError:
+                continue
+            except OSError:  # the far end was closed
+                return
+            # recvWithStartEndMarkers(): anything outside <...> is discarded.
+            while True:
+                start = buffer.find(b"<")
+                end = buffer.find(b">", start)
+                if start < 0 or end < 0:
+                    buffer = buffer[start:] if start >= 0 else b""
+                    break
+                self._handle(buffer[start + 1 : end].decode("ascii", "replace"))
+                buffer = buffer[end + 1 :]
+
+    def _handle(self, message):
+        """What ``loop()`` does with one parsed message."""
+        self.received.append(message)
+        command, _, argument = message.partition(",")
+        number = int(argument) if argument.strip().isdigit() else 0  # atoi()
+        if command == "ON":
+            self.lit = number
+            self._reply(f"Turn on LED #{number}\r\n")
+        elif command == "SHOOT":
+            self.lit = number
+            self._reply(f"Shooting with LED #{number} turned on.\r\n")
+            if self._wait(SHUTTER_DELAY):
+                return
+            if self.on_shutter is not None:
+                self.on_shutter(number - 1)
+            self._wait(SHUTTER_HOLD + SHUTTER_SETTLE)
+        else:
+            # Anything else turns the LEDs off, and the sketch says so without
+            # a newline: Serial.print, not println.
+            self.lit = None
+            self._reply("Turn off all LEDs")
+
+    def _wait(self, seconds):
+        """Sleep on the firmware's clock. True if stopped meanwhile."""
+        return self._stopping.wait(seconds * self.time_scale)
+
+    def _reply(self, text):
+        if self._master is None:
+            return
+        with contextlib.suppress(BlockingIOError):
+            os.write(self._master, text.encode("ascii"))
+
+
+class CameraShot(NamedTuple):
+    """One shutter, as the simulated camera saw it."""
+
+    led_index: int
+    #: `time.monotonic` when the shutter fired.
+    fired_at: float
+    #: When the file was complete, or None if the shot produced none.
+    landed_at: float | None
+    path: str | None
+
+
+class SimulatedCamera:
+    """A tethered camera that files each shot into a folder named for the day.
+
+    Args:
+        root (str): The capture root. Shots go into a subfolder of it named
+            for today's date, created by the first shot.
+        latency (float): Mean seconds from the shutter to the file being
+            complete.
+        jitter (float): Standard deviation of the latency, in seconds.
+        failure_rate (float): Chance, 0 to 1, that a shutter produces no file.
+        size (tuple[int, int]): Width and height of the images.
+        seed (int | None): Seeds the random draws, so a run can be repeated.
+    """
+
+    def __init__(self, root, latency=0.8, jitter=0.2, failure_rate=0.0, size=(640, 480), seed=None):
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.size = size
+        self.directory = os.path.join(root, time.strftime("%Y_%m_%d"))
+        #: Every shutter, in the order they fired; appended as they are decided.
+        self.shots: list = []
+        self._random = random.Random(seed)  # noqa: S311 -- latencies, not secrets
+        self._lock = threading.Lock()
+        self._timers: list = []
+        self._count = 0
+
+    def trigger(self, led_index):
+        """The shutter has fired under LED `led_index`. Returns at once."""
+        fired_at = time.monotonic()
+        with self._lock:
+            self._count += 1
+            number = self._count
+            if self._random.random() < self.failure_rate:
+                self.shots.append(CameraShot(led_index, fired_at, None, None))
+                return
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter))
+            timer = threading.Timer(delay, self._land, (led_index, number, fired_at, time.time()))
+            timer.daemon = True
+            self._timers.append(timer)
+        timer.start()
+
+    def stop(self):
+        """Cancel the shots still in transit."""
+        with self._lock:
+            timers, self._timers = self._timers, []
+        for timer in timers:
+            timer.cancel()
+            if timer.is_alive():
+                timer.join()
+
+    def _land(self, led_index, number, fired_at, taken):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"IMG_{number:04d}.JPG")
+        level = 40 + (led_index * 37) % 200
+        exif = Image.Exif()
+        exif[0x010F], exif[0x0110] = CAMERA_MAKE, CAMERA_MODEL
+        capture = exif.get_ifd(0x8769)
+        capture[0x9003] = time.strftime("%Y:%m:%d %H:%M:%S", time.localtime(taken))
+        capture[0x9291] = f"{int(taken % 1 * 1000):03d}"
+        # Written under a name no poll accepts and renamed into place, so a
+        # half-written file is never picked up: the benchmark times the
+        # sequencing, not the check for an unfinished file.
+        partial = path + ".part"
+        Image.new("RGB", self.size, (level, level, level)).save(partial, "JPEG", exif=exif)
+        Path(partial).replace(path)
+        with self._lock:
+            self.shots.append(CameraShot(led_index, fired_at, time.monotonic(), path))
+
+
+class BenchmarkReport(NamedTuple):
+    """How a simulated run went."""
+
+    leds: int
+    captured: int
+    seconds: float
+    #: Shutter-command-to-file seconds of each captured slot, as the session
+    #: measured them.
+    latencies: list
+
+    @property
+    def missing(self):
+        return self.leds - self.captured
+
+    @property
+    def shots_per_minute(self):
+        return 60.0 * self.captured / self.seconds if self.seconds else 0.0
+
+    def percentile(self, q):
+        """The `q`-th percentile of the latencies, nearest rank."""
+        return LatencyProfile(self.latencies, window=len(self.latencies)).percentile(q)
+
+    def summary(self):
+        lines = [
+            f"{self.captured}/{self.leds} shots in {self.seconds:.1f}s "
+            f"({self.shots_per_minute:.1f} shots/minute, {self.missing} missing)"
+        ]
+        if self.latencies:
+            lines.append(
+                "latency "
+                + ", ".join(f"p{q} {self.percentile(q):.2f}s" for q in (50, 90, 95, 99))
+                + f", max {max(self.latencies):.2f}s"
+            )
+        return "\n".join(lines)
+
+
+class _Poller:
+    """The main window's polling fallback, without the window."""
+
+    def __init__(self, root, newer_than):
+        self.directory = root
+        self.recursive = True
+        self.newer_than = newer_than
+
+    def newest(self):
+        path, self.newer_than = image_data.find_newest_image(
+            self.directory, self.newer_than, self.recursive
+        )
+        if path is not None:
+            self._adopt(path)
+        return path
+
+    def every_new(self):
+        found = image_data.find_new_images(self.directory, self.newer_than, self.recursive)
+        if not found:
+            return []
+        self.newer_than = found[-1][1]
+        self._adopt(found[0][0])
+        return [path for path, _mtime in found if os.path.dirname(path) == self.directory]
+
+    def _adopt(self, path):
+        if self.recursive:
+            self.directory = os.path.dirname(path)
+            self.recursive = False
+
+
+def drive(session, shoot, root, sleep=time.sleep):
+    """Step `session` to the end, sleeping as it asks, with files from `root`.
+
+    Returns:
+        float: The seconds the run took.
+    """
+    poller = _Poller(root, time.time())
+    poll = poller.every_new if isinstance(session, PipelinedCaptureSession) else poller.newest
+    started = time.monotonic()
+    while True:
+        result = session.step(shoot, poll)
+        if result.finished:
+            return time.monotonic() - started
+        sleep(result.wake_after or 0.0)
+
+
+def benchmark(
+    leds=50,
+    pipelined=False,
+    time_scale=1.0,
+    latency=0.8,
+    jitter=0.2,
+    failure_rate=0.0,
+    max_retakes=0,
+    size=(640, 480),
+    seed=None,
+):
+    """Run a capture of `leds` shots against the simulated dome and camera.
+
+    The session gets the application's default timing, as a run with no
+    learned profile would; see `settings.PREPARATION_SECONDS`. The firmware's
+    delays are scaled by `time_scale` and the camera's latency is not, so a
+    scaled run still has to wait for every file.
+
+    Returns:
+        BenchmarkReport: The captured slots, the wall time and the latencies.
+    """
+    with tempfile.TemporaryDirectory(prefix="ptm-bench-") as root:
+        camera = SimulatedCamera(root, latency, jitter, failure_rate, size, seed)
+        with SimulatedController(camera.trigger, time_scale) as simulated:
+            controller = SerialController(simulated.port, log=lambda _message: None)
+            controller.RESET_DELAY = 0  # no bootloader to wait for
+            if not controller.open():
+                raise OSError(f"Cannot open the simulated port: {controller.last_error}")
+            timing = (prefs.PREPARATION_SECONDS, prefs.POLLING_TIMEOUT_SECONDS, max_retakes)
+            if pipelined:
+                session: TimedCaptureSession = PipelinedCaptureSession(
+                    range(leds),
+                    *timing,
+                    shot_interval=prefs.SHOT_INTERVAL_SECONDS,
+                    depth=prefs.PIPELINE_DEPTH,
+                )
+            else:
+                session = TimedCaptureSession(range(leds), *timing)
+            try:
+                seconds = drive(session, controller.shoot, root)
+            finally:
+                controller.close()
+                camera.stop()
+    return BenchmarkReport(leds, len(session.latencies), seconds, list(session.latencies.values()))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m core.simulation",
+        description="Time a capture against a simulated dome controller and camera.",
+    )
+    parser.add_argument("--leds", type=int, default=50, help="shots in the run (default 50)")
+    parser.add_argument(
+        "--pipelined", action="store_true", help="overlap shots, as PipelinedCaptureSession"
+    )
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="multiply the firmware's six seconds per shot by this (default 1)",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.8, help="mean shutter-to-file seconds (default 0.8)"
+    )
+    parser.add_argument("--jitter", type=float, default=0.2, help="its standard deviation")
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="share of shots that produce no file"
+    )
+    parser.add_argument("--retakes", type=int, default=0, help="retakes per missed slot")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random draws")
+    return parser.parse_args(argv)
+
+
+def main(argv=None, log=print):
+    """Run one benchmark and print its report. Returns the exit code."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        report = benchmark(
+            leds=args.leds,
+            pipelined=args.pipelined,
+            time_scale=args.time_scale,
+            latency=args.latency,
+            jitter=args.jitter,
+            failure_rate=args.failure_rate,
+            max_retakes=args.retakes,
+            seed=args.seed,
+        )
+    except OSError as error:
+        log(f"Cannot run the benchmark: {error}")
+        return 2
+    log(report.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
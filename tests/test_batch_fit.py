@@ -0,0 +1,197 @@
+"""`--batch-fit`: many capture folders, fitted from the command line."""
+
+import json
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import PTMGenerator2
+from core import batch_fit, decoders, image_data, ptm_format
+from core.image_data import MISSING, CaptureSlot
+from core.light_positions import light_vectors
+
+pytestmark = pytest.mark.unit
+
+
+def make_capture(folder, count=8, size=(6, 4), recorded_in=None):
+    """A folder of tiny JPEGs and the image_data.csv describing them."""
+    folder.mkdir(parents=True)
+    base = np.random.default_rng(len(str(folder))).integers(40, 200, (size[1], size[0], 3))
+    slots = []
+    for index, (u, v, _w) in enumerate(light_vectors()[:count]):
+        name = f"IMG_{index:04}.JPG"
+        shaded = np.clip(base * (0.5 + 0.4 * u + 0.3 * v), 0, 255).astype(np.uint8)
+        Image.fromarray(shaded).save(folder / name, quality=95)
+        slots.append(CaptureSlot(index, recorded_in or str(folder), name, True))
+    slots.append(CaptureSlot(count, MISSING, MISSING, False))
+    image_data.write_csv(str(folder / batch_fit.CSV_NAME), slots)
+    return folder
+
+
+def run(argv):
+    lines = []
+    code = batch_fit.main([*argv, "--light-position-adjustment", "0"], log=lines.append)
+    return code, "\n".join(lines)
+
+
+# -- the command -------------------------------------------------------------
+
+
+def test_every_folder_is_fitted_beside_its_images(tmp_path):
+    first = make_capture(tmp_path / "specimen01")
+    second = make_capture(tmp_path / "specimen02", size=(10, 5))
+    code, output = run([str(first), str(second)])
+    assert code == 0
+    assert ptm_format.read(str(first / "specimen01.ptm")).width == 6
+    assert ptm_format.read(str(second / "specimen02.ptm")).width == 10
+    assert "2 of 2 folders fitted, 16 images" in output
+
+
+def test_a_glob_is_expanded_here(tmp_path):
+    for name in ("2026-01", "2026-02", "other"):
+        make_capture(tmp_path / name)
+    (tmp_path / "2026-notes.txt").write_text("not a folder")
+    assert batch_fit.expand_folders([str(tmp_path / "2026-*")]) == [
+        str(tmp_path / "2026-01"),
+        str(tmp_path / "2026-02"),
+    ]
+
+
+def test_a_pattern_matching_nothing_is_reported_not_dropped(tmp_path):
+    missing = str(tmp_path / "nothing-*")
+    assert batch_fit.expand_folders([missing]) == [missing]
+
+
+def test_output_can_go_elsewhere(tmp_path):
+    folder = make_capture(tmp_path / "specimen03")
+    code, _output = run([str(folder), "--output-dir", str(tmp_path / "out")])
+    assert code == 0
+    assert (tmp_path / "out" / "specimen03.ptm").exists()
+    assert not (folder / "specimen03.ptm").exists()
+
+
+def test_a_moved_archive_is_found_where_it_is_now(tmp_path):
+    """The table names the directory the shots were captured into, which an
+    archive has usually left."""
+    folder = make_capture(tmp_path / "specimen04", recorded_in=str(tmp_path / "long-gone"))
+    code, _output = run([str(folder)])
+    assert code == 0
+    assert (folder / "specimen04.ptm").exists()
+
+
+def test_a_bad_folder_fails_alone(tmp_path):
+    good = make_capture(tmp_path / "good")
+    (tmp_path / "empty").mkdir()
+    code, output = run([str(tmp_path / "empty"), str(good)])
+    assert code == 1
+    assert "FAILED: no image_data.csv" in output
+    assert "1 of 2 folders fitted" in output
+    assert (good / "good.ptm").exists()
+
+
+def test_too_few_images_is_a_failure_with_a_reason(tmp_path):
+    folder = make_capture(tmp_path / "thin", count=4)
+    code, output = run([str(folder)])
+    assert code == 1
+    assert "at least 6" in output
+
+
+def test_a_preview_batch(tmp_path):
+    folder = make_capture(tmp_path / "specimen05", size=(16, 8))
+    code, _output = run([str(folder), "--reduction", "4"])
+    assert code == 0
+    assert ptm_format.read(str(folder / "specimen05.ptm")).width == 4
+
+
+def test_the_entry_point_dispatches_the_flag(tmp_path, capsys):
+    folder = make_capture(tmp_path / "specimen06")
+    code = PTMGenerator2.main(
+        ["PTMGenerator2", "--batch-fit", str(folder), "--light-position-adjustment", "0"]
+    )
+    assert code == 0
+    assert "1 of 1 folders fitted" in capsys.readouterr().out
+
+
+# -- the memory budget -------------------------------------------------------
+
+
+def test_a_fit_waits_until_the_budget_has_room():
+    budget = batch_fit.MemoryBudget(100)
+    budget.acquire(60)
+    started = threading.Event()
+
+    def second():
+        budget.acquire(60)
+        started.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not started.wait(0.1)
+    budget.release(60)
+    assert started.wait(5)
+    thread.join()
+    assert budget.in_use == 60
+
+
+def test_a_fit_larger_than_the_budget_still_runs_alone():
+    budget = batch_fit.MemoryBudget(100)
+    budget.acquire(500)
+    assert budget.in_use == 500
+
+
+def test_no_limit_never_waits():
+    budget = batch_fit.MemoryBudget(None)
+    budget.acquire(10**12)
+    budget.acquire(10**12)
+    assert budget.in_use == 2 * 10**12
+
+
+def test_the_budget_is_what_each_fit_is_estimated_to_hold(tmp_path, monkeypatch):
+    folder = make_capture(tmp_path / "specimen07", size=(10, 5))
+    taken = []
+
+    class Recording(batch_fit.MemoryBudget):
+        def acquire(self, amount):
+            taken.append(amount)
+            super().acquire(amount)
+
+    result = batch_fit.fit_folder(str(folder), light_vectors(), Recording(None), workers=2)
+    assert result.ok
+    assert taken == [batch_fit.ptm_fitter.memory_estimate(10, 5, resident=3)]
+
+
+def test_a_decoder_that_is_not_installed_stops_the_batch(tmp_path, monkeypatch):
+    def unavailable():
+        raise decoders.DecoderUnavailableError("not installed here")
+
+    monkeypatch.setitem(decoders.DECODERS, "turbojpeg", unavailable)
+    monkeypatch.setattr(decoders, "_loaded", {})
+    folder = make_capture(tmp_path / "specimen01")
+    code, output = run([str(folder), "--decoder", "turbojpeg"])
+    assert code == 2
+    assert "Cannot decode with turbojpeg: not installed here" in output
+    assert not (folder / "specimen01.ptm").exists()
+
+
+def test_json_reports_each_folder_by_stage(tmp_path):
+    folder = make_capture(tmp_path / "specimen01")
+    code, output = run([str(folder), "--json"])
+    assert code == 0
+    assert "Fit of 8 images in" in output
+    record = json.loads(output.splitlines()[-1])
+    assert record["folder"] == str(folder)
+    assert len(record["stats"]["images"]) == 8
+    assert record["stats"]["stages"]["write"]["seconds"] > 0
+
+
+def test_the_summary_reports_throughput():
+    results = [
+        batch_fit.FolderResult("a", "a/a.ptm", 50, 2400.0, 20.0),
+        batch_fit.FolderResult("b", None, 0, 0.0, 0.1, "no image_data.csv"),
+    ]
+    report = batch_fit.summary(results)
+    assert "2.50" in report  # images per second
+    assert "120.0" in report  # megapixels per second
+    assert "b" in report and "FAILED: no image_data.csv" in report
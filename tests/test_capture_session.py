@@ -15,6 +15,8 @@
     RETAKING,
     WAITING,
     CaptureSession,
+    PipelinedCaptureSession,
+    TimedCaptureSession,
 )
 
 pytestmark = pytest.mark.unit
@@ -147,3 +149,202 @@ def test_retake_only_queue_covers_the_selected_leds():
     session = CaptureSession([4, 9])
     assert session.current_index == 4
     assert session.queue == [9]
+
+
+# -- deadlines in seconds ------------------------------------------------------
+
+
+class Clock:
+    """Time that only moves when a test moves it."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def timed(indices=(0,), **kwargs):
+    clock = Clock()
+    return TimedCaptureSession(list(indices), clock=clock, **kwargs), clock
+
+
+def test_the_wait_before_polling_is_in_seconds():
+    (session, clock), rig = timed(preparation_time=0.2), Rig()
+    first = session.step(rig.shoot, rig.poll)
+    assert first.wake_after == pytest.approx(0.2)
+    clock.now = 0.1
+    early = session.step(rig.shoot, rig.poll)
+    assert early.wake_after == pytest.approx(0.1)
+    assert rig.polls == 0
+    clock.now = 0.2
+    session.step(rig.shoot, rig.poll)
+    assert rig.polls == 1
+
+
+def test_a_slot_is_as_quick_as_the_camera():
+    """400 ms from shutter to file is 400 ms per LED, not three ticks."""
+    (session, clock), rig = timed([0, 1], preparation_time=0.2), Rig([None, "/a.jpg"])
+    session.step(rig.shoot, rig.poll)
+    clock.now = 0.2
+    assert session.step(rig.shoot, rig.poll).event == WAITING
+    clock.now = 0.4
+    result = session.step(rig.shoot, rig.poll)
+    assert result.recorded == (0, "/a.jpg")
+    assert result.wake_after == 0.0
+    session.step(rig.shoot, rig.poll)
+    assert rig.shots == [0, 1]
+
+
+def test_waiting_wakes_at_least_every_poll_interval():
+    (session, _clock), rig = timed(preparation_time=0.0, polling_timeout=5.0), Rig()
+    session.step(rig.shoot, rig.poll)
+    result = session.step(rig.shoot, rig.poll)
+    assert result.event == WAITING
+    assert result.wake_after == TimedCaptureSession.POLL_INTERVAL
+
+
+def test_the_timeout_counts_from_the_end_of_preparation():
+    (session, clock), rig = timed(preparation_time=1.0, polling_timeout=2.0), Rig()
+    session.step(rig.shoot, rig.poll)
+    clock.now = 2.9
+    assert session.step(rig.shoot, rig.poll).event == WAITING
+    clock.now = 3.0
+    result = session.step(rig.shoot, rig.poll)
+    assert result.event == GAVE_UP
+    assert result.recorded == (0, None)
+    assert result.finished
+
+
+def test_a_late_deadline_retakes_then_gives_up():
+    (session, clock), rig = timed(preparation_time=0.0, polling_timeout=1.0, max_retakes=1), Rig()
+    events = []
+    for _ in range(6):
+        clock.now += 1.0
+        events.append(session.step(rig.shoot, rig.poll).event)
+    assert RETAKING in events and events[-1] == GAVE_UP
+    assert rig.shots == [0, 0]
+
+
+def test_stepping_early_is_harmless():
+    """Events can wake the session at any moment; only time moves it on."""
+    (session, _clock), rig = timed(preparation_time=0.5), Rig()
+    session.step(rig.shoot, rig.poll)
+    for _ in range(10):
+        session.step(rig.shoot, rig.poll)
+    assert rig.shots == [0]
+    assert session.status == PREPARING
+
+
+# -- pipelined ---------------------------------------------------------------
+
+
+class Arrivals(Rig):
+    """Polls return lists: whatever has landed since the last look."""
+
+    def poll(self):
+        self.polls += 1
+        return self.results.pop(0) if self.results else []
+
+
+def pipelined(indices=(0, 1, 2), **kwargs):
+    clock = Clock()
+    kwargs.setdefault("shot_interval", 1.0)
+    return PipelinedCaptureSession(list(indices), clock=clock, **kwargs), clock
+
+
+def test_the_next_led_fires_before_the_last_file_lands():
+    (session, clock), rig = pipelined(depth=2), Arrivals()
+    session.step(rig.shoot, rig.poll)
+    clock.now = 1.0
+    session.step(rig.shoot, rig.poll)
+    assert rig.shots == [0, 1]
+    assert [shot.led_index for shot in session.in_flight] == [0, 1]
+
+
+def test_no_more_than_depth_shots_are_in_flight():
+    (session, clock), rig = pipelined(depth=2), Arrivals()
+    for second in range(4):
+        clock.now = float(second)
+        session.step(rig.shoot, rig.poll)
+    assert rig.shots == [0, 1]
+
+
+def test_shutters_are_spaced_by_the_interval():
+    (session, clock), rig = pipelined(depth=3, shot_interval=1.0), Arrivals()
+    session.step(rig.shoot, rig.poll)
+    clock.now = 0.5
+    result = session.step(rig.shoot, rig.poll)
+    assert rig.shots == [0]
+    assert result.wake_after == pytest.approx(0.25)  # the poll interval, sooner
+
+
+def test_files_are_paired_with_shots_in_order():
+    (session, clock), rig = pipelined([0, 1]), Arrivals([[], [], ["/a.jpg", "/b.jpg"]])
+    recorded = []
+    for step in range(6):
+        clock.now = float(step)
+        result = session.step(rig.shoot, rig.poll)
+        if result.recorded:
+            recorded.append(result.recorded)
+    assert recorded == [(0, "/a.jpg"), (1, "/b.jpg")]
+    assert session.finished
+
+
+def test_one_slot_is_decided_per_step_and_the_next_step_is_at_once():
+    (session, clock), rig = pipelined([0, 1]), Arrivals([[], [], ["/a.jpg", "/b.jpg"]])
+    for step in range(2):
+        clock.now = float(step)
+        session.step(rig.shoot, rig.poll)
+    clock.now = 2.0
+    result = session.step(rig.shoot, rig.poll)
+    assert result.recorded == (0, "/a.jpg")
+    assert result.wake_after == 0.0
+
+
+def test_a_shot_that_never_lands_is_given_up_on_its_own_deadline():
+    (session, clock), rig = pipelined([0, 1], preparation_time=0.0, polling_timeout=3.0), Arrivals()
+    session.step(rig.shoot, rig.poll)
+    clock.now = 1.0
+    session.step(rig.shoot, rig.poll)
+    clock.now = 3.0
+    result = session.step(rig.shoot, rig.poll)
+    assert result.event == GAVE_UP
+    assert result.recorded == (0, None)
+    assert not session.finished, "LED 1 is still in flight"
+
+
+def test_a_timed_out_shot_is_retaken_next():
+    (session, clock), rig = (
+        pipelined([0, 1, 2], preparation_time=0.0, polling_timeout=1.5, max_retakes=1, depth=1),
+        Arrivals(),
+    )
+    session.step(rig.shoot, rig.poll)
+    clock.now = 1.5
+    result = session.step(rig.shoot, rig.poll)
+    assert result.event == RETAKING
+    assert rig.shots == [0, 0]
+    assert (session.current_index, session.queue) == (1, [2])
+
+
+def test_files_are_reconciled_by_capture_time():
+    """The transfer delivered LED 1's file first; the EXIF says otherwise."""
+    (session, clock), rig = pipelined([0, 1]), Arrivals([[], [], ["/b.jpg", "/a.jpg"]])
+    for step in range(6):
+        clock.now = float(step)
+        session.step(rig.shoot, rig.poll)
+    changes = session.reconcile({"/a.jpg": 100.0, "/b.jpg": 101.0})
+    assert sorted(changes) == [(0, "/a.jpg"), (1, "/b.jpg")]
+
+
+def test_reconciling_without_every_capture_time_changes_nothing():
+    (session, clock), rig = pipelined([0, 1]), Arrivals([[], [], ["/b.jpg", "/a.jpg"]])
+    for step in range(6):
+        clock.now = float(step)
+        session.step(rig.shoot, rig.poll)
+    assert session.reconcile({"/a.jpg": 100.0, "/b.jpg": None}) == []
+
+
+def test_a_pipeline_needs_room_for_one_shot():
+    with pytest.raises(ValueError, match="depth"):
+        PipelinedCaptureSession([0], depth=0)
@@ -0,0 +1,158 @@
+"""Choosing among the decoding libraries."""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core import decoders
+from core.decoders import DecoderUnavailableError
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """A registry of its own for each test, holding only Pillow to start."""
+    monkeypatch.setattr(decoders, "DECODERS", {decoders.PILLOW: decoders._pillow})
+    monkeypatch.setattr(decoders, "_loaded", {})
+    monkeypatch.setattr(decoders, "_chosen", None)
+
+
+@pytest.fixture
+def jpeg(tmp_path):
+    path = tmp_path / "capture.jpg"
+    pixels = np.random.default_rng(0).integers(0, 256, size=(20, 30, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+    return str(path)
+
+
+class Clock:
+    """Each decoder's decode advances it by that decoder's cost."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def decoder(self, seconds, shape=(20, 30, 3)):
+        def decode(_path, _reduction=1, _out=None):
+            self.now += seconds
+            return np.zeros(shape, np.uint8)
+
+        return lambda: decode
+
+
+def unavailable():
+    raise DecoderUnavailableError("not installed here")
+
+
+# -- the registry ------------------------------------------------------------
+
+
+def test_pillow_is_always_there():
+    assert decoders.available() == [decoders.PILLOW]
+
+
+def test_a_decoder_without_its_library_is_left_out():
+    decoders.register("missing", unavailable)
+    assert decoders.available() == [decoders.PILLOW]
+    with pytest.raises(DecoderUnavailableError, match="not installed"):
+        decoders.use("missing")
+
+
+def test_an_unknown_decoder_is_refused():
+    with pytest.raises(ValueError, match="no decoder 'nonesuch'"):
+        decoders.use("nonesuch")
+
+
+def test_a_decoder_can_be_chosen_by_name(jpeg):
+    clock = Clock()
+    decoders.register("fast", clock.decoder(0.1))
+    decoders.use("fast")
+    assert not decoders.decode(jpeg).any()
+    assert decoders.chosen() == "fast"
+
+
+# -- decoding into the caller's array ----------------------------------------
+
+
+def test_an_array_of_the_right_shape_is_decoded_into(jpeg):
+    fresh = decoders.decode_with_pillow(jpeg)
+    out = np.zeros_like(fresh)
+    assert decoders.decode_with_pillow(jpeg, out=out) is out
+    assert np.array_equal(out, fresh)
+
+
+@pytest.mark.parametrize("out", [np.zeros((5, 5, 3), np.uint8), np.zeros((20, 30, 3), np.int16)])
+def test_an_array_that_does_not_fit_is_left_alone(jpeg, out):
+    decoded = decoders.decode_with_pillow(jpeg, out=out)
+    assert decoded is not out and decoded.shape == (20, 30, 3)
+    assert not out.any()
+
+
+def test_a_tall_image_is_copied_out_in_whole_strips(tmp_path):
+    """Greyscale, so each strip is converted as well as copied."""
+    rows = 2 * decoders.PILLOW_STRIP_ROWS + 5
+    pixels = np.random.default_rng(1).integers(0, 256, size=(rows, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(tmp_path / "tall.png")
+    decoded = decoders.decode_with_pillow(str(tmp_path / "tall.png"))
+    assert decoded.flags.writeable
+    assert np.array_equal(decoded, np.repeat(pixels[:, :, None], 3, axis=2))
+
+
+# -- choosing by timing ------------------------------------------------------
+
+
+def test_the_fastest_decoder_wins(jpeg):
+    clock = Clock()
+    decoders.register(decoders.PILLOW, clock.decoder(1.0))
+    decoders.register("fast", clock.decoder(0.25))
+    decoders.register("slow", clock.decoder(2.0))
+    assert decoders.choose(jpeg, clock=clock) == "fast"
+
+
+def test_a_decoder_that_gets_the_shape_wrong_never_wins(jpeg):
+    clock = Clock()
+    decoders.register(decoders.PILLOW, clock.decoder(1.0))
+    decoders.register("wrong", clock.decoder(0.1, shape=(30, 20, 3)))
+    assert decoders.choose(jpeg, clock=clock) == decoders.PILLOW
+
+
+def test_a_decoder_that_fails_never_wins(jpeg):
+    def broken():
+        def decode(_path, _reduction=1, _out=None):
+            raise OSError("corrupt")
+
+        return decode
+
+    decoders.register("broken", broken)
+    assert decoders.choose(jpeg) == decoders.PILLOW
+
+
+def test_auto_chooses_once_on_the_first_image(jpeg, monkeypatch):
+    choices = []
+    monkeypatch.setattr(
+        decoders, "choose", lambda path, reduction: choices.append(path) or "pillow"
+    )
+    decoders.decode(jpeg)
+    decoders.decode(jpeg, 2)
+    assert choices == [jpeg]
+    assert decoders.chosen() == decoders.PILLOW
+
+
+# -- libjpeg-turbo -----------------------------------------------------------
+
+
+@pytest.mark.parametrize("reduction", [1, 2, 3, 8])
+def test_turbojpeg_decodes_what_pillow_does(jpeg, reduction, monkeypatch):
+    pytest.importorskip("turbojpeg")
+    monkeypatch.setattr(decoders, "DECODERS", {"turbojpeg": decoders._turbojpeg})
+    try:
+        turbo = decoders.get("turbojpeg")
+    except DecoderUnavailableError as error:
+        pytest.skip(str(error))
+    reference = decoders.decode_with_pillow(jpeg, reduction)
+    decoded = turbo(jpeg, reduction)
+    assert decoded.shape == reference.shape
+    assert np.abs(decoded.astype(int) - reference).max() <= 2
@@ -0,0 +1,102 @@
+"""Synthetic capture sets, and the fit benchmark that runs on them."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core import fit_benchmark, ptm_fitter
+from core.light_positions import light_vectors
+
+pytestmark = pytest.mark.unit
+
+
+# -- the known surface ---------------------------------------------------------
+
+
+def test_a_fit_recovers_the_surface_the_captures_were_rendered_from():
+    coefficients, colour = fit_benchmark.known_surface(tile=32)
+    lights = light_vectors()
+    images = [fit_benchmark.render(coefficients, colour, light) for light in lights]
+    ptm = ptm_fitter.fit(images, lights)
+    # Rounding each capture to 8 bits costs about a unit of luminance.
+    assert np.abs(ptm.dequantised() - coefficients).max() < 2.0
+    assert np.abs(ptm.rgb - colour).max() < 1.0
+
+
+def test_the_surface_never_clips():
+    coefficients, colour = fit_benchmark.known_surface(tile=32)
+    for u, v, _w in light_vectors():
+        luminance = coefficients @ np.array([u * u, v * v, u * v, u, v, 1.0])
+        assert luminance.min() > 0
+        assert (colour * luminance[:, :, None] / 255).max() < 255
+
+
+def test_frames_are_three_by_two_in_whole_blocks():
+    width, height = fit_benchmark.dimensions(48)
+    assert (width % 16, height % 16) == (0, 0)
+    assert width / height == pytest.approx(1.5, abs=0.01)
+    assert width * height / 1e6 == pytest.approx(48, rel=0.01)
+
+
+# -- generating a set ------------------------------------------------------------
+
+
+def test_a_set_has_one_image_per_light_in_the_format_asked_for(tmp_path):
+    paths, lights = fit_benchmark.synthesise(str(tmp_path), 0.05, "png", images=4, log=print)
+    assert len(paths) == len(lights) == 4
+    with Image.open(paths[0]) as image:
+        assert image.format == "PNG"
+        assert image.size == fit_benchmark.dimensions(0.05)
+
+
+def test_a_set_already_written_is_reused(tmp_path):
+    fit_benchmark.synthesise(str(tmp_path), 0.05, "jpeg", images=2, log=print)
+    rendered = []
+    fit_benchmark.synthesise(str(tmp_path), 0.05, "jpeg", images=2, log=rendered.append)
+    assert rendered == []
+
+
+def test_an_unknown_format_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="format"):
+        fit_benchmark.synthesise(str(tmp_path), 0.05, "gif")
+
+
+# -- measuring -------------------------------------------------------------------
+
+
+def test_a_measurement_accounts_for_the_whole_fit(tmp_path):
+    paths, lights = fit_benchmark.synthesise(str(tmp_path), 0.05, "tiff", images=6, log=print)
+    result = fit_benchmark.measure(paths, lights, str(tmp_path / "out.ptm"), workers=2)
+    assert (result.images, result.width) == (6, fit_benchmark.dimensions(0.05)[0])
+    assert 0 <= result.fit_seconds <= result.seconds
+    assert result.decode_seconds > 0
+    assert os.path.exists(tmp_path / "out.ptm")
+
+
+def test_a_peak_over_the_estimate_is_a_regression():
+    within = fit_benchmark.FitMeasurement(1, 1, 1, 1.0, 1.0, 0.0, 0.0, 100, 100)
+    assert within.within_budget
+    assert not within._replace(peak_bytes=200).within_budget
+    assert within._replace(peak_bytes=None).within_budget, "not measurable here"
+
+
+@pytest.mark.slow
+def test_the_fit_stays_within_its_memory_estimate(tmp_path):
+    """The regression check, at a size where the fit's buffers dominate."""
+    paths, lights = fit_benchmark.synthesise(str(tmp_path), 2, "jpeg", images=6, log=print)
+    result = fit_benchmark.run_case(paths, lights, workers=2)
+    if result.peak_bytes is None:
+        pytest.skip("peak memory is not measurable on this platform")
+    assert result.within_budget, f"{result.peak_bytes:,} bytes against {result.budget_bytes:,}"
+
+
+@pytest.mark.slow
+def test_the_suite_prints_one_json_line_per_case(tmp_path):
+    lines = []
+    argv = ["--megapixels", "0.05", "--formats", "png", "tiff", "--images", "6"]
+    argv += ["--cache-dir", str(tmp_path), "--json"]
+    assert fit_benchmark.main(argv, log=lines.append) == 0
+    assert [json.loads(line)["format"] for line in lines] == ["png", "tiff"]
@@ -0,0 +1,115 @@
+"""Timings and memory of a fit, by stage and by image."""
+
+import json
+import threading
+
+import pytest
+
+from core import fit_stats
+from core.fit_stats import FitStats, ImageStats
+
+pytestmark = pytest.mark.unit
+
+
+class Clock:
+    """A clock that moves only when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# -- stages ------------------------------------------------------------------
+
+
+def test_a_stage_is_timed_by_its_body():
+    clock = Clock()
+    stats = FitStats(clock=clock)
+    with stats.stage("quantise"):
+        clock.now += 2.5
+    assert stats.seconds["quantise"] == 2.5
+
+
+def test_a_stage_that_raises_is_not_counted():
+    clock = Clock()
+    stats = FitStats(clock=clock)
+    with pytest.raises(RuntimeError), stats.stage("quantise"):
+        clock.now += 2.5
+        raise RuntimeError("solve failed")
+    assert stats.seconds["quantise"] == 0.0
+
+
+def test_wall_time_leaves_out_decoding_on_other_threads():
+    stats = FitStats()
+    stats.seconds.update(decode=9.0, wait=1.0, absorb=2.0, write=0.5)
+    assert stats.wall_seconds == 3.5
+
+
+# -- images ------------------------------------------------------------------
+
+
+def test_a_decode_is_recorded_under_its_position():
+    clock = Clock()
+    seen = []
+    stats = FitStats(on_image=seen.append, clock=clock)
+
+    def loader(path):
+        clock.now += 0.25
+        return path.upper()
+
+    load = stats.timed_loader(loader, ["a", "b"])
+    assert load("b") == "B"
+    stats.absorbed(1, 0.5)
+    assert seen == [ImageStats(1, 0.25, 0.5, seen[0].rss, seen[0].peak_rss)]
+    assert stats.images == seen
+    assert stats.seconds["decode"] == 0.25
+
+
+def test_an_image_not_decoded_through_the_loader_has_no_decode_time():
+    stats = FitStats()
+    stats.absorbed(0, 0.1)
+    assert stats.images[0].decode is None
+
+
+def test_decodes_from_many_threads_all_count():
+    stats = FitStats()
+    paths = [str(index) for index in range(40)]
+    load = stats.timed_loader(lambda path: path, paths)
+    threads = [threading.Thread(target=load, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for index in range(40):
+        stats.absorbed(index, 0.0)
+    assert all(record.decode is not None for record in stats.images)
+
+
+# -- reporting ---------------------------------------------------------------
+
+
+def test_everything_goes_into_json():
+    stats = FitStats()
+    with stats.stage("write"):
+        pass
+    stats.absorbed(0, 0.1)
+    record = json.loads(json.dumps(stats.as_dict()))
+    assert list(record["stages"]) == list(fit_stats.STAGES)
+    assert record["images"][0]["position"] == 0
+
+
+def test_the_summary_names_the_stages_that_took_time():
+    stats = FitStats()
+    stats.seconds.update(decode=4.0, wait=1.0, absorb=2.0)
+    line = stats.summary()
+    assert line.startswith("Fit of 0 images in 3.00s: wait 1.00s, absorb 2.00s")
+    assert "decoding 4.00s across threads" in line
+    assert "write" not in line
+
+
+@pytest.mark.skipif(fit_stats.memory() == (None, None), reason="no memory figures here")
+def test_memory_is_measured_in_bytes():
+    rss, peak = fit_stats.memory()
+    assert peak is None or rss is None or peak >= rss > 2**20
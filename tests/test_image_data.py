@@ -4,11 +4,14 @@
 import os
 
 import pytest
+from PIL import Image
 
 from core.image_data import (
     MISSING,
     CaptureSlot,
+    capture_time,
     detect_irregular_intervals,
+    find_new_images,
     find_newest_image,
     read_csv,
     write_csv,
@@ -291,3 +294,36 @@ def test_recursive_search_ignores_non_images_in_subdirectories(tmp_path):
     nested.mkdir()
     touch(nested, "notes.txt", 3000)
     assert find_newest_image(str(tmp_path), 2000, recursive=True)[0] is None
+
+
+# -- several at once, and capture times ------------------------------------
+
+
+def test_every_new_image_is_returned_oldest_first(tmp_path):
+    touch(tmp_path, "old.jpg", 1000)
+    second = touch(tmp_path, "b.jpg", 3500)
+    first = touch(tmp_path, "a.jpg", 2500)
+    assert find_new_images(str(tmp_path), 2000) == [(first, 2500), (second, 3500)]
+
+
+def exif_jpeg(path, stamp=None, subsec=None):
+    exif = Image.Exif()
+    ifd = exif.get_ifd(0x8769)
+    if stamp is not None:
+        ifd[0x9003] = stamp
+    if subsec is not None:
+        ifd[0x9291] = subsec
+    Image.new("RGB", (4, 4)).save(path, exif=exif)
+    return str(path)
+
+
+def test_capture_time_orders_shots_within_a_second(tmp_path):
+    early = exif_jpeg(tmp_path / "a.jpg", "2026:10:18 12:00:00", "25")
+    late = exif_jpeg(tmp_path / "b.jpg", "2026:10:18 12:00:00", "75")
+    assert capture_time(late) - capture_time(early) == pytest.approx(0.5)
+
+
+def test_capture_time_is_none_when_the_file_does_not_say(tmp_path):
+    assert capture_time(exif_jpeg(tmp_path / "a.jpg")) is None
+    assert capture_time(exif_jpeg(tmp_path / "b.jpg", "not a date")) is None
+    assert capture_time(touch(tmp_path, "c.jpg", 3000)) is None
@@ -0,0 +1,135 @@
+"""Noticing new shots from change notifications rather than a rescan."""
+
+import os
+
+import pytest
+
+from core import image_watch
+from core.image_watch import ArrivalTracker
+
+pytestmark = pytest.mark.unit
+
+
+def land(directory, name, mtime=3000, data=b"jpeg"):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+# -- arrivals ----------------------------------------------------------------
+
+
+def test_a_shot_is_taken_once_it_has_stopped_changing(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    expected = land(tmp_path, "IMG_0001.JPG")
+    tracker.changed(str(tmp_path))
+    assert tracker.take() == (expected, 3000)
+
+
+def test_nothing_is_taken_before_a_change_is_reported(tmp_path):
+    """No rescanning: the tracker only looks where it is told to."""
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    land(tmp_path, "IMG_0001.JPG")
+    assert tracker.take() == (None, 2000)
+
+
+def test_a_file_still_being_written_waits(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    path = land(tmp_path, "IMG_0001.JPG", data=b"")
+    tracker.changed(str(tmp_path))
+    assert tracker.take()[0] is None, "empty"
+    land(tmp_path, "IMG_0001.JPG", mtime=3001, data=b"half")
+    assert tracker.take()[0] is None, "still growing"
+    assert tracker.take() == (path, 3001)
+
+
+def test_each_shot_is_taken_once(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    land(tmp_path, "IMG_0001.JPG")
+    tracker.changed(str(tmp_path))
+    tracker.take()
+    tracker.changed(str(tmp_path))
+    assert tracker.take()[0] is None
+
+
+def test_the_newest_of_several_is_taken(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    land(tmp_path, "IMG_0001.JPG", 2500)
+    newest = land(tmp_path, "IMG_0002.JPG", 3500)
+    tracker.changed(str(tmp_path))
+    assert tracker.take() == (newest, 3500)
+    assert tracker.newer_than == 3500
+
+
+def test_old_files_and_non_images_are_ignored(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    land(tmp_path, "IMG_0001.JPG", 1000)
+    land(tmp_path, "image_data.csv")
+    tracker.changed(str(tmp_path))
+    assert tracker.take()[0] is None
+
+
+def test_a_file_renamed_away_is_forgotten(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    path = land(tmp_path, "IMG_0001.JPG.tmp.jpg")
+    tracker.changed(str(tmp_path))
+    os.remove(path)
+    assert tracker.take()[0] is None
+
+
+def test_every_finished_shot_is_taken_oldest_first(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    second = land(tmp_path, "IMG_0002.JPG", 3500)
+    first = land(tmp_path, "IMG_0001.JPG", 2500)
+    growing = land(tmp_path, "IMG_0003.JPG", 3600, data=b"")
+    tracker.changed(str(tmp_path))
+    assert tracker.take_all() == [(first, 2500), (second, 3500)]
+    land(tmp_path, "IMG_0003.JPG", 3600)
+    assert tracker.take_all() == []
+    assert tracker.take_all() == [(growing, 3600)]
+
+
+# -- which directories ---------------------------------------------------------
+
+
+def test_a_new_dated_folder_is_reported_for_watching(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000, recursive=True)
+    assert tracker.scan_tree()
+    expected = land(tmp_path / "2026-10-18", "IMG_0001.JPG")
+    assert tracker.changed(str(tmp_path)) == [str(tmp_path / "2026-10-18")]
+    assert tracker.take() == (expected, 3000)
+
+
+def test_subfolders_are_not_followed_unless_recursive(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000)
+    land(tmp_path / "2026-10-18", "IMG_0001.JPG")
+    assert tracker.changed(str(tmp_path)) == []
+    assert tracker.take()[0] is None
+
+
+def test_existing_folders_are_watched_from_the_start(tmp_path):
+    (tmp_path / "2026-10-17").mkdir()
+    tracker = ArrivalTracker(str(tmp_path), 2000, recursive=True)
+    tracker.scan_tree()
+    assert tracker.directories == {str(tmp_path), str(tmp_path / "2026-10-17")}
+
+
+def test_too_many_folders_declines(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+    tracker = ArrivalTracker(str(tmp_path), 2000, recursive=True)
+    assert not tracker.scan_tree(limit=2)
+    assert image_watch.MAX_DIRECTORIES > 2
+
+
+def test_narrowing_drops_the_other_folders_and_their_arrivals(tmp_path):
+    tracker = ArrivalTracker(str(tmp_path), 2000, recursive=True)
+    tracker.scan_tree()
+    land(tmp_path / "run", "IMG_0001.JPG")
+    land(tmp_path / "elsewhere", "IMG_9999.JPG", 4000)
+    tracker.changed(str(tmp_path))
+    dropped = tracker.narrow_to(str(tmp_path / "run"))
+    assert dropped == sorted([str(tmp_path), str(tmp_path / "elsewhere")])
+    assert tracker.take()[0] == str(tmp_path / "run" / "IMG_0001.JPG")
@@ -3,18 +3,22 @@
 import csv
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pytest
 from PIL import Image
-from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtCore import QFileSystemWatcher, QRect, Qt
 from PyQt5.QtGui import QStandardItem
-from PyQt5.QtWidgets import QFileDialog, QMessageBox, QProgressDialog
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox, QProgressDialog
 
 import version
-from core import ptm_builder, ptm_format
+from core import image_data, ptm_builder, ptm_format, shot_timing
 from core import settings as prefs
+from core.capture_session import PipelinedCaptureSession
 from core.image_data import MISSING, CaptureSlot
 from core.light_positions import light_vectors
 from ui.geometry import to_list
@@ -232,6 +236,40 @@ def test_stop_halts_the_run_and_turns_the_leds_off(connected):
     port.write.assert_called_once_with(b"<OFF>")
 
 
+def test_each_step_arms_the_timer_for_the_deadline_it_asked_for(connected):
+    window, _port = connected
+    window.number_of_LEDs = 2
+    window.session_clock = lambda: 0.0
+    window.take_all_pictures()
+    try:
+        window.take_picture_process()  # fires the shutter
+        assert window.timer.isSingleShot()
+        assert window.timer.interval() == round(prefs.PREPARATION_SECONDS * 1000)
+    finally:
+        window.timer.stop()
+
+
+def test_an_arriving_image_steps_the_capture_at_once(connected):
+    window, _port = connected
+    window.session_clock = lambda: 0.0
+    window.take_all_pictures()
+    try:
+        with patch.object(PTMGeneratorMainWindow, "take_picture_process") as step:
+            window.on_image_arrived()
+        step.assert_called_once()
+    finally:
+        window.timer.stop()
+
+
+def test_an_arriving_image_is_left_alone_while_paused(connected):
+    window, _port = connected
+    window.take_all_pictures()
+    window.pause_continue_process()
+    with patch.object(PTMGeneratorMainWindow, "take_picture_process") as step:
+        window.on_image_arrived()
+    step.assert_not_called()
+
+
 def test_a_tick_with_no_session_stops_the_timer(main_window):
     main_window.session = None
     main_window.timer.start(1000)
@@ -245,6 +283,9 @@ def test_finishing_a_run_writes_the_csv_and_releases_the_port(connected, workdir
     window.number_of_LEDs = 1
     window.post_shutter_polling = 0
     window.auto_retake_maximum = 0
+    # A clock a second ahead at every reading, so the deadlines pass at once.
+    seconds = iter(range(1000))
+    window.session_clock = lambda: float(next(seconds))
     window.take_all_pictures()
     # Nothing ever lands, so the single slot times out and the run ends.
     for _ in range(12):
@@ -257,6 +298,54 @@ def test_finishing_a_run_writes_the_csv_and_releases_the_port(connected, workdir
     assert not window.serial.is_open
 
 
+def test_a_run_keeps_what_it_learned_about_its_camera(connected, workdir):
+    window, _port = connected
+    window.number_of_LEDs = 1
+    window.take_all_pictures()
+    window.timer.stop()
+    exif = Image.Exif()
+    exif[0x010F], exif[0x0110] = "Canon", "Canon EOS R5"
+    Image.new("RGB", (4, 4)).save(workdir / "IMG_0001.JPG", exif=exif)
+    window.session.latencies[0] = 0.6
+    window.learn_camera(window.session, str(workdir / "IMG_0001.JPG"), 0)
+    window.stop_process()
+    camera, profile = shot_timing.load(window.m_app.preferences())
+    assert camera == "Canon EOS R5"
+    assert profile.samples == [0.6]
+
+
+def test_the_pipelined_preference_overlaps_the_shots(connected):
+    window, _port = connected
+    window.number_of_LEDs = 3
+    window.pipelined_capture = True
+    window.take_all_pictures()
+    try:
+        assert isinstance(window.session, PipelinedCaptureSession)
+    finally:
+        window.timer.stop()
+
+
+def test_a_pipelined_run_is_put_in_capture_order(connected, workdir):
+    """The second shot's file landed first; its EXIF says which it is."""
+    window, _port = connected
+    window.number_of_LEDs = 2
+    window.pipelined_capture = True
+    window.take_all_pictures()
+    window.timer.stop()
+    paths = []
+    for name, stamp in (("IMG_0001.JPG", "12:00:00"), ("IMG_0002.JPG", "12:00:01")):
+        exif = Image.Exif()
+        exif.get_ifd(0x8769)[0x9003] = f"2026:10:18 {stamp}"
+        Image.new("RGB", (4, 4)).save(workdir / name, exif=exif)
+        paths.append(str(workdir / name))
+    for led_index, path in ((0, paths[1]), (1, paths[0])):
+        window.record_slot(led_index, path)
+        window.session.paired.append((led_index, path, float(led_index)))
+    window.reconcile_pipelined(window.session)
+    assert [slot.filename for slot in window.image_data] == ["IMG_0001.JPG", "IMG_0002.JPG"]
+    window.stop_process()
+
+
 # -- no controller attached ------------------------------------------------
 
 
@@ -484,10 +573,20 @@ def watching(self, main_window, workdir):
     def shoot_into(directory, name="IMG_0001.JPG", mtime=5000):
         directory.mkdir(parents=True, exist_ok=True)
         path = directory / name
-        path.touch()
+        path.write_bytes(b"jpeg")
         os.utime(path, (mtime, mtime))
         return str(path)
 
+    @staticmethod
+    def poll_until_found(window):
+        for _ in range(200):
+            QApplication.processEvents()
+            path = window.poll_for_image()
+            if path is not None:
+                return path
+            time.sleep(0.01)
+        return None
+
     def test_a_shot_in_a_dated_subfolder_is_found(self, watching):
         window, root = watching
         expected = self.shoot_into(root / "2026-07-28")
@@ -551,6 +650,37 @@ def test_a_shot_directly_in_the_root_still_works(self, watching):
         assert window.poll_for_image() == expected
         assert window.capture_directory == str(root)
 
+    def test_during_a_run_shots_are_noticed_without_scanning(self, watching):
+        window, root = watching
+        assert window.image_watcher.start(str(root), window.last_checked, recursive=True)
+        try:
+            with patch.object(image_data, "find_newest_image") as scan:
+                expected = self.shoot_into(root / "2026-07-28")
+                assert self.poll_until_found(window) == expected
+            scan.assert_not_called()
+            assert window.capture_directory == str(root / "2026-07-28")
+        finally:
+            window.image_watcher.stop()
+
+    def test_the_watch_narrows_to_the_adopted_folder(self, watching):
+        window, root = watching
+        window.image_watcher.start(str(root), window.last_checked, recursive=True)
+        try:
+            self.shoot_into(root / "2026-07-28", "IMG_0001.JPG", 5000)
+            self.poll_until_found(window)
+            self.shoot_into(root / "elsewhere", "IMG_9999.JPG", 6000)
+            QApplication.processEvents()
+            assert window.poll_for_image() is None
+        finally:
+            window.image_watcher.stop()
+
+    def test_a_folder_that_cannot_be_watched_falls_back_to_scanning(self, watching):
+        window, root = watching
+        with patch.object(QFileSystemWatcher, "addPaths", return_value=[str(root)]):
+            assert not window.image_watcher.start(str(root), window.last_checked)
+        expected = self.shoot_into(root / "2026-07-28")
+        assert window.poll_for_image() == expected
+
     def test_a_new_run_rediscovers_the_folder(self, main_window, workdir):
         # The dated folder changes daily; a run started after midnight must not
         # keep writing into yesterday's.
@@ -575,6 +705,30 @@ def test_opening_a_directory_clears_a_previous_adoption(self, main_window, workd
 # -- which fitter runs -----------------------------------------------------
 
 
+def generate(window):
+    """generatePTM, then wait for the fit it starts on the worker thread."""
+    window.generatePTM()
+    window.wait_for_fit()
+
+
+@contextmanager
+def held_fit():
+    """Hold the built-in fit at its start until the yielded callable is called,
+    so a test can act while it is running."""
+    gate = threading.Event()
+    real = ptm_builder.generate_native
+
+    def held(*args, **kwargs):
+        gate.wait(5)
+        return real(*args, **kwargs)
+
+    with patch.object(ptm_builder, "generate_native", held):
+        try:
+            yield gate.set
+        finally:
+            gate.set()
+
+
 @pytest.fixture
 def ready_to_fit_natively(main_window, workdir):
     """A capture of real, if tiny, JPEGs -- the built-in fitter decodes them."""
@@ -609,7 +763,7 @@ def test_the_builtin_fitter_never_runs_the_external_one(ready_to_fit_natively, w
         patch.object(QFileDialog, "getSaveFileName", return_value=(out, "")),
         patch.object(ptm_builder, "_subprocess_runner") as runner,
     ):
-        window.generatePTM()
+        generate(window)
     runner.assert_not_called()
     assert ptm_format.read(out).width == 6
 
@@ -618,7 +772,7 @@ def test_the_builtin_fitter_writes_the_lp_beside_the_images(ready_to_fit_nativel
     """Kept for the record even though nothing external reads it now."""
     window, capture_dir = ready_to_fit_natively
     with patch.object(QFileDialog, "getSaveFileName", return_value=(str(workdir / "n.ptm"), "")):
-        window.generatePTM()
+        generate(window)
     lines = (capture_dir / "specimen02.lp").read_text(encoding="utf-8").splitlines()
     assert lines[0] == "8"
     assert lines[1].startswith("IMG_1000.jpg ")
@@ -632,7 +786,7 @@ def test_the_builtin_fitter_ignores_the_ptmfitter_path(ready_to_fit_natively, wo
         patch.object(QFileDialog, "getSaveFileName", return_value=(str(workdir / "n.ptm"), "")),
         patch.object(QMessageBox, "critical") as critical,
     ):
-        window.generatePTM()
+        generate(window)
     critical.assert_not_called()
     assert (workdir / "n.ptm").exists()
 
@@ -646,7 +800,7 @@ def test_too_few_images_for_a_fit_is_reported(ready_to_fit_natively, workdir):
         patch.object(QFileDialog, "getSaveFileName", return_value=(str(workdir / "n.ptm"), "")),
         patch.object(QMessageBox, "critical") as critical,
     ):
-        window.generatePTM()
+        generate(window)
     critical.assert_called_once()
     assert "at least 6" in critical.call_args.args[2]
 
@@ -658,7 +812,7 @@ def test_an_empty_table_is_reported_by_the_builtin_fitter(ready_to_fit_natively,
         patch.object(QFileDialog, "getSaveFileName", return_value=(str(workdir / "n.ptm"), "")),
         patch.object(QMessageBox, "critical") as critical,
     ):
-        window.generatePTM()
+        generate(window)
     critical.assert_called_once()
 
 
@@ -668,12 +822,63 @@ def test_cancelling_the_progress_dialog_abandons_the_fit(ready_to_fit_natively,
     out = workdir / "cancelled.ptm"
     with (
         patch.object(QFileDialog, "getSaveFileName", return_value=(str(out), "")),
-        patch.object(QProgressDialog, "wasCanceled", return_value=True),
+        held_fit() as release,
         patch.object(QMessageBox, "critical") as critical,
     ):
         window.generatePTM()
+        window.fit_dialog.canceled.emit()
+        release()
+        window.wait_for_fit()
     critical.assert_not_called()
     assert not out.exists()
+    assert window.btnGeneratePTM.isEnabled()
+
+
+def test_the_window_stays_usable_while_fitting(ready_to_fit_natively, workdir):
+    """The fit is on a worker thread: generatePTM returns before it is done."""
+    window, _capture_dir = ready_to_fit_natively
+    out = workdir / "n.ptm"
+    with (
+        patch.object(QFileDialog, "getSaveFileName", return_value=(str(out), "")),
+        held_fit() as release,
+    ):
+        window.generatePTM()
+        assert window.fit_thread.isRunning()
+        assert not out.exists()
+        release()
+        window.wait_for_fit()
+    assert ptm_format.read(str(out)).width == 6
+
+
+def test_a_second_click_while_fitting_starts_nothing(ready_to_fit_natively, workdir):
+    window, _capture_dir = ready_to_fit_natively
+    with (
+        patch.object(
+            QFileDialog, "getSaveFileName", return_value=(str(workdir / "n.ptm"), "")
+        ) as ask,
+        held_fit() as release,
+    ):
+        window.generatePTM()
+        assert not window.btnGeneratePTM.isEnabled()
+        window.generatePTM()
+        release()
+        window.wait_for_fit()
+    ask.assert_called_once()
+    assert window.btnGeneratePTM.isEnabled()
+
+
+def test_closing_the_window_stops_the_fit(ready_to_fit_natively, workdir):
+    window, _capture_dir = ready_to_fit_natively
+    out = workdir / "n.ptm"
+    with (
+        patch.object(QFileDialog, "getSaveFileName", return_value=(str(out), "")),
+        held_fit() as release,
+    ):
+        window.generatePTM()
+        threading.Timer(0.1, release).start()
+        window.close()
+    assert window.fit_thread is None
+    assert not out.exists()
 
 
 def test_progress_reaches_the_dialog(ready_to_fit_natively, workdir):
@@ -683,10 +888,76 @@ def test_progress_reaches_the_dialog(ready_to_fit_natively, workdir):
         patch.object(QFileDialog, "getSaveFileName", return_value=(str(workdir / "n.ptm"), "")),
         patch.object(QProgressDialog, "setValue") as set_value,
     ):
-        window.generatePTM()
+        generate(window)
     assert [call.args[0] for call in set_value.call_args_list] == list(range(1, 9))
 
 
+# -- fitting while the capture runs ----------------------------------------
+
+
+@pytest.fixture
+def captured_live(ready_to_fit_natively):
+    """The same capture, arriving through record_slot with a live fit running."""
+    window, capture_dir = ready_to_fit_natively
+    slots, window.image_data = window.image_data, []
+    window.live_fit = ptm_builder.LiveFit()
+    for slot in slots:
+        window.record_slot(slot.led_index, os.path.join(slot.directory, slot.filename))
+    yield window, capture_dir
+    window.discard_live_fit()
+
+
+def test_a_capture_run_starts_a_live_fit(connected):
+    window, _port = connected
+    window.fitter = prefs.FITTER_NATIVE
+    window.take_all_pictures()
+    try:
+        assert window.live_fit is not None
+    finally:
+        window.timer.stop()
+        window.discard_live_fit()
+
+
+def test_the_external_fitter_gets_no_live_fit(connected):
+    window, _port = connected
+    window.fitter = prefs.FITTER_EXTERNAL
+    window.take_all_pictures()
+    window.timer.stop()
+    assert window.live_fit is None
+
+
+def test_generating_after_a_run_uses_the_live_fit(captured_live, workdir):
+    window, _capture_dir = captured_live
+    out = str(workdir / "live.ptm")
+    with (
+        patch.object(QFileDialog, "getSaveFileName", return_value=(out, "")),
+        patch.object(ptm_builder, "generate_native") as full_fit,
+    ):
+        generate(window)
+    full_fit.assert_not_called()
+    assert ptm_format.read(out).width == 6
+
+
+def test_an_unchecked_shot_is_left_out_of_the_live_fit(captured_live, workdir):
+    window, _capture_dir = captured_live
+    window.image_model.item(7, 0).setCheckState(Qt.Unchecked)
+    assert 7 not in window.live_fit._wanted
+    with patch.object(QFileDialog, "getSaveFileName", return_value=(str(workdir / "n.ptm"), "")):
+        generate(window)
+    lines = (workdir / "specimen02" / "specimen02.lp").read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "7"
+
+
+def test_an_unusable_live_fit_falls_back_to_the_files(captured_live, workdir):
+    window, _capture_dir = captured_live
+    window.live_fit.include(0, str(workdir / "nowhere.jpg"), light_vectors()[0])
+    out = str(workdir / "n.ptm")
+    with patch.object(QFileDialog, "getSaveFileName", return_value=(out, "")):
+        generate(window)
+    assert window.live_fit is None
+    assert ptm_format.read(out).width == 6
+
+
 # -- where the application writes ------------------------------------------
 
 
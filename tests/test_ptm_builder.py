@@ -16,12 +16,18 @@
 from core.ptm_builder import (
     STAGED_LP,
     STAGED_PTM,
+    LiveFit,
+    LiveFitUnavailableError,
     NoImagesToFitError,
     PtmFitterFailedError,
     PtmFitterNotFoundError,
     build_lp_content,
+    checkpoint_path_for,
+    decode_ahead,
     generate,
+    generate_native,
     is_safe_filename,
+    load_image,
     lp_path_for,
     normalise_extension,
     usable_slots,
@@ -325,3 +331,440 @@ def test_the_kept_lp_records_the_real_names(capture_with_awkward_names, tmp_path
     content = pathlib.Path(kept).read_text(encoding="utf-8")
     assert "IMG 0001.jpg" in content
     assert "IMG 0002.jpg" in content
+
+
+# -- decoding ahead of the fit ---------------------------------------------
+#
+# Decoding is about 96% of a native fit, so it runs on a pool while the fit
+# absorbs the image in front of it. What must not change is the order the fit
+# sees the images in, and the bound on how many are alive at once.
+
+
+def test_decoded_images_arrive_in_light_order():
+    import time
+
+    def slow_first(path):
+        # The first image is the slowest to decode; it must still come first.
+        time.sleep(0.05 if path == "0" else 0)
+        return int(path)
+
+    paths = [str(i) for i in range(12)]
+    assert list(decode_ahead(paths, slow_first, workers=4)) == list(range(12))
+
+
+def test_no_more_than_the_resident_bound_are_alive():
+    import threading
+    import weakref
+
+    import numpy as np
+
+    alive = []
+    lock = threading.Lock()
+    peak = []
+
+    def loader(path):
+        image = np.zeros(4, dtype=np.uint8)
+        with lock:
+            alive.append(weakref.ref(image))
+            peak.append(sum(1 for reference in alive if reference() is not None))
+        return image
+
+    images = decode_ahead([str(i) for i in range(20)], loader, workers=3, resident=3)
+    for image in images:
+        del image
+    assert max(peak) <= 3
+
+
+def test_a_resident_bound_below_one_is_refused():
+    with pytest.raises(ValueError, match="at least one"):
+        list(decode_ahead(["a"], lambda path: path, resident=0))
+
+
+def test_a_decode_failure_reaches_the_caller():
+    def broken(path):
+        raise OSError(f"cannot read {path}")
+
+    with pytest.raises(OSError, match="cannot read a"):
+        list(decode_ahead(["a", "b"], broken, workers=2))
+
+
+def test_closing_early_stops_the_decoders():
+    """A cancelled fit closes the generator; nothing queued should still run."""
+    import time
+
+    decoded = []
+
+    def loader(path):
+        time.sleep(0.01)
+        decoded.append(path)
+        return path
+
+    images = decode_ahead([str(i) for i in range(50)], loader, workers=2, resident=2)
+    next(images)
+    images.close()
+    assert len(decoded) <= 3
+
+
+def test_reused_arrays_are_recycled_through_a_ring():
+    import numpy as np
+
+    given = []
+
+    def loader(path, out=None):
+        given.append(out)
+        image = np.empty((2, 2, 3), np.uint8) if out is None else out
+        image.fill(int(path))
+        return image
+
+    images = decode_ahead([str(i) for i in range(20)], loader, workers=2, reuse=True)
+    assert [int(image[0, 0, 0]) for image in images] == list(range(20))
+    assert given[:3] == [None] * 3, "one array per resident image"
+    assert all(out is not None for out in given[3:])
+    assert len({id(out) for out in given[3:]}) == 3
+
+
+def test_an_array_that_cannot_be_written_is_not_recycled():
+    import numpy as np
+
+    given = []
+
+    def loader(path, out=None):
+        given.append(out)
+        image = np.zeros((2, 2, 3), np.uint8)
+        image.flags.writeable = False
+        return image
+
+    list(decode_ahead([str(i) for i in range(5)], loader, workers=1, reuse=True))
+    assert given == [None] * 5
+
+
+@pytest.fixture
+def shaded_capture(tmp_path):
+    """Eight tiny JPEGs, lit so the fit has something to recover."""
+    import numpy as np
+    from PIL import Image
+
+    directory = tmp_path / "specimen03"
+    directory.mkdir()
+    base = np.random.default_rng(1).integers(40, 200, size=(4, 6, 3)).astype(float)
+    slots = []
+    for index in range(8):
+        u, v, _w = VECTORS[index]
+        shaded = np.clip(base * (0.5 + 0.4 * u + 0.3 * v), 0, 255).astype(np.uint8)
+        name = f"IMG_200{index}.JPG"
+        Image.fromarray(shaded).save(directory / name, subsampling=0, quality=95)
+        slots.append(CaptureSlot(index, str(directory), name, True))
+    return slots
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_parallel_decoding_does_not_change_the_ptm(shaded_capture, tmp_path, workers):
+    from core import ptm_format
+
+    serial, parallel = tmp_path / "serial.ptm", tmp_path / "parallel.ptm"
+    generate_native(shaded_capture, VECTORS, str(serial), workers=1, resident=1)
+    generate_native(shaded_capture, VECTORS, str(parallel), workers=workers)
+    assert serial.read_bytes() == parallel.read_bytes()
+    assert ptm_format.read(str(parallel)).width == 6
+
+
+def test_progress_still_counts_every_image(shaded_capture, tmp_path):
+    seen = []
+    generate_native(
+        shaded_capture, VECTORS, str(tmp_path / "out.ptm"), progress=lambda d, n: seen.append(d)
+    )
+    assert seen == list(range(1, 9))
+
+
+def test_a_fit_accounts_for_its_time_by_stage(shaded_capture, tmp_path):
+    from core.fit_stats import FitStats
+
+    stats = FitStats()
+    generate_native(shaded_capture, VECTORS, str(tmp_path / "out.ptm"), stats=stats)
+    assert [record.position for record in stats.images] == list(range(8))
+    assert all(record.decode is not None for record in stats.images)
+    assert stats.seconds["decode"] > 0 and stats.seconds["write"] > 0
+    assert stats.wall_seconds > 0
+
+
+# -- preview fits ------------------------------------------------------------
+
+
+@pytest.fixture
+def odd_sized_images(tmp_path):
+    """The same picture as a JPEG and a PNG, at a size no reduction divides."""
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.random.default_rng(3).integers(0, 256, size=(23, 37, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(tmp_path / "odd.jpg")
+    Image.fromarray(pixels).save(tmp_path / "odd.png")
+    return tmp_path / "odd.jpg", tmp_path / "odd.png"
+
+
+@pytest.mark.parametrize(
+    ("reduction", "shape"), [(2, (12, 19, 3)), (4, (6, 10, 3)), (8, (3, 5, 3))]
+)
+def test_a_reduced_decode_rounds_up(odd_sized_images, reduction, shape):
+    jpeg, png = odd_sized_images
+    assert load_image(str(jpeg), reduction).shape == shape
+    assert load_image(str(png), reduction).shape == shape
+
+
+def test_a_jpeg_is_scaled_by_the_decoder(odd_sized_images, monkeypatch):
+    from PIL import Image
+
+    monkeypatch.setattr(
+        Image.Image, "resize", MagicMock(side_effect=AssertionError("decoded at full size"))
+    )
+    assert load_image(str(odd_sized_images[0]), 4).shape == (6, 10, 3)
+
+
+def test_a_reduction_larger_than_the_image_leaves_one_pixel(tmp_path):
+    import numpy as np
+    from PIL import Image
+
+    Image.fromarray(np.zeros((4, 6, 3), np.uint8)).save(tmp_path / "tiny.jpg")
+    assert load_image(str(tmp_path / "tiny.jpg"), 8).shape == (1, 1, 3)
+
+
+def test_a_preview_fit_is_a_smaller_ptm(tmp_path):
+    import numpy as np
+    from PIL import Image
+
+    from core import ptm_format
+
+    base = np.random.default_rng(1).integers(40, 200, size=(32, 48, 3)).astype(float)
+    slots = []
+    for index in range(8):
+        u, v, _w = VECTORS[index]
+        shaded = np.clip(base * (0.5 + 0.4 * u + 0.3 * v), 0, 255).astype(np.uint8)
+        Image.fromarray(shaded).save(tmp_path / f"IMG_{index}.JPG")
+        slots.append(CaptureSlot(index, str(tmp_path), f"IMG_{index}.JPG", True))
+
+    generate_native(slots, VECTORS, str(tmp_path / "preview.ptm"), reduction=4)
+    preview = ptm_format.read(str(tmp_path / "preview.ptm"))
+    assert (preview.width, preview.height) == (12, 8)
+
+
+def test_a_preview_passes_the_reduction_to_the_loader(shaded_capture, tmp_path):
+    import numpy as np
+
+    seen = []
+
+    def loader(path, reduction=1, out=None):
+        seen.append(reduction)
+        return np.full((2, 3, 3), 128, np.uint8)
+
+    generate_native(shaded_capture, VECTORS, str(tmp_path / "out.ptm"), loader=loader, reduction=8)
+    assert seen == [8] * 8
+
+
+@pytest.mark.parametrize("reduction", [0, 3, 16])
+def test_a_reduction_the_decoder_cannot_produce_is_refused(shaded_capture, tmp_path, reduction):
+    with pytest.raises(ValueError, match="reduction must be"):
+        generate_native(shaded_capture, VECTORS, str(tmp_path / "out.ptm"), reduction=reduction)
+
+
+# -- fitting while the capture runs ------------------------------------------
+
+
+def _path(slot):
+    return os.path.join(slot.directory, slot.filename)
+
+
+@pytest.fixture
+def live(shaded_capture):
+    live = LiveFit()
+    yield live
+    live.close()
+
+
+def _close_to(written, reference):
+    import numpy as np
+
+    from core import ptm_format
+
+    ptm, expected = ptm_format.read(str(written)), ptm_format.read(str(reference))
+    assert np.abs(ptm.coefficients.astype(int) - expected.coefficients).max() <= 1
+    assert np.array_equal(ptm.rgb, expected.rgb)
+
+
+def test_a_live_fit_writes_what_a_full_fit_would(shaded_capture, live, tmp_path):
+    for slot in shaded_capture:
+        live.include(slot.led_index, _path(slot), VECTORS[slot.led_index])
+    kept_lp = live.write(shaded_capture, VECTORS, str(tmp_path / "live.ptm"))
+    generate_native(shaded_capture, VECTORS, str(tmp_path / "full.ptm"))
+    _close_to(tmp_path / "live.ptm", tmp_path / "full.ptm")
+    assert kept_lp == lp_path_for(shaded_capture[0].directory)
+
+
+def test_writing_catches_up_with_the_table(shaded_capture, live, tmp_path):
+    """Shots never handed over are folded in; unchecked ones are folded out."""
+    for slot in shaded_capture[:5]:
+        live.include(slot.led_index, _path(slot), VECTORS[slot.led_index])
+    table = [*shaded_capture[:6], shaded_capture[6]._replace(include=False), shaded_capture[7]]
+    live.write(table, VECTORS, str(tmp_path / "live.ptm"))
+    generate_native(table, VECTORS, str(tmp_path / "full.ptm"))
+    _close_to(tmp_path / "live.ptm", tmp_path / "full.ptm")
+
+
+def test_a_retake_replaces_the_shot(shaded_capture, live, tmp_path):
+    import shutil
+
+    for slot in shaded_capture:
+        live.include(slot.led_index, _path(slot), VECTORS[slot.led_index])
+    retake = shaded_capture[2]._replace(filename="IMG_3002.JPG")
+    shutil.copy(_path(shaded_capture[3]), _path(retake))
+    live.include(2, _path(retake), VECTORS[2])
+
+    table = [*shaded_capture[:2], retake, *shaded_capture[3:]]
+    live.write(table, VECTORS, str(tmp_path / "live.ptm"))
+    generate_native(table, VECTORS, str(tmp_path / "full.ptm"))
+    _close_to(tmp_path / "live.ptm", tmp_path / "full.ptm")
+
+
+def test_each_shot_is_decoded_once_when_nothing_changes(shaded_capture, tmp_path):
+    from core.ptm_builder import load_image
+
+    decoded = []
+
+    def loader(path, out=None):
+        decoded.append(path)
+        return load_image(path, out=out)
+
+    live = LiveFit(loader)
+    try:
+        for slot in shaded_capture:
+            live.include(slot.led_index, _path(slot), VECTORS[slot.led_index])
+        live.include(0, _path(shaded_capture[0]), VECTORS[0])
+        live.write(shaded_capture, VECTORS, str(tmp_path / "live.ptm"))
+    finally:
+        live.close()
+    assert sorted(decoded) == sorted(_path(slot) for slot in shaded_capture)
+
+
+def test_a_shot_changed_on_disk_makes_the_live_fit_unusable(shaded_capture, live, tmp_path):
+    """Folding it out would subtract pixels that were never added."""
+    import shutil
+
+    for slot in shaded_capture:
+        live.include(slot.led_index, _path(slot), VECTORS[slot.led_index])
+    live.write(shaded_capture, VECTORS, str(tmp_path / "first.ptm"))
+    shutil.copy(_path(shaded_capture[1]), _path(shaded_capture[0]))
+    os.utime(_path(shaded_capture[0]), ns=(0, 0))
+
+    table = [shaded_capture[0]._replace(include=False), *shaded_capture[1:]]
+    with pytest.raises(LiveFitUnavailableError, match="has changed"):
+        live.write(table, VECTORS, str(tmp_path / "second.ptm"))
+    assert not (tmp_path / "second.ptm").exists()
+
+
+def test_a_shot_that_cannot_be_decoded_makes_the_live_fit_unusable(shaded_capture, live, tmp_path):
+    live.include(0, str(tmp_path / "nowhere.jpg"), VECTORS[0])
+    with pytest.raises(LiveFitUnavailableError):
+        live.write(shaded_capture, VECTORS, str(tmp_path / "live.ptm"))
+    assert live.failed
+
+
+def test_a_closed_live_fit_is_unavailable_rather_than_broken(shaded_capture, live, tmp_path):
+    """The table can be cleared while a fit worker is writing from it."""
+    live.close()
+    with pytest.raises(LiveFitUnavailableError, match="closed"):
+        live.write(shaded_capture, VECTORS, str(tmp_path / "live.ptm"))
+
+
+def test_a_live_fit_of_nothing_is_refused(live, tmp_path):
+    with pytest.raises(NoImagesToFitError):
+        live.write([], VECTORS, str(tmp_path / "live.ptm"))
+
+
+# -- resuming an interrupted fit ---------------------------------------------
+
+
+def _interrupting_at(failing_at, seen):
+    from core.ptm_builder import load_image
+
+    def loader(path, out=None):
+        if len(seen) == failing_at:
+            raise KeyboardInterrupt
+        seen.append(os.path.basename(path))
+        return load_image(path, out=out)
+
+    return loader
+
+
+def test_the_checkpoint_goes_beside_the_images(tmp_path):
+    directory = tmp_path / "specimen03"
+    assert checkpoint_path_for(str(directory)) == str(directory / "specimen03.fitcheckpoint")
+
+
+def test_an_interrupted_fit_resumes_without_decoding_again(shaded_capture, tmp_path):
+    seen = []
+    with pytest.raises(KeyboardInterrupt):
+        generate_native(
+            shaded_capture,
+            VECTORS,
+            str(tmp_path / "out.ptm"),
+            loader=_interrupting_at(5, seen),
+            workers=1,
+            resident=1,
+            checkpoint_interval=0,
+        )
+    checkpoint = pathlib.Path(checkpoint_path_for(shaded_capture[0].directory))
+    assert checkpoint.exists()
+
+    seen.clear()
+    generate_native(
+        shaded_capture,
+        VECTORS,
+        str(tmp_path / "out.ptm"),
+        loader=_interrupting_at(None, seen),
+        checkpoint_interval=0,
+    )
+    # Five were absorbed, and saved, before the sixth failed to decode.
+    assert seen == [f"IMG_200{index}.JPG" for index in range(5, 8)]
+    assert not checkpoint.exists()
+
+    generate_native(shaded_capture, VECTORS, str(tmp_path / "whole.ptm"))
+    assert (tmp_path / "out.ptm").read_bytes() == (tmp_path / "whole.ptm").read_bytes()
+
+
+def test_a_changed_capture_is_fitted_from_the_start(shaded_capture, tmp_path):
+    seen = []
+    with pytest.raises(KeyboardInterrupt):
+        generate_native(
+            shaded_capture,
+            VECTORS,
+            str(tmp_path / "out.ptm"),
+            loader=_interrupting_at(5, seen),
+            workers=1,
+            resident=1,
+            checkpoint_interval=0,
+        )
+    retaken = pathlib.Path(shaded_capture[2].directory, shaded_capture[2].filename)
+    os.utime(retaken, ns=(0, 0))
+
+    seen.clear()
+    generate_native(
+        shaded_capture,
+        VECTORS,
+        str(tmp_path / "out.ptm"),
+        loader=_interrupting_at(None, seen),
+        checkpoint_interval=0,
+    )
+    assert len(seen) == 8
+
+
+def test_no_checkpoint_is_written_unless_asked_for(shaded_capture, tmp_path):
+    seen = []
+    with pytest.raises(KeyboardInterrupt):
+        generate_native(
+            shaded_capture,
+            VECTORS,
+            str(tmp_path / "out.ptm"),
+            loader=_interrupting_at(5, seen),
+            workers=1,
+            resident=1,
+        )
+    assert not pathlib.Path(checkpoint_path_for(shaded_capture[0].directory)).exists()
@@ -6,6 +6,7 @@
 mean — evaluate both at each input light and compare against the source.
 """
 
+from itertools import pairwise
 from pathlib import Path
 
 import numpy as np
@@ -281,6 +282,22 @@ def test_memory_estimate_counts_every_full_resolution_buffer():
     assert per_pixel == pytest.approx((11 * 4 + 12), rel=0.01)
 
 
+def test_memory_estimate_counts_images_decoded_ahead():
+    """Each image alive at once is another 3 bytes per pixel."""
+    one = ptm_fitter.memory_estimate(1000, 1000)
+    assert ptm_fitter.memory_estimate(1000, 1000, resident=5) - one == 4 * 3 * 1_000_000
+
+
+def test_memory_estimate_counts_a_luminance_plane_per_batched_image():
+    one = ptm_fitter.memory_estimate(1000, 1000)
+    assert ptm_fitter.memory_estimate(1000, 1000, batch=8) - one == 7 * 4 * 1_000_000
+
+
+def test_memory_estimate_on_disk_counts_only_the_rows_and_images():
+    on_disk = ptm_fitter.memory_estimate(1000, 1000, resident=2, batch=3, on_disk=True)
+    assert on_disk == (4 * 4 + 2 * 3) * 1_000_000
+
+
 def test_memory_does_not_grow_with_the_number_of_images():
     assert ptm_fitter.memory_estimate(100, 100) == ptm_fitter.memory_estimate(100, 100)
 
@@ -303,6 +320,342 @@ def test_streaming_refuses_too_few_images():
         ptm_fitter.fit_streaming([np.zeros((2, 2, 3), np.uint8)] * 3, np.array(light_vectors()[:3]))
 
 
+# -- banding across cores ---------------------------------------------------
+#
+# Each band is a run of whole rows, updated by its own thread from every image.
+# The operations per pixel are the same whatever the banding, so the result
+# must be the same to the byte, not merely close.
+
+
+@pytest.fixture(scope="module")
+def odd_sized_capture():
+    """Dimensions that do not divide evenly into any of the band counts."""
+    rng = np.random.default_rng(7)
+    lights = np.array(light_vectors()[:14])
+    images = rng.integers(0, 256, size=(14, 37, 23, 3), dtype=np.uint8)
+    return list(images), lights
+
+
+@pytest.mark.parametrize("bands", [2, 3, 8, 100])
+def test_banding_is_byte_identical_to_the_serial_fit(odd_sized_capture, bands):
+    images, lights = odd_sized_capture
+    assert ptm_fitter.fit_streaming(images, lights, bands=bands) == ptm_fitter.fit_streaming(
+        images, lights
+    )
+
+
+def test_bands_cover_every_row_exactly_once():
+    rows = ptm_fitter._row_bands(37, 23, 5)
+    assert len(rows) == 5
+    assert rows[0].start == 0
+    assert rows[-1].stop == 37 * 23
+    assert all(a.stop == b.start for a, b in pairwise(rows))
+    assert all((part.stop - part.start) % 23 == 0 for part in rows)
+
+
+def test_more_bands_than_rows_is_capped():
+    assert len(ptm_fitter._row_bands(3, 10, 8)) == 3
+
+
+def test_a_failure_while_banded_still_reaches_the_caller(odd_sized_capture):
+    images, lights = odd_sized_capture
+    images = [*images[:5], np.zeros((2, 2, 3), np.uint8), *images[6:]]
+    with pytest.raises(FitError, match="but the first was"):
+        ptm_fitter.fit_streaming(images, lights, bands=4)
+
+
+# -- batching images into one multiplication ---------------------------------
+#
+# The same sum regrouped, so it is close to the serial fit rather than equal:
+# BLAS adds in its own order.
+
+
+def _assert_close_to(ptm, reference):
+    assert ptm.scale == pytest.approx(reference.scale, rel=1e-4)
+    assert np.array_equal(ptm.bias, reference.bias)
+    assert np.abs(ptm.coefficients.astype(int) - reference.coefficients).max() <= 1
+    assert np.array_equal(ptm.rgb, reference.rgb)
+
+
+@pytest.mark.parametrize("batch", [2, 5, 14, 50])
+def test_batching_matches_the_serial_fit_to_rounding(odd_sized_capture, batch):
+    """Including a batch that does not divide the image count, one that
+    holds every image, and one larger than the capture."""
+    images, lights = odd_sized_capture
+    _assert_close_to(
+        ptm_fitter.fit_streaming(images, lights, batch=batch),
+        ptm_fitter.fit_streaming(images, lights),
+    )
+
+
+def test_batching_and_banding_together(odd_sized_capture):
+    images, lights = odd_sized_capture
+    _assert_close_to(
+        ptm_fitter.fit_streaming(images, lights, batch=4, bands=3),
+        ptm_fitter.fit_streaming(images, lights),
+    )
+
+
+def test_batched_multiplication_spans_chunk_boundaries(monkeypatch, odd_sized_capture):
+    """A chunk smaller than a band, and not a divisor of it."""
+    images, lights = odd_sized_capture
+    monkeypatch.setattr(ptm_fitter, "_GEMM_CHUNK", 100)
+    _assert_close_to(
+        ptm_fitter.fit_streaming(images, lights, batch=4),
+        ptm_fitter.fit_streaming(images, lights),
+    )
+
+
+def test_progress_is_still_per_image_when_batched(odd_sized_capture):
+    images, lights = odd_sized_capture
+    seen = []
+    ptm_fitter.fit_streaming(images, lights, batch=4, progress=lambda d, t: seen.append(d))
+    assert seen == list(range(1, 15))
+
+
+def test_a_batch_of_nothing_is_rejected(odd_sized_capture):
+    images, lights = odd_sized_capture
+    with pytest.raises(FitError, match="at least one image"):
+        ptm_fitter.fit_streaming(images, lights, batch=0)
+
+
+# -- accumulators on disk ----------------------------------------------------
+
+
+def _mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_a_fit_on_disk_is_byte_identical(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    on_disk = ptm_fitter.fit_streaming(images, lights, bands=3, scratch_dir=str(tmp_path))
+    assert on_disk == ptm_fitter.fit_streaming(images, lights, bands=3)
+    assert _mapped(on_disk.coefficients)
+    assert _mapped(on_disk.rgb)
+
+
+def test_a_fit_on_disk_leaves_nothing_in_the_scratch_directory(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    ptm = ptm_fitter.fit_streaming(images, lights, scratch_dir=str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+    ptm_format.write(str(tmp_path / "out.ptm"), ptm)
+    assert ptm_format.read(str(tmp_path / "out.ptm")) == ptm
+
+
+def test_a_fit_in_memory_maps_nothing(odd_sized_capture):
+    images, lights = odd_sized_capture
+    ptm = ptm_fitter.fit_streaming(images, lights)
+    assert not _mapped(ptm.coefficients)
+    assert not _mapped(ptm.rgb)
+
+
+# -- checkpoints -------------------------------------------------------------
+
+
+class _InterruptedError(Exception):
+    pass
+
+
+def _loader_failing_at(images, failing_at, seen):
+    def loader(index):
+        if index == failing_at:
+            raise _InterruptedError
+        seen.append(index)
+        return images[index]
+
+    return loader
+
+
+def test_an_interrupted_fit_resumes_where_it_was_saved(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    path = str(tmp_path / "fit.checkpoint")
+    seen = []
+    with pytest.raises(_InterruptedError):
+        ptm_fitter.fit_streaming(
+            _loader_failing_at(images, 9, seen),
+            lights,
+            count=14,
+            checkpoint=ptm_fitter.Checkpoint(path, key="k", interval=0),
+        )
+
+    resumed = ptm_fitter.Checkpoint(path, key="k")
+    assert resumed.start == 9
+    seen.clear()
+    ptm = ptm_fitter.fit_streaming(
+        _loader_failing_at(images, None, seen), lights, count=14, checkpoint=resumed
+    )
+    assert seen == list(range(9, 14))
+    assert ptm == ptm_fitter.fit_streaming(images, lights)
+
+
+def test_a_finished_fit_removes_its_checkpoint(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    path = tmp_path / "fit.checkpoint"
+    checkpoint = ptm_fitter.Checkpoint(str(path), interval=0)
+    ptm_fitter.fit_streaming(images, lights, checkpoint=checkpoint)
+    assert not path.exists()
+    assert not (tmp_path / "fit.checkpoint.partial").exists()
+
+
+def test_a_batched_fit_saves_what_it_is_holding(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    path = str(tmp_path / "fit.checkpoint")
+    with pytest.raises(_InterruptedError):
+        ptm_fitter.fit_streaming(
+            _loader_failing_at(images, 7, []),
+            lights,
+            count=14,
+            batch=4,
+            checkpoint=ptm_fitter.Checkpoint(path, interval=0),
+        )
+    ptm = ptm_fitter.fit_streaming(
+        _loader_failing_at(images, None, []),
+        lights,
+        count=14,
+        batch=4,
+        checkpoint=ptm_fitter.Checkpoint(path),
+    )
+    _assert_close_to(ptm, ptm_fitter.fit_streaming(images, lights))
+
+
+def test_a_checkpoint_for_other_inputs_is_ignored(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    path = str(tmp_path / "fit.checkpoint")
+    with pytest.raises(_InterruptedError):
+        ptm_fitter.fit_streaming(
+            _loader_failing_at(images, 9, []),
+            lights,
+            count=14,
+            checkpoint=ptm_fitter.Checkpoint(path, key="before", interval=0),
+        )
+    assert ptm_fitter.Checkpoint(path, key="after").start == 0
+
+
+@pytest.mark.parametrize("content", [b"", b"garbage\n", b"PTMGenerator fit checkpoint 1\n{"])
+def test_an_unreadable_checkpoint_is_ignored(tmp_path, content):
+    path = tmp_path / "fit.checkpoint"
+    path.write_bytes(content)
+    assert ptm_fitter.Checkpoint(str(path)).start == 0
+
+
+def test_saves_wait_for_the_interval(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    now = [0.0]
+    checkpoint = ptm_fitter.Checkpoint(
+        str(tmp_path / "fit.checkpoint"), interval=10, clock=lambda: now[0]
+    )
+    saves = []
+    original = checkpoint.save
+    checkpoint.save = lambda done, *arrays: (saves.append(done), original(done, *arrays))
+
+    def loader(index):
+        now[0] += 4  # an image every four seconds
+        return images[index]
+
+    ptm_fitter.fit_streaming(loader, lights, count=14, checkpoint=checkpoint)
+    assert saves == [3, 6, 9, 12]
+
+
+def test_a_checkpoint_of_other_sized_images_is_refused(odd_sized_capture, tmp_path):
+    images, lights = odd_sized_capture
+    path = str(tmp_path / "fit.checkpoint")
+    with pytest.raises(_InterruptedError):
+        ptm_fitter.fit_streaming(
+            _loader_failing_at(images, 9, []),
+            lights,
+            count=14,
+            checkpoint=ptm_fitter.Checkpoint(path, interval=0),
+        )
+    smaller = [image[:-1] for image in images]
+    with pytest.raises(FitError, match="different size"):
+        ptm_fitter.fit_streaming(smaller[9:], lights, checkpoint=ptm_fitter.Checkpoint(path))
+
+
+# -- an incremental fit ------------------------------------------------------
+#
+# Normal equations rather than the solver, so again close rather than equal.
+
+
+def _incremental(images, lights, keys=None):
+    live = ptm_fitter.IncrementalFit()
+    for key, image, light in zip(keys or range(len(images)), images, lights, strict=True):
+        live.add(key, image, light)
+    return live
+
+
+def test_an_incremental_fit_matches_the_streaming_one(odd_sized_capture):
+    images, lights = odd_sized_capture
+    _assert_close_to(
+        _incremental(images, lights).result(), ptm_fitter.fit_streaming(images, lights)
+    )
+
+
+def test_the_order_images_arrive_in_does_not_matter(odd_sized_capture):
+    images, lights = odd_sized_capture
+    backwards = _incremental(images[::-1], lights[::-1], keys=range(13, -1, -1))
+    _assert_close_to(backwards.result(), ptm_fitter.fit_streaming(images, lights))
+
+
+def test_removing_an_image_is_as_if_it_was_never_added(odd_sized_capture):
+    images, lights = odd_sized_capture
+    live = _incremental(images, lights)
+    live.remove(3, images[3])
+    live.remove(9, images[9])
+    kept = [i for i in range(14) if i not in (3, 9)]
+    _assert_close_to(
+        live.result(),
+        ptm_fitter.fit_streaming([images[i] for i in kept], lights[kept]),
+    )
+    assert len(live) == 12
+
+
+def test_a_retake_replaces_the_image(odd_sized_capture):
+    images, lights = odd_sized_capture
+    live = _incremental(images, lights)
+    retake = 255 - images[5]
+    live.remove(5, images[5])
+    live.add(5, retake, lights[5])
+    _assert_close_to(
+        live.result(),
+        ptm_fitter.fit_streaming([*images[:5], retake, *images[6:]], lights),
+    )
+
+
+def test_a_result_leaves_the_fit_able_to_carry_on(odd_sized_capture):
+    images, lights = odd_sized_capture
+    live = _incremental(images[:10], lights[:10])
+    first = live.result()
+    assert live.result() == first
+    for key in range(10, 14):
+        live.add(key, images[key], lights[key])
+    _assert_close_to(live.result(), ptm_fitter.fit_streaming(images, lights))
+
+
+def test_an_incremental_fit_needs_six_images(odd_sized_capture):
+    images, lights = odd_sized_capture
+    with pytest.raises(FitError, match="at least 6"):
+        _incremental(images[:5], lights[:5]).result()
+
+
+def test_an_incremental_fit_refuses_a_mismatched_image(odd_sized_capture):
+    images, lights = odd_sized_capture
+    live = _incremental(images[:2], lights[:2])
+    with pytest.raises(FitError, match="but the first was"):
+        live.add(2, images[2][:-1], lights[2])
+    assert len(live) == 2
+
+
+def test_a_key_goes_in_once_and_out_once(odd_sized_capture):
+    images, lights = odd_sized_capture
+    live = _incremental(images[:2], lights[:2])
+    with pytest.raises(ValueError, match="already"):
+        live.add(1, images[1], lights[1])
+    with pytest.raises(KeyError):
+        live.remove(7, images[7])
+
+
 # -- the in-place contract, which is easy to trip over ---------------------
 
 
@@ -140,6 +140,82 @@ def test_written_bytes_match_the_reference(reference, tmp_path):
     assert path.read_bytes() == REFERENCE.read_bytes()
 
 
+@pytest.mark.parametrize("chunk_bytes", [1, 8 * 6 * 3, 1000, 10**9])
+def test_the_chunk_size_does_not_change_the_bytes(reference, tmp_path, chunk_bytes):
+    """A row at a time, a few rows that do not divide the height, and all."""
+    path = tmp_path / "out.ptm"
+    ptm_format.write(str(path), reference, chunk_bytes=chunk_bytes)
+    assert path.read_bytes() == REFERENCE.read_bytes()
+
+
+def test_a_planar_ptm_is_written_without_a_full_copy(monkeypatch, tmp_path):
+    """The layout `fit_streaming` produces: planes, seen interleaved."""
+    height, width = 50, 40
+    planes = np.random.default_rng(0).integers(0, 256, (COEFFICIENTS, height * width), np.uint8)
+    rgb = np.random.default_rng(1).integers(0, 256, (3, height * width), np.uint8)
+    ptm = Ptm(
+        width,
+        height,
+        [1.0] * COEFFICIENTS,
+        [0] * COEFFICIENTS,
+        planes.T.reshape(height, width, COEFFICIENTS),
+        rgb.T.reshape(height, width, 3),
+    )
+
+    gathered = []
+    contiguous = np.ascontiguousarray
+
+    def recording(array):
+        gathered.append(array.nbytes)
+        return contiguous(array)
+
+    monkeypatch.setattr(ptm_format.np, "ascontiguousarray", recording)
+    ptm_format.write(str(tmp_path / "out.ptm"), ptm, chunk_bytes=2000)
+    monkeypatch.undo()
+
+    assert max(gathered) <= 2000
+    assert ptm_format.read(str(tmp_path / "out.ptm")) == ptm
+
+
+# -- mapped rather than read ------------------------------------------------
+
+
+def test_a_mapped_file_reads_the_same(reference):
+    assert ptm_format.read_mapped(str(REFERENCE)) == reference
+
+
+def test_a_mapped_file_is_views_of_the_mapping():
+    mapped = ptm_format.read_mapped(str(REFERENCE))
+    for array in (mapped.coefficients, mapped.rgb):
+        assert isinstance(array.base, np.memmap)
+        assert not array.flags.writeable
+
+
+def test_a_read_file_shares_one_buffer():
+    """Both arrays are views of the same payload, not slices copied out of it."""
+
+    def owner(array):
+        while isinstance(array.base, np.ndarray):
+            array = array.base
+        return array.base
+
+    parsed = ptm_format.read(str(REFERENCE))
+    assert owner(parsed.coefficients) is owner(parsed.rgb) is not None
+
+
+def test_a_mapped_file_can_be_written_back(reference, tmp_path):
+    path = tmp_path / "out.ptm"
+    ptm_format.write(str(path), ptm_format.read_mapped(str(REFERENCE)))
+    assert path.read_bytes() == REFERENCE.read_bytes()
+
+
+def test_a_truncated_payload_is_refused_before_mapping(tmp_path):
+    path = tmp_path / "x.ptm"
+    path.write_bytes(b"PTM_1.2\nPTM_FORMAT_LRGB\n4\n4\n1 1 1 1 1 1 \n0 0 0 0 0 0 \n" + b"\x00" * 10)
+    with pytest.raises(PtmFormatError, match="payload"):
+        ptm_format.read_mapped(str(path))
+
+
 # -- refusals --------------------------------------------------------------
 
 
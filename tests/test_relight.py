@@ -0,0 +1,102 @@
+"""Relighting a PTM from its bytes, in tiles and batches."""
+
+import numpy as np
+import pytest
+
+from core import ptm_fitter, ptm_format, relight
+from core.light_positions import light_vectors
+from core.ptm_format import Ptm
+from core.relight import Relighter
+
+pytestmark = pytest.mark.unit
+
+FIXTURES = pytest.importorskip("pathlib").Path(__file__).parent / "fixtures"
+
+LIGHTS = [(u, v) for u, v, _w in light_vectors()[:5]]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return ptm_format.read(str(FIXTURES / "reference_8x5.ptm"))
+
+
+@pytest.fixture(scope="module")
+def random_ptm():
+    """Every byte value in play, at a size no tile divides."""
+    rng = np.random.default_rng(4)
+    coefficients = rng.integers(0, 256, size=(37, 23, 6), dtype=np.uint8)
+    rgb = rng.integers(0, 256, size=(37, 23, 3), dtype=np.uint8)
+    scale = rng.uniform(0.01, 2.0, 6)
+    bias = rng.integers(0, 256, 6)
+    return Ptm(23, 37, scale, bias, coefficients, rgb)
+
+
+# -- luminance ---------------------------------------------------------------
+
+
+def test_the_folded_tables_give_the_dequantised_polynomial(random_ptm):
+    luminance = Relighter(random_ptm).luminance(LIGHTS)
+    for (u, v), ours in zip(LIGHTS, luminance, strict=True):
+        expected = random_ptm.dequantised() @ relight.terms([(u, v)])[0]
+        assert np.allclose(ours, expected, rtol=1e-5, atol=1e-2)
+
+
+def test_ptm_luminance_agrees_with_dequantising_first(random_ptm):
+    u, v = LIGHTS[2]
+    expected = random_ptm.dequantised() @ relight.terms([(u, v)])[0]
+    assert np.allclose(random_ptm.luminance(u, v), expected)
+
+
+def test_tiles_do_not_change_the_result(random_ptm):
+    whole = Relighter(random_ptm, tile_pixels=10**6).render(LIGHTS)
+    tiled = Relighter(random_ptm, tile_pixels=50).render(LIGHTS)
+    assert np.array_equal(whole, tiled)
+
+
+# -- rendering ---------------------------------------------------------------
+
+
+def test_a_render_is_what_reconstruct_gives_rounded(reference):
+    rendered = Relighter(reference).render(LIGHTS)
+    for (u, v), ours in zip(LIGHTS, rendered, strict=True):
+        expected = np.clip(ptm_fitter.reconstruct(reference, u, v), 0, 255)
+        assert np.abs(ours.astype(float) - expected).max() <= 0.5 + 1e-3
+
+
+def test_a_batch_is_each_light_rendered_alone(random_ptm):
+    relighter = Relighter(random_ptm)
+    batch = relighter.render(LIGHTS)
+    for light, frame in zip(LIGHTS, batch, strict=True):
+        assert np.array_equal(relighter.render([light])[0], frame)
+
+
+def test_a_window_is_that_part_of_the_whole(random_ptm):
+    relighter = Relighter(random_ptm, tile_pixels=40)
+    window = (slice(3, 30, 2), slice(1, None, 3))
+    whole = relighter.render(LIGHTS[:2])
+    assert np.array_equal(relighter.render(LIGHTS[:2], window), whole[:, 3:30:2, 1::3])
+
+
+def test_a_mapped_file_renders_as_the_read_one_does(reference, tmp_path):
+    path = tmp_path / "out.ptm"
+    ptm_format.write(str(path), reference)
+    mapped = ptm_format.read_mapped(str(path))
+    assert np.array_equal(Relighter(mapped).render(LIGHTS), Relighter(reference).render(LIGHTS))
+
+
+# -- the cache ---------------------------------------------------------------
+
+
+def test_a_light_that_has_barely_moved_comes_from_the_cache(random_ptm):
+    relighter = Relighter(random_ptm)
+    first = relighter.render_cached(0.3, -0.2)
+    assert relighter.render_cached(0.3 + relight.LIGHT_STEP / 4, -0.2) is first
+    assert not first.flags.writeable
+
+
+def test_the_cache_keeps_to_its_budget(random_ptm):
+    frame_bytes = 37 * 23 * 3
+    relighter = Relighter(random_ptm, cache_bytes=2 * frame_bytes)
+    frames = [relighter.render_cached(u, 0.0) for u in (0.1, 0.2, 0.3)]
+    assert relighter.render_cached(0.3, 0.0) is frames[2]
+    assert relighter.render_cached(0.1, 0.0) is not frames[0], "the oldest was dropped"
@@ -0,0 +1,155 @@
+"""Waits learned from how long a camera's shots take to arrive."""
+
+import pytest
+from PIL import Image
+
+from core import settings as prefs
+from core import shot_timing
+from core.capture_session import CAPTURED, TimedCaptureSession
+from core.preferences import Preferences
+from core.shot_timing import MIN_DEADLINE, UNKNOWN_CAMERA, LatencyProfile
+
+pytestmark = pytest.mark.unit
+
+DEFAULTS = (prefs.PREPARATION_SECONDS, prefs.POLLING_TIMEOUT_SECONDS)
+
+
+# -- the profile ---------------------------------------------------------------
+
+
+def test_the_defaults_stand_until_there_is_enough_to_go_on():
+    profile = LatencyProfile([0.4] * (shot_timing.MIN_SAMPLES - 1))
+    assert profile.waits(*DEFAULTS) == DEFAULTS
+
+
+def test_a_fast_camera_gets_a_shorter_deadline():
+    profile = LatencyProfile([0.4, 0.5, 0.45, 0.6, 0.5, 0.55])
+    preparation, timeout = profile.waits(*DEFAULTS)
+    assert preparation == pytest.approx(0.2)
+    assert preparation + timeout == pytest.approx(MIN_DEADLINE)
+
+
+def test_the_deadline_is_twice_the_slow_end():
+    profile = LatencyProfile([1.5] * 19 + [2.5])
+    preparation, timeout = profile.waits(*DEFAULTS)
+    assert preparation + timeout == pytest.approx(3.0)
+
+
+def test_learning_never_makes_a_wait_longer_than_its_default():
+    profile = LatencyProfile([9.0] * 10)
+    preparation, timeout = profile.waits(*DEFAULTS)
+    assert preparation <= DEFAULTS[0]
+    assert preparation + timeout == pytest.approx(sum(DEFAULTS))
+
+
+def test_only_the_most_recent_shots_are_kept():
+    profile = LatencyProfile(window=3)
+    for seconds in (1, 2, 3, 4):
+        profile.record(seconds)
+    assert profile.samples == [2.0, 3.0, 4.0]
+
+
+def test_percentiles_are_nearest_rank():
+    profile = LatencyProfile([5, 1, 4, 2, 3])
+    assert profile.percentile(5) == 1
+    assert profile.percentile(50) == 3
+    assert profile.percentile(95) == 5
+
+
+def test_a_percentile_of_nothing_is_refused():
+    with pytest.raises(ValueError):
+        LatencyProfile().percentile(50)
+
+
+# -- the session -------------------------------------------------------------
+
+
+def test_the_session_records_each_shots_latency():
+    now = [0.0]
+    profile = LatencyProfile()
+    session = TimedCaptureSession([0], preparation_time=0.1, clock=lambda: now[0], timing=profile)
+    session.step(lambda index: None, lambda: None)
+    now[0] = 0.7
+    result = session.step(lambda index: None, lambda: "/shots/a.jpg")
+    assert result.event == CAPTURED
+    assert session.latencies == {0: pytest.approx(0.7)}
+    assert profile.samples == [pytest.approx(0.7)]
+
+
+def test_a_missed_shot_is_recorded_at_its_deadline():
+    now = [0.0]
+    profile = LatencyProfile()
+    session = TimedCaptureSession(
+        [0], preparation_time=0.0, polling_timeout=2.0, clock=lambda: now[0], timing=profile
+    )
+    session.step(lambda index: None, lambda: None)
+    now[0] = 2.0
+    session.step(lambda index: None, lambda: None)
+    assert profile.samples == [2.0]
+    assert session.latencies == {}
+
+
+def test_the_session_takes_its_waits_from_the_profile():
+    profile = LatencyProfile([0.2] * 10)
+    session = TimedCaptureSession([0], *DEFAULTS, clock=lambda: 0.0, timing=profile)
+    result = session.step(lambda index: None, lambda: None)
+    assert result.wake_after == pytest.approx(0.1)
+    assert session.deadline + session.polling_timeout == pytest.approx(MIN_DEADLINE)
+
+
+# -- per camera ----------------------------------------------------------------
+
+
+def shot(path, make=None, model=None):
+    image = Image.new("RGB", (4, 4))
+    exif = Image.Exif()
+    if make:
+        exif[0x010F] = make
+    if model:
+        exif[0x0110] = model
+    image.save(path, exif=exif)
+    return str(path)
+
+
+def test_a_camera_is_named_by_its_exif(tmp_path):
+    assert shot_timing.camera_id(shot(tmp_path / "a.jpg", "NIKON", "Z 7")) == "NIKON Z 7"
+
+
+def test_a_make_repeated_in_the_model_is_not_doubled(tmp_path):
+    path = shot(tmp_path / "a.jpg", "Canon", "Canon EOS R5")
+    assert shot_timing.camera_id(path) == "Canon EOS R5"
+
+
+def test_a_file_that_does_not_say_is_an_unknown_camera(tmp_path):
+    assert shot_timing.camera_id(shot(tmp_path / "a.jpg")) == UNKNOWN_CAMERA
+    assert shot_timing.camera_id(str(tmp_path / "missing.jpg")) == UNKNOWN_CAMERA
+
+
+def test_a_slash_in_the_name_does_not_nest_the_key(tmp_path):
+    path = shot(tmp_path / "a.jpg", "Acme", "Model 1/2")
+    assert "/" not in shot_timing.camera_id(path)
+
+
+def test_profiles_are_kept_per_camera(tmp_path):
+    settings = Preferences(str(tmp_path / "preferences.json"), migrate=False)
+    shot_timing.save(settings, "NIKON Z 7", LatencyProfile([0.4, 0.5]))
+    shot_timing.save(settings, "Canon EOS R5", LatencyProfile([1.5]))
+    settings.sync()
+
+    reread = Preferences(str(tmp_path / "preferences.json"), migrate=False)
+    assert shot_timing.load(reread, "NIKON Z 7")[1].samples == [0.4, 0.5]
+    camera, profile = shot_timing.load(reread)
+    assert (camera, profile.samples) == ("Canon EOS R5", [1.5])
+
+
+def test_nothing_stored_is_an_empty_profile(tmp_path):
+    settings = Preferences(str(tmp_path / "preferences.json"), migrate=False)
+    camera, profile = shot_timing.load(settings)
+    assert camera == UNKNOWN_CAMERA
+    assert profile.samples == []
+
+
+def test_a_mangled_profile_is_ignored(tmp_path):
+    settings = Preferences(str(tmp_path / "preferences.json"), migrate=False)
+    settings.setValue(f"{prefs.SHOT_TIMING}/X", ["fast", "slow"])
+    assert shot_timing.load(settings, "X")[1].samples == []
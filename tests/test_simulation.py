@@ -0,0 +1,128 @@
+"""The simulated dome controller and camera, and the capture benchmark on them."""
+
+import os
+import time
+
+import pytest
+
+from core import shot_timing, simulation
+from core.image_data import capture_time
+from core.serial_controller import SerialController
+from core.simulation import SimulatedCamera, SimulatedController
+
+pytestmark = [
+    pytest.mark.unit,
+    pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pseudo-terminal"),
+]
+
+
+def wait_for(condition, seconds=2.0):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def dome():
+    """A simulated controller at a hundredth of the firmware's delays, opened."""
+    shutters = []
+    with SimulatedController(shutters.append, time_scale=0.01) as simulated:
+        controller = SerialController(simulated.port, log=lambda _message: None)
+        controller.RESET_DELAY = 0
+        assert controller.open()
+        try:
+            yield simulated, controller, shutters
+        finally:
+            controller.close()
+
+
+# -- controller ----------------------------------------------------------------
+
+
+def test_the_controller_answers_as_the_firmware_does(dome):
+    simulated, controller, _shutters = dome
+    controller.turn_on(6)
+    assert controller.receive() == b"Turn on LED #7\r\n"
+    assert simulated.lit == 7
+
+
+def test_a_shoot_fires_the_shutter_under_the_led(dome):
+    simulated, controller, shutters = dome
+    controller.shoot(4)
+    assert wait_for(lambda: shutters == [4])
+    assert simulated.received == ["SHOOT,5"]
+
+
+def test_commands_queue_while_a_shot_is_held(dome):
+    """The sketch blocks in shoot(); what arrives meanwhile waits its turn."""
+    _simulated, controller, shutters = dome
+    controller.shoot(0)
+    controller.shoot(1)
+    assert wait_for(lambda: len(shutters) == 2)
+    assert shutters == [0, 1]
+
+
+def test_anything_else_turns_the_leds_off(dome):
+    simulated, controller, _shutters = dome
+    controller.turn_on(2)
+    controller.send("garbage")
+    assert wait_for(lambda: simulated.received == ["ON,3", "garbage"])
+    assert simulated.lit is None
+
+
+def test_text_outside_the_markers_is_ignored(dome):
+    simulated, controller, _shutters = dome
+    controller._serial.write(b"noise<ON,2>more noise")
+    assert wait_for(lambda: simulated.received == ["ON,2"])
+
+
+# -- camera --------------------------------------------------------------------
+
+
+def test_a_shot_lands_in_a_dated_folder(tmp_path):
+    camera = SimulatedCamera(str(tmp_path), latency=0.0, jitter=0.0, size=(8, 8))
+    camera.trigger(3)
+    assert wait_for(lambda: camera.shots and camera.shots[0].path)
+    shot = camera.shots[0]
+    assert shot.led_index == 3
+    assert os.path.dirname(shot.path) == camera.directory
+    assert os.path.dirname(camera.directory) == str(tmp_path)
+    assert shot_timing.camera_id(shot.path) == simulation.CAMERA_MODEL
+    assert capture_time(shot.path) is not None
+
+
+def test_a_failed_shot_leaves_no_file(tmp_path):
+    camera = SimulatedCamera(str(tmp_path), failure_rate=1.0)
+    camera.trigger(0)
+    assert camera.shots == [simulation.CameraShot(0, camera.shots[0].fired_at, None, None)]
+    assert not os.path.exists(camera.directory)
+
+
+def test_stopping_the_camera_cancels_shots_in_transit(tmp_path):
+    camera = SimulatedCamera(str(tmp_path), latency=60.0, jitter=0.0)
+    camera.trigger(0)
+    camera.stop()
+    assert camera.shots == []
+
+
+# -- benchmark -------------------------------------------------------------------
+
+
+def test_a_benchmark_run_captures_every_shot():
+    report = simulation.benchmark(
+        leds=3, time_scale=0.01, latency=0.05, jitter=0.0, size=(8, 8), seed=1
+    )
+    assert (report.captured, report.missing) == (3, 0)
+    assert report.shots_per_minute > 0
+    assert report.percentile(50) >= 0.05
+    assert "3/3 shots" in report.summary()
+
+
+def test_a_shot_that_never_lands_is_reported_missing():
+    report = simulation.BenchmarkReport(leds=4, captured=3, seconds=30.0, latencies=[1, 2, 3])
+    assert report.missing == 1
+    assert report.shots_per_minute == pytest.approx(6.0)
+    assert report.percentile(95) == 3
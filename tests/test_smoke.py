@@ -13,16 +13,24 @@
 pytestmark = pytest.mark.smoke
 
 CORE_MODULES = [
+    "core.batch_fit",
     "core.capture_session",
+    "core.decoders",
+    "core.fit_benchmark",
+    "core.fit_stats",
     "core.image_data",
+    "core.image_watch",
     "core.light_positions",
     "core.ptm_builder",
+    "core.relight",
     "core.resources",
     "core.serial_controller",
     "core.settings",
+    "core.shot_timing",
+    "core.simulation",
 ]
 
-UI_MODULES = ["ui.main_window", "ui.preferences_window"]
+UI_MODULES = ["ui.fit_worker", "ui.image_watcher", "ui.main_window", "ui.preferences_window"]
 
 
 @pytest.mark.parametrize("name", CORE_MODULES + UI_MODULES + ["version", "PTMGenerator2"])
@@ -41,8 +49,13 @@ def test_core_does_not_depend_on_qt():
 
     code = (
         "import sys;"
-        "import core.capture_session, core.image_data, core.light_positions,"
-        "core.ptm_builder, core.resources, core.serial_controller, core.settings;"
+        "import core.batch_fit, core.capture_session, core.decoders,"
+        "core.fit_benchmark, core.fit_stats,"
+        "core.image_data,"
+        "core.image_watch,"
+        "core.light_positions,"
+        "core.ptm_builder, core.relight, core.resources, core.serial_controller, core.settings,"
+        "core.shot_timing, core.simulation;"
         "sys.exit(1 if 'PyQt5' in sys.modules else 0)"
     )
     assert subprocess.call([sys.executable, "-c", code]) == 0, "core imported PyQt5"
@@ -56,8 +69,8 @@ def test_main_window_constructs(main_window):
 def test_preferences_window_constructs(prefs_window):
     assert prefs_window.windowTitle() == "Preferences"
     # Language, serial port, engine, the engine's size notice, fitter path,
-    # LED count, retries, polling, adjustment, OK
-    assert prefs_window.form_layout.rowCount() == 10
+    # LED count, retries, polling, pipelining, adjustment, OK
+    assert prefs_window.form_layout.rowCount() == 11
 
 
 def test_the_fitter_choice_round_trips(prefs_window, main_window):
@@ -0,0 +1,88 @@
+"""Running a fit on its own thread.
+
+A fit of fifty full-size images is tens of seconds of decoding. Run on the GUI
+thread it freezes the window, and pumping the event loop from the progress
+callback -- what `generate_ptm_natively` used to do -- trades that for two
+other problems: every repaint stalls the decode loop, and the pumped events
+include a second click on Generate PTM, which starts a second fit inside the
+first.
+
+`FitWorker` runs the fit as a job on a `QThread` and reports back by signal,
+so the window stays interactive and the decoding runs at its own pace. Signals
+crossing threads are queued, so the slots they reach run on the GUI thread as
+usual.
+
+Cancelling is a flag, checked each time the job reports progress -- after each
+image. The job stops there by raising `FitCancelledError` out of its progress
+callback, which `ptm_builder.generate_native` lets through like any other
+error: nothing is written, and the checkpoint holds what was done.
+"""
+
+import threading
+
+from PyQt5.QtCore import QObject, Qt, QThread, pyqtSignal
+
+
+class FitCancelledError(Exception):
+    """The user cancelled the fit from the progress dialog."""
+
+
+class FitWorker(QObject):
+    """Runs ``job(progress)`` on a thread of its own.
+
+    `job` is any callable taking a progress callback ``progress(done, count)``
+    and returning a result; it runs once. Exactly one of `succeeded` (with the
+    result) and `failed` (with the exception) is emitted, then `done`.
+
+    Args:
+        job (callable): The work, called on the worker thread.
+    """
+
+    progressed = pyqtSignal(int, int)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    done = pyqtSignal()
+
+    def __init__(self, job):
+        super().__init__()
+        self._job = job
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop at the next image. Safe from any thread."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        try:
+            result = self._job(self._report)
+        except Exception as error:  # handed to the GUI thread, which reports it
+            self.failed.emit(error)
+        else:
+            self.succeeded.emit(result)
+        finally:
+            self.done.emit()
+
+    def _report(self, done, count):
+        self.progressed.emit(done, count)
+        if self._cancelled.is_set():
+            raise FitCancelledError
+
+
+def start(worker):
+    """Move `worker` to a new thread and run it. Returns the thread.
+
+    The thread stops itself when the job is done, so ``thread.wait()`` returns
+    once it has; the caller still owns it, and must not drop it before then.
+    """
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    # Direct: quit from the worker thread itself, rather than queueing the
+    # request to a GUI thread that may be blocked in wait().
+    worker.done.connect(thread.quit, Qt.ConnectionType.DirectConnection)
+    thread.start()
+    return thread
@@ -0,0 +1,90 @@
+"""Filesystem events for the capture loop.
+
+`QFileSystemWatcher` is inotify on Linux, FSEvents/kqueue on macOS and
+ReadDirectoryChangesW on Windows, behind one signal. `ImageWatcher` feeds its
+`directoryChanged` to a `core.image_watch.ArrivalTracker` and keeps the watch
+list in step with it, so the capture loop can ask for the newest finished shot
+without rescanning anything.
+
+If the watcher cannot be set up -- too many folders under the root, or a
+platform or filesystem (some network shares) that will not watch a path --
+`start` says so and the caller polls with `find_newest_image` as before.
+"""
+
+from PyQt5.QtCore import QFileSystemWatcher, QObject, pyqtSignal
+
+from core.image_watch import ArrivalTracker
+from ui.error_handling import guard_slot
+
+
+class ImageWatcher(QObject):
+    """New images under a directory, pushed by the operating system."""
+
+    #: A watched directory has changed and may hold a new shot.
+    changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.on_directory_changed)
+        self._tracker: ArrivalTracker | None = None
+
+    @property
+    def active(self):
+        """True while watching; False means poll instead."""
+        return self._tracker is not None
+
+    def start(self, root, newer_than, recursive=False):
+        """Watch `root` for images newer than `newer_than`.
+
+        Returns:
+            bool: Whether it is watching. False leaves it stopped.
+        """
+        self.stop()
+        tracker = ArrivalTracker(root, newer_than, recursive=recursive)
+        if not tracker.scan_tree():
+            print(f"Too many folders under {root} to watch; polling instead")
+            return False
+        failed = self._watcher.addPaths(sorted(tracker.directories))
+        if failed:
+            print(f"Cannot watch {failed[0]}; polling instead")
+            self._watcher.removePaths(self._watcher.directories())
+            return False
+        self._tracker = tracker
+        return True
+
+    def stop(self):
+        self._tracker = None
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+
+    def narrow_to(self, directory):
+        """Watch only `directory`, now the run's folder is known."""
+        if self._tracker is None:
+            return
+        dropped = self._tracker.narrow_to(directory)
+        if dropped:
+            self._watcher.removePaths(dropped)
+        if directory not in self._watcher.directories():
+            self._watcher.addPath(directory)
+
+    def take(self):
+        """(path, mtime) of the newest finished image, as `ArrivalTracker.take`."""
+        if self._tracker is None:
+            raise RuntimeError("ImageWatcher.take() while not watching")
+        return self._tracker.take()
+
+    def take_all(self):
+        """Every finished image, oldest first, as `ArrivalTracker.take_all`."""
+        if self._tracker is None:
+            raise RuntimeError("ImageWatcher.take_all() while not watching")
+        return self._tracker.take_all()
+
+    @guard_slot("Watching for new images")
+    def on_directory_changed(self, directory):
+        if self._tracker is None:
+            return
+        added = self._tracker.changed(directory)
+        if added:
+            self._watcher.addPaths(added)
+        self.changed.emit()
@@ -10,6 +10,7 @@
 from PyQt5.QtWidgets import (
     QAction,
     QApplication,
+    QDockWidget,
     QFileDialog,
     QHBoxLayout,
     QLabel,
@@ -24,26 +25,40 @@
     QWidget,
 )
 
-from core import image_data, paths, ptm_builder, ptm_fitter
+from core import image_data, paths, ptm_builder, ptm_fitter, ptm_format, shot_timing
 from core import settings as prefs
-from core.capture_session import CaptureSession
+from core.capture_session import PipelinedCaptureSession, TimedCaptureSession
+from core.fit_stats import FitStats
 from core.image_data import MISSING, CaptureSlot
 from core.light_positions import light_vectors
 from core.resources import icon_path, translation_path
 from core.serial_controller import SerialController
-from ui import about
+from ui import about, fit_worker
 from ui.app import app, require
 from ui.error_handling import guard_slot
 from ui.geometry import to_list, to_rect
+from ui.image_watcher import ImageWatcher
 from ui.preferences_window import PreferencesWindow
+from ui.ptm_viewer import PtmViewer
 from version import __version__
 
-#: One capture tick per second.
+#: How long to wait before stepping the capture when the session does not say.
 TICK_MS = 1000
 
+#: How often the built-in fit saves its progress beside the images, so a fit
+#: cancelled or cut short picks up from there when it is next run.
+CHECKPOINT_SECONDS = 60.0
 
-class PtmFitCancelledError(Exception):
-    """The user cancelled the fit from the progress dialog."""
+
+#: What a fit can fail with that is the images' or the settings' fault rather
+#: than a bug: reported in a sentence, not as a crash.
+FIT_ERRORS = (
+    ptm_builder.PtmFitterNotFoundError,
+    ptm_builder.NoImagesToFitError,
+    ptm_builder.PtmFitterFailedError,
+    ptm_fitter.FitError,
+    fit_worker.FitCancelledError,
+)
 
 
 class OutputRedirector(QObject):
@@ -108,6 +123,14 @@ def initialize_variables(self):
         self.csv_file = "image_data.csv"
         self.last_checked = time.time()
         self.session = None
+        #: The capture fitted as it arrives; see `ptm_builder.LiveFit`. None
+        #: when nothing is being captured, or the external fitter is in use.
+        self.live_fit = None
+        #: The built-in fit while it runs; see `generate_ptm_natively`.
+        self.fit_thread = None
+        self.fit_worker = None
+        self.fit_dialog = None
+        self.fit_destination = None
         self.serial = SerialController()
         self.selected_rows = []
         self.prev_selected_rows = []
@@ -149,6 +172,7 @@ def setup_ui(self):
         self.table_view.setModel(self.image_model)
         self.set_table_headers()
         self.selection().selectionChanged.connect(self.on_selection_changed)
+        self.image_model.itemChanged.connect(self.on_item_changed)
 
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
@@ -201,8 +225,21 @@ def setup_ui(self):
         self.central_layout.addWidget(self.button_widget)
         self.setCentralWidget(self.central_widget)
 
+        # Docked rather than central: it is for checking a fit, and hidden
+        # until there is one to check.
+        self.ptm_viewer = PtmViewer()
+        self.viewer_dock = QDockWidget(self.tr("PTM Viewer"), self)
+        self.viewer_dock.setObjectName("PtmViewerDock")
+        self.viewer_dock.setWidget(self.ptm_viewer)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.viewer_dock)
+        self.viewer_dock.hide()
+        #: The .ptm in the viewer, or None.
+        self.viewed_ptm = None
+
         self.actionOpenDirectory = QAction(self.tr("Open Directory\tCtrl+O"), self)
         self.actionOpenDirectory.triggered.connect(self.on_action_open_directory_triggered)
+        self.actionOpenPtm = QAction(self.tr("Open PTM"), self)
+        self.actionOpenPtm.triggered.connect(self.on_action_open_ptm_triggered)
         self.actionPreferences = QAction(self.tr("Preferences"), self)
         self.actionPreferences.triggered.connect(self.on_action_preferences_triggered)
         self.actionAbout = QAction(self.tr("About"), self)
@@ -211,6 +248,7 @@ def setup_ui(self):
         self.main_menu = require(self.menuBar(), "menu bar")
         self.file_menu = require(self.main_menu.addMenu(self.tr("File")), "File menu")
         self.file_menu.addAction(self.actionOpenDirectory)
+        self.file_menu.addAction(self.actionOpenPtm)
         self.edit_menu = require(self.main_menu.addMenu(self.tr("Edit")), "Edit menu")
         self.edit_menu.addAction(self.actionPreferences)
         self.help_menu = require(self.main_menu.addMenu(self.tr("Help")), "Help menu")
@@ -221,8 +259,20 @@ def setup_ui(self):
 
         self.update_capture_directory_label()
 
+        #: Wakes the capture at the deadline the session asked for. Single-shot
+        #: and re-armed after every step; inactive while paused.
         self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.take_picture_process)
+        #: Where new shots are noticed during a run; see `poll_for_image`.
+        self.image_watcher = ImageWatcher(self)
+        self.image_watcher.changed.connect(self.on_image_arrived)
+        #: The capture session's time source; replaced in tests.
+        self.session_clock = time.monotonic
+        #: The camera of the current run, once a shot has said which it is,
+        #: and the one whose timing the run started with; see `learn_camera`.
+        self.camera = None
+        self.assumed_camera = None
 
     # -- settings -----------------------------------------------------------
 
@@ -253,6 +303,7 @@ def read_settings(self):
         self.auto_retake_maximum = prefs.read_int(s, prefs.RETRY_COUNT)
         self.light_position_adjustment = prefs.read_int(s, prefs.LIGHT_POSITION_ADJUSTMENT)
         self.post_shutter_polling = prefs.read_float(s, prefs.POST_SHUTTER_POLLING)
+        self.pipelined_capture = prefs.read_bool(s, prefs.PIPELINED_CAPTURE)
         self.update_language(self.m_app.language)
 
     def save_settings(self):
@@ -323,15 +374,33 @@ def ensure_serial_ready(self):
     # -- capture ------------------------------------------------------------
 
     def _start_session(self, indices):
-        self.session = CaptureSession(
+        # The last camera used, until this run's first shot says otherwise.
+        self.assumed_camera, timing = shot_timing.load(self.m_app.preferences())
+        self.camera = None
+        pipelining = {}
+        if self.pipelined_capture:
+            pipelining = {
+                "shot_interval": prefs.SHOT_INTERVAL_SECONDS,
+                "depth": prefs.PIPELINE_DEPTH,
+            }
+        session_type = PipelinedCaptureSession if pipelining else TimedCaptureSession
+        self.session = session_type(
             indices,
-            preparation_time=prefs.PREPARATION_TIME,
-            polling_timeout=prefs.POLLING_TIMEOUT,
+            preparation_time=prefs.PREPARATION_SECONDS,
+            polling_timeout=prefs.POLLING_TIMEOUT_SECONDS,
             max_retakes=self.auto_retake_maximum,
+            clock=self.session_clock,
+            timing=timing,
+            **pipelining,
         )
         self.last_checked = time.time()
+        self.image_watcher.start(
+            self.working_directory,
+            self.last_checked,
+            recursive=self.capture_directory is None,
+        )
         self.btnPauseContinue.setText(self.tr("Pause"))
-        self.timer.start(TICK_MS)
+        self.timer.start(0)
 
     @guard_slot("Take All Pictures")
     def take_all_pictures(self):
@@ -343,6 +412,8 @@ def take_all_pictures(self):
         # Rediscover where shots land. The dated subfolder changes daily, and a
         # run started after midnight must not keep writing into yesterday's.
         self.capture_directory = None
+        if self.fitter == prefs.FITTER_NATIVE:
+            self.live_fit = ptm_builder.LiveFit()
         self._start_session(range(self.number_of_LEDs))
 
     @guard_slot("Retake Picture")
@@ -407,34 +478,93 @@ def poll_for_image(self):
         the monitored root is searched. After that the folder is known and the
         search narrows to it — this runs once a second, and walking a season's
         worth of dated subfolders every time would not.
+
+        During a run the operating system says which folders changed, and
+        `image_watcher` has already noted what landed in them; this only
+        collects the newest finished shot. The scan below is the fallback,
+        for when nothing could be watched, and for the test shot.
         """
-        time.sleep(self.post_shutter_polling)
-        if self.capture_directory is None:
+        if self.image_watcher.active:
+            path, mtime = self.image_watcher.take()
+            if path is not None and self.capture_directory is None:
+                self.adopt_capture_directory(os.path.dirname(path))
+                self.image_watcher.narrow_to(self.capture_directory)
+        elif self.capture_directory is None:
+            time.sleep(self.post_shutter_polling)
             path, mtime = image_data.find_newest_image(
                 self.monitor_root, self.last_checked, recursive=True
             )
             if path is not None:
                 self.adopt_capture_directory(os.path.dirname(path))
         else:
+            time.sleep(self.post_shutter_polling)
             path, mtime = image_data.find_newest_image(self.capture_directory, self.last_checked)
         if path is not None:
             self.last_checked = mtime
         return path
 
+    def poll_for_images(self):
+        """Every shot newer than the last one accepted, oldest first.
+
+        `poll_for_image` for a pipelined capture, where a second shot can land
+        before the first has been collected; the newest alone would lose it.
+        """
+        if self.image_watcher.active:
+            found = self.image_watcher.take_all()
+        else:
+            time.sleep(self.post_shutter_polling)
+            found = image_data.find_new_images(
+                self.working_directory,
+                self.last_checked,
+                recursive=self.capture_directory is None,
+            )
+        if not found:
+            return []
+        self.last_checked = max(self.last_checked, found[-1][1])
+        if self.capture_directory is None:
+            self.adopt_capture_directory(os.path.dirname(found[0][0]))
+            if self.image_watcher.active:
+                self.image_watcher.narrow_to(self.capture_directory)
+        return [path for path, _mtime in found if os.path.dirname(path) == self.capture_directory]
+
+    def reconcile_pipelined(self, session):
+        """Put each file against the LED the camera says it was shot under.
+
+        A pipelined run pairs files with LEDs in the order they arrive; the
+        EXIF capture times are the camera's own word on the order it shot them.
+        """
+        times = {path: image_data.capture_time(path) for _led, path, _at in session.paired}
+        for led_index, path in session.reconcile(times):
+            print(f"LED {led_index + 1} is {os.path.basename(path)}, by its capture time")
+            self.record_slot(led_index, path)
+
+    @guard_slot("A new image")
+    def on_image_arrived(self):
+        """Step the capture now rather than at its next deadline.
+
+        Unless paused: the timer is only inactive mid-run while paused.
+        """
+        if self.session is not None and self.timer.isActive():
+            self.take_picture_process()
+
     @guard_slot("The capture")
     def take_picture_process(self):
-        """One capture tick, driven by the timer."""
+        """One step of the capture, when it asked to be woken or a file landed."""
         session = self.session
         if session is None:
             self.timer.stop()
             return
 
         index = session.current_index
-        result = session.step(shoot=self.serial.shoot, poll=self.poll_for_image)
+        pipelined = isinstance(session, PipelinedCaptureSession)
+        poll = self.poll_for_images if pipelined else self.poll_for_image
+        result = session.step(shoot=self.serial.shoot, poll=poll)
 
         if result.recorded is not None:
             led_index, path = result.recorded
             self.record_slot(led_index, path)
+            if path is not None and self.camera is None:
+                self.learn_camera(session, path, led_index)
 
         self.status_bar.showMessage(
             "[#{}] {}".format(index + 1 if index is not None else "-", result.event), 1000
@@ -442,13 +572,42 @@ def take_picture_process(self):
 
         if result.finished:
             self.timer.stop()
+            if pipelined:
+                self.reconcile_pipelined(session)
             self.status_bar.showMessage(
                 self.tr("All pictures ({}) taken").format(self.number_of_LEDs), 5000
             )
             self.update_csv()
             self.btnPauseContinue.setText(self.tr("Pause/Continue"))
             self.serial.close()
+            self.image_watcher.stop()
+            self.save_shot_timing()
             self.session = None
+        else:
+            wake_after = TICK_MS / 1000 if result.wake_after is None else result.wake_after
+            self.timer.start(round(wake_after * 1000))
+
+    def learn_camera(self, session, path, led_index):
+        """Switch the session to the profile of the camera `path` came from.
+
+        The run started on the last camera's profile; if this is another, its
+        own takes over, starting with the shot that identified it.
+        """
+        self.camera = shot_timing.camera_id(path)
+        if self.camera != self.assumed_camera:
+            _camera, timing = shot_timing.load(self.m_app.preferences(), self.camera)
+            if led_index in session.latencies:
+                timing.record(session.latencies[led_index])
+            session.timing = timing
+
+    def save_shot_timing(self):
+        """Keep what this run learned about its camera's latency."""
+        session = self.session
+        if session is None or session.timing is None or self.camera is None:
+            return
+        s = self.m_app.preferences()
+        shot_timing.save(s, self.camera, session.timing)
+        s.sync()
 
     def record_slot(self, led_index, path):
         """Put a finished shot (or a missing one) into the table."""
@@ -472,6 +631,13 @@ def record_slot(self, led_index, path):
             self.image_model.appendRow([checkbox_item, filename_item])
             self.image_data.append(slot)
 
+        if self.live_fit is not None:
+            if path is None:
+                self.live_fit.exclude(led_index)
+            else:
+                lights = light_vectors(self.light_position_adjustment)
+                self.live_fit.include(led_index, path, lights[led_index])
+
         if path is not None:
             self.show_image(path)
 
@@ -482,20 +648,23 @@ def pause_continue_process(self):
             self.status_bar.showMessage(self.tr("Paused"), 1000)
             self.btnPauseContinue.setText(self.tr("Continue"))
         else:
-            self.timer.start()
+            self.timer.start(0)
             self.status_bar.showMessage(self.tr("Continued"), 1000)
             self.btnPauseContinue.setText(self.tr("Pause"))
 
     @guard_slot("Stop")
     def stop_process(self):
         self.timer.stop()
+        self.save_shot_timing()
         self.session = None
+        self.image_watcher.stop()
         self.serial.close()
         self.status_bar.showMessage(self.tr("Stopped"), 1000)
 
     # -- capture table ------------------------------------------------------
 
     def clear_image_data(self):
+        self.discard_live_fit()
         self.image_data = []
         self.image_model.clear()
         self.set_table_headers()
@@ -536,6 +705,30 @@ def sync_checkbox_states_to_image_data(self):
                     include=checkbox_item.checkState() == Qt.CheckState.Checked
                 )
 
+    @guard_slot("Including a shot")
+    def on_item_changed(self, item):
+        """Fold a shot out of the live fit as soon as it is unchecked.
+
+        `record_slot` replacing a row's items lands here too, before it has
+        updated `image_data`; it then tells the live fit itself, so whatever
+        this did with the old slot is corrected straight away.
+        """
+        row = item.row()
+        if self.live_fit is None or item.column() != 0 or row >= len(self.image_data):
+            return
+        slot = self.image_data[row]
+        if item.checkState() == Qt.CheckState.Checked and slot.captured:
+            lights = light_vectors(self.light_position_adjustment)
+            path = os.path.join(slot.directory, slot.filename)
+            self.live_fit.include(slot.led_index, path, lights[slot.led_index])
+        else:
+            self.live_fit.exclude(slot.led_index)
+
+    def discard_live_fit(self):
+        if self.live_fit is not None:
+            self.live_fit.close()
+            self.live_fit = None
+
     def update_csv(self):
         self.sync_checkbox_states_to_image_data()
         image_data.write_csv(os.path.join(self.working_directory, self.csv_file), self.image_data)
@@ -594,6 +787,17 @@ def on_action_open_directory_triggered(self):
         else:
             self.load_image_files()
 
+    @guard_slot("Open PTM")
+    def on_action_open_ptm_triggered(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self,
+            self.tr("Open PTM"),
+            str(self.working_directory),
+            "PTM files (*.ptm);;All files (*)",
+        )
+        if path:
+            self.show_ptm(path)
+
     @guard_slot("Preferences")
     def on_action_preferences_triggered(self):
         preferences = PreferencesWindow(self)
@@ -613,7 +817,14 @@ def generatePTM(self):
         Which fitter runs is a preference: the built-in one by default, or
         PTMfitter.exe for anyone who wants the old behaviour. See
         `core.settings.FITTER`.
+
+        The built-in fit runs on a worker thread and this returns as soon as it
+        has started; `on_fit_finished` reports the outcome. Only one runs at a
+        time -- the button is disabled meanwhile, and a click that arrives
+        anyway is ignored.
         """
+        if self.fit_thread is not None:
+            return
         self.sync_checkbox_states_to_image_data()
 
         ptm_filename, _ = QFileDialog.getSaveFileName(
@@ -624,61 +835,186 @@ def generatePTM(self):
         )
         if not ptm_filename:
             return
+        if self.viewed_ptm is not None and os.path.abspath(self.viewed_ptm) == os.path.abspath(
+            ptm_filename
+        ):
+            # The viewer maps the file, and on Windows a mapped file cannot be
+            # replaced.
+            self.close_ptm()
 
         vectors = light_vectors(self.light_position_adjustment)
+        if self.fitter == prefs.FITTER_NATIVE:
+            self.generate_ptm_natively(vectors, ptm_filename)
+            return
         try:
-            if self.fitter == prefs.FITTER_NATIVE:
-                lp_path = self.generate_ptm_natively(vectors, ptm_filename)
-            else:
-                lp_path = ptm_builder.generate(
-                    self.image_data, vectors, self.ptm_fitter, ptm_filename
-                )
-        except ptm_builder.PtmFitterNotFoundError as error:
-            self.report_error(self.tr("PTM fitter not found: {path}").format(path=error))
-        except ptm_builder.NoImagesToFitError:
-            self.report_error(self.tr("No images to process."))
-        except ptm_builder.PtmFitterFailedError as error:
-            self.report_error(str(error))
-        except ptm_fitter.FitError as error:
-            self.report_error(
-                self.tr("The images could not be fitted: {reason}").format(reason=error)
-            )
-        except PtmFitCancelledError:
-            self.status_bar.showMessage(self.tr("PTM generation cancelled"), 5000)
+            lp_path = ptm_builder.generate(self.image_data, vectors, self.ptm_fitter, ptm_filename)
+        except FIT_ERRORS as error:
+            self.report_fit_error(error)
         else:
-            self.status_bar.showMessage(self.tr("Saved {path}").format(path=ptm_filename), 5000)
-            print(f"Wrote {ptm_filename} (light positions: {lp_path})")
+            self.report_fit_saved(ptm_filename, lp_path)
 
     def generate_ptm_natively(self, vectors, destination):
-        """Fit in-process, showing progress.
+        """Start the fit on a worker thread, showing progress.
 
         The fit reads every capture, which for fifty full-size images is tens
-        of seconds -- long enough that the window must not simply freeze.
+        of seconds. It runs on a `FitWorker` thread so the window stays usable
+        and the decoding is not held up by repaints; the dialog follows it by
+        signal and is not modal.
 
-        The progress callback pumps the event loop rather than running the fit
-        on a worker thread. That is the smaller change and it keeps the dialog
-        responsive; a worker thread is the better answer and is in TODOs.md.
+        After a capture run, most of that has already happened: the live fit
+        folded each shot in as it arrived, and only needs solving. If it cannot
+        be trusted, the full fit runs as if it had never existed.
         """
-        total = len(ptm_builder.usable_slots(self.image_data))
+        slots = list(self.image_data)
+        live_fit = self.live_fit
+
+        def job(progress):
+            if live_fit is not None:
+                stats = FitStats()
+                try:
+                    return live_fit.write(slots, vectors, destination, stats=stats), stats
+                except ptm_builder.LiveFitUnavailableError as error:
+                    print(f"Fitting from the files instead of the live fit: {error}")
+            stats = FitStats()
+            lp_path = ptm_builder.generate_native(
+                slots,
+                vectors,
+                destination,
+                progress=progress,
+                checkpoint_interval=CHECKPOINT_SECONDS,
+                stats=stats,
+            )
+            return lp_path, stats
+
+        total = len(ptm_builder.usable_slots(slots))
         dialog = QProgressDialog(self.tr("Fitting the PTM..."), self.tr("Cancel"), 0, total, self)
-        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setWindowModality(Qt.WindowModality.NonModal)
         dialog.setMinimumDuration(0)
+        dialog.setAutoClose(False)
+        dialog.canceled.connect(self.cancel_fit)
+
+        worker = fit_worker.FitWorker(job)
+        worker.progressed.connect(self.on_fit_progress)
+        worker.succeeded.connect(self.on_fit_succeeded)
+        worker.failed.connect(self.on_fit_failed)
+        worker.done.connect(self.on_fit_finished)
+        self.fit_worker, self.fit_dialog, self.fit_destination = worker, dialog, destination
+        self.btnGeneratePTM.setEnabled(False)
+        self.fit_thread = fit_worker.start(worker)
+
+    @guard_slot("Cancelling the fit")
+    def cancel_fit(self):
+        if self.fit_worker is not None:
+            self.fit_worker.cancel()
+            if self.fit_dialog is not None:
+                self.fit_dialog.setLabelText(self.tr("Cancelling..."))
+
+    @guard_slot("Fit progress")
+    def on_fit_progress(self, done, count):
+        if self.fit_dialog is None or self.fit_worker is None or self.fit_worker.cancelled:
+            return
+        self.fit_dialog.setValue(done)
+        self.fit_dialog.setLabelText(
+            self.tr("Fitting the PTM: image {done} of {count}").format(done=done, count=count)
+        )
 
-        def report(done, count):
-            dialog.setValue(done)
-            dialog.setLabelText(
-                self.tr("Fitting the PTM: image {done} of {count}").format(done=done, count=count)
-            )
+    @guard_slot("Saving the PTM")
+    def on_fit_succeeded(self, result):
+        lp_path, stats = result
+        self.report_fit_saved(self.fit_destination, lp_path, stats)
+
+    @guard_slot("Generate PTM")
+    def on_fit_failed(self, error):
+        if not isinstance(error, FIT_ERRORS):
+            raise error
+        self.report_fit_error(error)
+
+    @guard_slot("Finishing the fit")
+    def on_fit_finished(self):
+        """Tidy up after the worker, whichever way it ended."""
+        thread, dialog = self.fit_thread, self.fit_dialog
+        self.fit_thread = self.fit_worker = self.fit_dialog = None
+        if dialog is not None:
+            dialog.close()  # emits canceled, which now finds nothing to cancel
+            dialog.deleteLater()
+        if thread is not None:
+            thread.wait()
+        if self.live_fit is not None and self.live_fit.failed:
+            self.discard_live_fit()
+        self.btnGeneratePTM.setEnabled(True)
+
+    def wait_for_fit(self):
+        """Block until a running fit has ended and its outcome is reported.
+
+        For shutting down, and for tests; the window itself never waits.
+        """
+        while self.fit_thread is not None:
+            self.fit_thread.wait()
+            # The worker's signals are queued for this thread; deliver them.
             QApplication.processEvents()
-            if dialog.wasCanceled():
-                raise PtmFitCancelledError
 
+    def closeEvent(self, event):
+        """Stop a running fit first: a QThread dropped while it runs aborts."""
+        self.cancel_fit()
+        self.wait_for_fit()
+        super().closeEvent(event)
+
+    def report_fit_saved(self, destination, lp_path, stats=None):
+        if stats is None:
+            message = self.tr("Saved {path}").format(path=destination)
+        else:
+            message = self.tr("Saved {path} in {seconds:.1f} s").format(
+                path=destination, seconds=stats.wall_seconds
+            )
+            print(stats.summary())
+        self.status_bar.showMessage(message, 5000)
+        print(f"Wrote {destination} (light positions: {lp_path})")
+        self.show_ptm(destination)
+
+    def show_ptm(self, path):
+        """Open `path` in the viewer, and show the viewer.
+
+        The file is mapped, not read: only the pages the view needs are
+        loaded, so a large map opens at once.
+        """
         try:
-            return ptm_builder.generate_native(
-                self.image_data, vectors, destination, progress=report
+            ptm = ptm_format.read_mapped(path)
+        except (OSError, ptm_format.PtmFormatError) as error:
+            self.report_error(
+                self.tr("Cannot show {path}: {reason}").format(path=path, reason=error)
+            )
+            return
+        self.viewed_ptm = path
+        self.update_viewer_title()
+        self.viewer_dock.show()
+        self.ptm_viewer.set_ptm(ptm)
+
+    def close_ptm(self):
+        self.ptm_viewer.clear()
+        self.viewed_ptm = None
+        self.update_viewer_title()
+
+    def update_viewer_title(self):
+        if self.viewed_ptm is None:
+            self.viewer_dock.setWindowTitle(self.tr("PTM Viewer"))
+        else:
+            self.viewer_dock.setWindowTitle(
+                self.tr("PTM Viewer: {name}").format(name=os.path.basename(self.viewed_ptm))
+            )
+
+    def report_fit_error(self, error):
+        if isinstance(error, ptm_builder.PtmFitterNotFoundError):
+            self.report_error(self.tr("PTM fitter not found: {path}").format(path=error))
+        elif isinstance(error, ptm_builder.NoImagesToFitError):
+            self.report_error(self.tr("No images to process."))
+        elif isinstance(error, ptm_builder.PtmFitterFailedError):
+            self.report_error(str(error))
+        elif isinstance(error, ptm_fitter.FitError):
+            self.report_error(
+                self.tr("The images could not be fitted: {reason}").format(reason=error)
             )
-        finally:
-            dialog.close()
+        else:
+            self.status_bar.showMessage(self.tr("PTM generation cancelled"), 5000)
 
     def report_error(self, message):
         print(message)
@@ -709,6 +1045,8 @@ def update_language(self, language):
         self.btnStop.setText(self.tr("Stop"))
         self.btnGeneratePTM.setText(self.tr("Generate PTM"))
         self.actionOpenDirectory.setText(self.tr("Open Directory\tCtrl+O"))
+        self.actionOpenPtm.setText(self.tr("Open PTM"))
+        self.update_viewer_title()
         self.actionPreferences.setText(self.tr("Preferences"))
         self.actionAbout.setText(self.tr("About"))
         self.file_menu.setTitle(self.tr("File"))
@@ -5,6 +5,7 @@
 from PyQt5.QtCore import QRect, QTranslator
 from PyQt5.QtGui import QDoubleValidator, QIcon, QIntValidator
 from PyQt5.QtWidgets import (
+    QCheckBox,
     QComboBox,
     QDialog,
     QFileDialog,
@@ -100,6 +101,10 @@ def setup_ui(self):
         # displayed as "1.0".
         self.edtPostShutterPolling.setValidator(QDoubleValidator(0.0, 60.0, 2))
 
+        self.lblPipelinedCapture = QLabel(self.tr("Pipelined Capture"))
+        self.chkPipelinedCapture = QCheckBox()
+        self.chkPipelinedCapture.setToolTip(self._pipelined_tooltip())
+
         self.lblLightPositionAdjustment = QLabel(self.tr("Light Position Adjustment"))
         self.edtLightPositionAdjustment = QLineEdit()
         self.edtLightPositionAdjustment.setValidator(QIntValidator())
@@ -116,6 +121,7 @@ def setup_ui(self):
         self.form_layout.addRow(self.lblNumberOfLEDs, self.edtNumberOfLEDs)
         self.form_layout.addRow(self.lblRetryCount, self.edtRetryCount)
         self.form_layout.addRow(self.lblPostShutterPolling, self.edtPostShutterPolling)
+        self.form_layout.addRow(self.lblPipelinedCapture, self.chkPipelinedCapture)
         self.form_layout.addRow(self.lblLightPositionAdjustment, self.edtLightPositionAdjustment)
         self.form_layout.addRow(self.btnOkay)
         self.setLayout(self.form_layout)
@@ -138,6 +144,7 @@ def setup_ui(self):
         self.edtRetryCount.setText(str(self.retry_count))
         self.edtLightPositionAdjustment.setText(str(self.light_position_adjustment))
         self.edtPostShutterPolling.setText(str(self.post_shutter_polling))
+        self.chkPipelinedCapture.setChecked(self.pipelined_capture)
 
     def _populate_serial_ports(self):
         """List the ports present, or a single "None" entry if there are none."""
@@ -155,6 +162,13 @@ def _fitter_tooltip(self):
             "fails on images above about 24 megapixels."
         )
 
+    def _pipelined_tooltip(self):
+        return self.tr(
+            "Fire the next LED while the last file is still transferring. "
+            "Faster with cameras that buffer shots; a camera that skips a "
+            "shot puts the later files against the wrong LEDs."
+        )
+
     def _fitter_warning(self):
         return self.tr(
             "PTMfitter.exe is 32-bit: a capture of images above about 24 "
@@ -209,6 +223,7 @@ def read_settings(self):
         self.retry_count = prefs.read_int(s, prefs.RETRY_COUNT)
         self.light_position_adjustment = prefs.read_int(s, prefs.LIGHT_POSITION_ADJUSTMENT)
         self.post_shutter_polling = prefs.read_float(s, prefs.POST_SHUTTER_POLLING)
+        self.pipelined_capture = prefs.read_bool(s, prefs.PIPELINED_CAPTURE)
         self.fitter = prefs.read_str(s, prefs.FITTER)
         self.language = prefs.read_str(s, prefs.LANGUAGE)
         self.prev_language = self.language
@@ -226,6 +241,7 @@ def save_settings(self):
         s.setValue(prefs.RETRY_COUNT, str(self.edtRetryCount.text()))
         s.setValue(prefs.LIGHT_POSITION_ADJUSTMENT, str(self.edtLightPositionAdjustment.text()))
         s.setValue(prefs.POST_SHUTTER_POLLING, str(self.edtPostShutterPolling.text()))
+        s.setValue(prefs.PIPELINED_CAPTURE, self.chkPipelinedCapture.isChecked())
         s.sync()
 
     @guard_slot("Changing language")
@@ -260,6 +276,8 @@ def update_language(self, language):
         # every row but these.
         self.lblPostShutterPolling.setText(self.tr("Post Shutter Polling"))
         self.lblLightPositionAdjustment.setText(self.tr("Light Position Adjustment"))
+        self.lblPipelinedCapture.setText(self.tr("Pipelined Capture"))
+        self.chkPipelinedCapture.setToolTip(self._pipelined_tooltip())
         self.btnOkay.setText(self.tr("OK"))
         self.update()
 
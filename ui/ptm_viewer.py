@@ -0,0 +1,231 @@
+"""Looking at a fitted PTM without leaving the window.
+
+A drag with the left button moves the light: the widget's centre is a light
+straight overhead, and its edge, on the circle that fits inside it, a light at
+the horizon. The wheel zooms about the cursor, and a drag with the right or
+middle button pans.
+
+Every frame comes from a `core.relight.Pyramid`: the level with a map pixel
+for each screen pixel, over only the part of the map on screen, so a view of a
+45-megapixel map costs what the screen has in pixels. While the light is being
+dragged, frames come from `DRAFT_LEVELS` levels coarser still -- a sixteenth
+of the pixels, for frame rates that keep up with the mouse on a CPU. When the
+mouse has been still for `REFINE_MS` the frame is rendered again at full
+detail.
+"""
+
+import math
+
+from PyQt5.QtCore import QPointF, QRectF, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter, QPen
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+from core.relight import Pyramid
+from ui.error_handling import guard_slot
+
+#: Levels coarser than the screen needs while the light is moving.
+DRAFT_LEVELS = 2
+
+#: How long the mouse must be still before the draft is refined.
+REFINE_MS = 150
+
+#: How far one notch of the wheel zooms.
+ZOOM_STEP = 1.25
+
+#: Screen pixels per map pixel, at most. Past this a map pixel is a block.
+MAX_ZOOM = 8.0
+
+#: Radius of the light indicator drawn in the corner, in screen pixels.
+INDICATOR_RADIUS = 24
+
+
+class PtmViewer(QWidget):
+    """A PTM, relit by dragging."""
+
+    #: The light has moved to (u, v).
+    lightChanged = pyqtSignal(float, float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(160, 160)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.pyramid: Pyramid | None = None
+        #: (u, v) of the light; overhead until the user drags it.
+        self.light = (0.0, 0.0)
+        #: Screen pixels per map pixel, and the map point at the widget's
+        #: centre. Set to fit the map when one is shown.
+        self.zoom = 1.0
+        self.centre = (0.0, 0.0)
+        #: The frame on screen: the array (kept alive for the QImage that
+        #: borrows it), the image, and the map rectangle it covers.
+        self._frame = None
+        self._image: QImage | None = None
+        self._covered: QRectF | None = None
+        self._pan_from: QPointF | None = None
+        self._lighting = False
+        #: Renders the current view at full detail once the mouse is still.
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(REFINE_MS)
+        self.refine_timer.timeout.connect(self.on_refine)
+
+    # -- what is shown ---------------------------------------------------------
+
+    def set_ptm(self, ptm):
+        """Show `ptm`, fitted to the widget, lit from overhead."""
+        self.pyramid = Pyramid(ptm)
+        self.light = (0.0, 0.0)
+        self.fit_to_widget()
+
+    def clear(self):
+        """Show nothing, and let go of the map."""
+        self.refine_timer.stop()
+        self.pyramid = None
+        self._frame = self._image = self._covered = None
+        self.update()
+
+    def fit_to_widget(self):
+        """Zoom and centre so the whole map is in view."""
+        if self.pyramid is None:
+            return
+        height, width = self.pyramid.shape
+        self.zoom = min(self.width() / width, self.height() / height, MAX_ZOOM)
+        self.centre = (width / 2, height / 2)
+        self.refresh()
+
+    def set_light(self, u, v, draft=False):
+        """Relight from (u, v), clipped to the unit circle.
+
+        Args:
+            draft (bool): Render coarsely now and refine once nothing has
+                moved for `REFINE_MS`, as during a drag.
+        """
+        length = math.hypot(u, v)
+        if length > 1:
+            u, v = u / length, v / length
+        self.light = (u, v)
+        self.lightChanged.emit(u, v)
+        self.refresh(draft)
+
+    def refresh(self, draft=False):
+        """Render the view again, coarsely now if `draft`."""
+        if draft:
+            self.render_view(DRAFT_LEVELS)
+            self.refine_timer.start()
+        else:
+            self.refine_timer.stop()
+            self.render_view(0)
+
+    def render_view(self, coarser):
+        if self.pyramid is None:
+            return
+        frame, covered = self.pyramid.render(*self.light, self.visible_region(), self.zoom, coarser)
+        if frame is None:
+            self._frame = self._image = self._covered = None
+        else:
+            rows, columns = frame.shape[:2]
+            self._frame = frame
+            self._image = QImage(
+                frame.data, columns, rows, 3 * columns, QImage.Format.Format_RGB888
+            )
+            left, top, right, bottom = covered
+            self._covered = QRectF(left, top, right - left, bottom - top)
+        self.update()
+
+    def visible_region(self):
+        """(left, top, right, bottom) of the map on screen, in map pixels."""
+        half_width = self.width() / (2 * self.zoom)
+        half_height = self.height() / (2 * self.zoom)
+        x, y = self.centre
+        return x - half_width, y - half_height, x + half_width, y + half_height
+
+    def to_screen(self, rect):
+        """A rectangle in map pixels, where it is on screen."""
+        x, y = self.centre
+        return QRectF(
+            (rect.left() - x) * self.zoom + self.width() / 2,
+            (rect.top() - y) * self.zoom + self.height() / 2,
+            rect.width() * self.zoom,
+            rect.height() * self.zoom,
+        )
+
+    def light_at(self, point):
+        """The (u, v) a press at `point` asks for: the centre is overhead."""
+        radius = max(1.0, min(self.width(), self.height()) / 2)
+        return (
+            (point.x() - self.width() / 2) / radius,
+            (self.height() / 2 - point.y()) / radius,
+        )
+
+    # -- events ----------------------------------------------------------------
+
+    @guard_slot("Refining the PTM view")
+    def on_refine(self):
+        self.render_view(0)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._lighting = True
+            self.set_light(*self.light_at(event.pos()), draft=True)
+        elif event.button() in (Qt.MouseButton.RightButton, Qt.MouseButton.MiddleButton):
+            self._pan_from = QPointF(event.pos())
+
+    def mouseMoveEvent(self, event):
+        if self._lighting:
+            self.set_light(*self.light_at(event.pos()), draft=True)
+        elif self._pan_from is not None:
+            moved = QPointF(event.pos()) - self._pan_from
+            self._pan_from = QPointF(event.pos())
+            x, y = self.centre
+            self.centre = (x - moved.x() / self.zoom, y - moved.y() / self.zoom)
+            self.refresh(draft=True)
+
+    def mouseReleaseEvent(self, event):
+        self._lighting = False
+        self._pan_from = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit_to_widget()
+
+    def wheelEvent(self, event):
+        if self.pyramid is None:
+            return
+        notches = event.angleDelta().y() / 120
+        if not notches:
+            return
+        # The map point under the cursor stays under it.
+        cursor = QPointF(event.pos())
+        x, y = self.centre
+        offset_x = cursor.x() - self.width() / 2
+        offset_y = cursor.y() - self.height() / 2
+        under = (x + offset_x / self.zoom, y + offset_y / self.zoom)
+        height, width = self.pyramid.shape
+        smallest = min(self.width() / width, self.height() / height) / 2
+        self.zoom = min(max(self.zoom * ZOOM_STEP**notches, smallest), MAX_ZOOM)
+        self.centre = (under[0] - offset_x / self.zoom, under[1] - offset_y / self.zoom)
+        self.refresh(draft=True)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh(draft=True)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(32, 32, 32))
+        if self._image is not None and self._covered is not None:
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, self.zoom < 1)
+            painter.drawImage(self.to_screen(self._covered), self._image)
+        if self.pyramid is not None:
+            self.paint_indicator(painter)
+        painter.end()
+
+    def paint_indicator(self, painter):
+        """The light's direction, as a dot on a disc in the corner."""
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        centre = QPointF(INDICATOR_RADIUS + 8, INDICATOR_RADIUS + 8)
+        painter.setPen(QPen(QColor(200, 200, 200), 1))
+        painter.setBrush(QColor(0, 0, 0, 128))
+        painter.drawEllipse(centre, INDICATOR_RADIUS, INDICATOR_RADIUS)
+        u, v = self.light
+        painter.setBrush(QColor(255, 220, 0))
+        painter.drawEllipse(centre + QPointF(u * INDICATOR_RADIUS, -v * INDICATOR_RADIUS), 4, 4)